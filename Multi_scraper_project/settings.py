@@ -167,4 +167,26 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
     }
-}
\ No newline at end of file
+}
+
+# Background scrape workers (manage.py run_scrape_workers)
+SCRAPE_WORKER_CONCURRENCY = int(os.environ.get('SCRAPE_WORKER_CONCURRENCY', 2))  # Chrome sessions per host
+SCRAPE_WORKER_MEMORY_MB = int(os.environ.get('SCRAPE_WORKER_MEMORY_MB', 700))  # RAM budget for one worker + its Chrome
+SCRAPE_JOB_STALE_SECONDS = 600  # A running job with no progress/checkpoint write for this long is requeued
+SCRAPE_JOB_MAX_ATTEMPTS = 3
+SCRAPE_RESULT_CACHE_TTL = int(os.environ.get('SCRAPE_RESULT_CACHE_TTL', 6 * 3600))  # Seconds a completed query is served from storage; 0 disables
+SCRAPE_PLACE_CACHE_TTL = int(os.environ.get('SCRAPE_PLACE_CACHE_TTL', 7 * 24 * 3600))  # Seconds an extracted place is reused without revisiting it
+SCRAPE_DETAIL_SESSIONS = int(os.environ.get('SCRAPE_DETAIL_SESSIONS', 1))  # Default browser sessions per job for place pages
+SCRAPE_DETAIL_SESSIONS_MAX = 4
+SCRAPE_BROWSER_POOL_SIZE = int(os.environ.get('SCRAPE_BROWSER_POOL_SIZE', 1))  # Warm Chrome sessions kept per worker process; 0 disables
+SCRAPE_BROWSER_POOL_MAX_IDLE = int(os.environ.get('SCRAPE_BROWSER_POOL_MAX_IDLE', 300))  # Seconds before an idle session is quit
+SCRAPE_BLOCK_RESOURCES = os.environ.get('SCRAPE_BLOCK_RESOURCES', '1') == '1'  # Drop images, map tiles, fonts and media in scraper browsers
+SCRAPE_CANCEL_POLL_SECONDS = float(os.environ.get('SCRAPE_CANCEL_POLL_SECONDS', 0.5))  # How often a running job's row is checked for a cancel request
+SCRAPE_CANCEL_KILL_AFTER_SECONDS = float(os.environ.get('SCRAPE_CANCEL_KILL_AFTER_SECONDS', 20))  # A cancelled job still running this long has its browsers killed
+SCRAPE_PIPELINE_TABS = os.environ.get('SCRAPE_PIPELINE_TABS', '1') == '1'  # Load the next place needing a full page load in another tab while the current one is extracted
+SCRAPE_SPA_NAVIGATION = os.environ.get('SCRAPE_SPA_NAVIGATION', '1') == '1'  # Search and open places inside the loaded Maps app instead of reloading it
+SCRAPE_PAYLOAD_CAPTURE_DIR = os.environ.get('SCRAPE_PAYLOAD_CAPTURE_DIR', '')  # Save raw Maps payloads read by the network backend here, for test fixtures; empty disables
+SCRAPE_REAPER_INTERVAL = int(os.environ.get('SCRAPE_REAPER_INTERVAL', 60))  # Seconds between sweeps for orphaned Chrome processes and profile dirs; 0 disables
+SCRAPE_REAPER_GRACE_SECONDS = int(os.environ.get('SCRAPE_REAPER_GRACE_SECONDS', 300))  # Age an orphaned Chrome process or profile dir must reach before it is reaped
+SCRAPE_MAX_RUNNING_PER_USER = int(os.environ.get('SCRAPE_MAX_RUNNING_PER_USER', 2))  # Guests share one quota
+SCRAPE_FAIR_SHARE_WINDOW = 3600  # Seconds of recent starts counted against a user when ordering the queue
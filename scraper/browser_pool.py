@@ -0,0 +1,240 @@
+"""
+Warm Chrome sessions reused across scrape jobs.
+
+Starting Chrome with a fresh profile costs several seconds and a memory spike
+per job. Each worker process keeps a small ``BrowserPool`` of idle sessions
+instead: scrapers ``lease`` a driver for their Chrome options and hand it
+back with ``release``, which clears cookies, closes stray tabs and parks the
+tab on about:blank. A session is only reused for the same options (headless
+flag, user agent, prefs); each one gets its own profile directory. Idle
+sessions are health-checked before reuse and quit after
+``SCRAPE_BROWSER_POOL_MAX_IDLE`` seconds; at most ``SCRAPE_BROWSER_POOL_SIZE``
+are kept per process, and 0 disables pooling.
+
+Every session the pool starts gets the resource-blocking profile
+(``SCRAPE_BLOCK_RESOURCES``): CDP ``Network.setBlockedURLs`` drops images,
+map tiles, place photos, fonts and media, none of which the scrapers parse.
+``manage.py measure_resource_blocking`` compares bytes transferred and
+page-ready time with and without it.
+
+``chrome_options`` builds the Chrome options every scraper starts from,
+so the pool, the worker warm-up and the measurement commands need no
+scraper instance to get them.
+
+Sessions are launched through ``chrome_process.chrome_service`` so each
+one's processes form a single group; a discarded or ``terminate``d session
+is torn down with one group kill instead of a graceful ``quit``.
+"""
+import copy
+import json
+import logging
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+from .chrome_process import PROFILE_PREFIX, become_subreaper, chrome_service, terminate_browser, track_group
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+CHROME_USER_AGENT = USER_AGENT + " (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36"
+
+# URL patterns dropped by the resource-blocking profile (CDP globs over the whole URL, query included)
+BLOCKED_URL_PATTERNS = [
+    # Images
+    '*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.svg*', '*.ico*',
+    # Map tiles, satellite imagery and Street View
+    '*/maps/vt?*', '*/maps/vt/*', '*/kh/v=*', '*khms*.google.com/*', '*streetviewpixels-pa.googleapis.com/*',
+    # Place photos and avatars
+    '*.googleusercontent.com/*',
+    # Fonts
+    '*.woff*', '*.ttf*', '*.otf*', '*fonts.gstatic.com/*',
+    # Media
+    '*.mp4*', '*.webm*', '*.mp3*', '*.m4a*',
+]
+
+
+def apply_resource_profile(driver, block=None):
+    """Turn the resource-blocking profile on (or off) for the driver's current tab"""
+    block = settings.SCRAPE_BLOCK_RESOURCES if block is None else block
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS if block else []})
+
+
+def chrome_options(headless=True, user_agent=USER_AGENT):
+    """The scrapers' Chrome options; the pool gives each session its own profile directory"""
+    options = Options()
+    if headless:
+        options.add_argument("--headless")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument(f"--user-agent={user_agent}")
+    return options
+
+
+def options_key(options):
+    """Everything that fixes a Chrome session's behaviour, minus its profile directory"""
+    arguments = [arg for arg in options.arguments if not arg.startswith('--user-data-dir=')]
+    logging_prefs = options.capabilities.get('goog:loggingPrefs')
+    return json.dumps([arguments, options.experimental_options, logging_prefs], sort_keys=True, default=str)
+
+
+class _Session:
+    def __init__(self, driver, profile_dir, key):
+        self.driver = driver
+        self.profile_dir = profile_dir
+        self.key = key
+        self.idle_since = time.monotonic()
+
+
+class BrowserPool:
+    def __init__(self):
+        self._idle = []
+        self._leased = {}
+        self._lock = threading.Lock()
+
+    def lease(self, options):
+        """A ready Chrome driver for ``options``: a warm idle one if possible, else a new one"""
+        key = options_key(options)
+        self.prune()
+        while True:
+            with self._lock:
+                session = next((s for s in self._idle if s.key == key), None)
+                if session is None:
+                    break
+                self._idle.remove(session)
+            if self._healthy(session):
+                logger.info("Reusing a warm Chrome session")
+                return self._hand_out(session)
+            self._discard(session)
+        return self._hand_out(self._launch(options, key))
+
+    def release(self, driver):
+        """Return a leased driver; it is reset and kept warm, or quit when the pool is full"""
+        if driver is None:
+            return
+        with self._lock:
+            session = self._leased.pop(id(driver), None)
+            if session is None and any(s.driver is driver for s in self._idle):
+                return  # Already released
+        if session is None:
+            terminate_browser(driver)
+            return
+        try:
+            self._reset(driver)
+        except Exception as e:
+            logger.warning(f"Dropping Chrome session that failed to reset: {e}")
+            self._discard(session)
+            return
+        session.idle_since = time.monotonic()
+        with self._lock:
+            if len(self._idle) < settings.SCRAPE_BROWSER_POOL_SIZE:
+                self._idle.append(session)
+                return
+        self._discard(session)
+
+    def terminate(self, driver):
+        """Kill a driver's process tree without trying a reset or quit first; False without a driver"""
+        if driver is None:
+            return False
+        with self._lock:
+            session = self._leased.pop(id(driver), None)
+            if session is None:
+                session = next((s for s in self._idle if s.driver is driver), None)
+                if session is not None:
+                    self._idle.remove(session)
+        terminate_browser(driver, session.profile_dir if session else None)
+        return True
+
+    def profile_dir(self, driver):
+        """The profile directory of a leased driver, or None"""
+        with self._lock:
+            session = self._leased.get(id(driver))
+        return session.profile_dir if session else None
+
+    def warm(self, options, count=None):
+        """Pre-launch idle sessions for ``options`` up to ``count`` (default: the pool size)"""
+        key = options_key(options)
+        count = settings.SCRAPE_BROWSER_POOL_SIZE if count is None else count
+        with self._lock:
+            missing = min(count, settings.SCRAPE_BROWSER_POOL_SIZE) - sum(1 for s in self._idle if s.key == key)
+        for _ in range(max(missing, 0)):
+            try:
+                session = self._launch(options, key)
+            except Exception as e:
+                logger.warning(f"Could not pre-launch a Chrome session: {e}")
+                return
+            with self._lock:
+                self._idle.append(session)
+
+    def prune(self):
+        """Quit sessions idle for longer than SCRAPE_BROWSER_POOL_MAX_IDLE"""
+        cutoff = time.monotonic() - settings.SCRAPE_BROWSER_POOL_MAX_IDLE
+        with self._lock:
+            expired = [s for s in self._idle if s.idle_since < cutoff]
+            self._idle = [s for s in self._idle if s.idle_since >= cutoff]
+        for session in expired:
+            self._discard(session)
+
+    def shutdown(self):
+        """Quit every idle session (leased ones are closed by their scrapers)"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._discard(session)
+
+    def _hand_out(self, session):
+        with self._lock:
+            self._leased[id(session.driver)] = session
+        return session.driver
+
+    def _launch(self, options, key):
+        profile_dir = tempfile.mkdtemp(prefix=PROFILE_PREFIX)
+        options = copy.deepcopy(options)
+        options.arguments[:] = [arg for arg in options.arguments if not arg.startswith('--user-data-dir=')]
+        options.add_argument(f"--user-data-dir={profile_dir}")
+        become_subreaper()
+        try:
+            driver = webdriver.Chrome(service=chrome_service(), options=options)
+        except Exception:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            raise
+        track_group(driver)
+        try:
+            apply_resource_profile(driver)
+        except Exception as e:
+            logger.warning(f"Could not apply the resource-blocking profile: {e}")
+        return _Session(driver, profile_dir, key)
+
+    def _healthy(self, session):
+        try:
+            session.driver.window_handles
+            return session.driver.current_url is not None
+        except Exception:
+            return False
+
+    def _reset(self, driver):
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.execute_cdp_cmd('Emulation.clearGeolocationOverride', {})
+        driver.get('about:blank')
+
+    def _discard(self, session):
+        terminate_browser(session.driver, session.profile_dir)
+
+
+# One pool per worker process
+browser_pool = BrowserPool()
@@ -1,61 +1,47 @@
-import time
 import csv
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, InvalidSessionIdException, NoSuchWindowException
-from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.action_chains import ActionChains
 import pandas as pd
-import re
 import os
-import urllib.parse
 import threading
-from django.core.cache import cache
 import signal
-import psutil
 import atexit
 import json
+from .cancellation import cancel_signal
+from .progress import JobProgress
+from .checkpoint import JobCheckpoint
+from .detail_pool import DetailPool
+from .job_registry import job_registry
+from .browser_pool import browser_pool, chrome_options
+from .feed import FeedHarvest, place_key
+from .navigation import MapsNavigator
+from .place_extract import BUSINESS_PROFILE, place_directions_url
+from .waits import PageWaits, feed_present, network_quiet
 
 class BusinessScraper:
-    # Class variable to store all active scrapers
-    active_scrapers = {}
-
     def __init__(self, headless=False, job_id=None):
         """Initialize the business scraper with job_id for cancellation"""
-        self.options = Options()
-        if headless:
-            self.options.add_argument("--headless")
-        
-        self.options.add_argument("--no-sandbox")
-        self.options.add_argument("--disable-dev-shm-usage")
-        self.options.add_argument("--disable-blink-features=AutomationControlled")
-        self.options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        self.options.add_experimental_option('useAutomationExtension', False)
-        self.options.add_argument("--window-size=1920,1080")
-        self.options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36")
-        
-        # Add a unique user data directory for this instance
-        import tempfile
-        self.user_data_dir = tempfile.mkdtemp()
-        self.options.add_argument(f"--user-data-dir={self.user_data_dir}")
+        self.options = chrome_options(headless)
         
         self.job_id = job_id  # Store job_id for cancellation checks
+        self.progress = JobProgress(job_id)
+        self.checkpoint = JobCheckpoint(job_id)
+        self.cancel = cancel_signal(job_id)
+        self.waits = PageWaits(job_id)
+        self.navigator = MapsNavigator(self.waits)
+        self.details = DetailPool(self, job_id)
         self.driver = None
         self.driver_pid = None
         self.is_cancelled = False
-        self.chrome_start_time = time.time()
         
-        # Register this instance globally
+        # Register this instance in the job registry
         if self.job_id:
-            BusinessScraper.active_scrapers[self.job_id] = self
+            job_registry.register(self.job_id, self)
 
     def should_cancel(self):
         """Check if scraping should be cancelled"""
         if self.job_id:
-            cancelled = cache.get(f"cancel_scraping_{self.job_id}", False)
+            cancelled = self.cancel.is_set()
             if cancelled:
                 self.is_cancelled = True
             return cancelled
@@ -66,89 +52,37 @@ class BusinessScraper:
         # Mark as cancelled
         self.is_cancelled = True
         
-        # First, try to close the driver normally
-        if self.driver:
+        # Stop the detail fetches first; their threads may still be loading pages on this driver
+        self.details.close()
+
+        # Hand the driver back to the pool (reset and kept warm, or quit when the pool is full), exactly once
+        driver, self.driver = self.driver, None
+        if driver:
             try:
-                self.driver.quit()
+                browser_pool.release(driver)
             except Exception as e:
-                # If driver closing failed, try to kill the process
-                self.kill_chrome_process()
-
-        # Clean up user data directory
-        try:
-            import shutil
-            shutil.rmtree(self.user_data_dir, ignore_errors=True)
-        except:
-            pass
-
-    def kill_chrome_process(self):
-        """Kill Chrome process for this specific scraper"""
-        try:
-            # If we have the PID, kill it directly
-            if self.driver_pid:
-                try:
-                    proc = psutil.Process(self.driver_pid)
-                    proc.kill()
-                    proc.wait(timeout=5)
-                    return True
-                except psutil.NoSuchProcess:
-                    # Process already terminated
-                    return True
-                except psutil.TimeoutExpired:
-                    # Force kill if timeout
-                    proc.kill()
-                    return True
-                except Exception:
-                    pass
-            
-            # If PID approach failed, try to find and kill by user data directory
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    if 'chrome' in proc.info['name'].lower():
-                        cmdline = ' '.join(proc.info['cmdline'])
-                        if self.user_data_dir in cmdline:
-                            proc.kill()
-                            proc.wait(timeout=5)
-                            return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
-                    continue
-            
-            # If user data approach failed, try to find by startup time (within last 30 seconds)
-            current_time = time.time()
-            for proc in psutil.process_iter(['pid', 'name', 'create_time', 'cmdline']):
-                try:
-                    if 'chrome' in proc.info['name'].lower():
-                        proc_start_time = proc.info['create_time']
-                        if (current_time - proc_start_time < 30 and 
-                            self.chrome_start_time - 5 <= proc_start_time <= self.chrome_start_time + 30):
-                            cmdline = ' '.join(proc.info['cmdline'])
-                            if '--user-data-dir' in cmdline:  # Likely our process
-                                proc.kill()
-                                proc.wait(timeout=5)
-                                return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
-                    continue
-            
-            return False
-        except Exception as e:
-            print(f"Error in kill_chrome_process: {e}")
-            return False
+                # If handing it back failed, kill its whole process group
+                browser_pool.terminate(driver)
 
     def scrape_businesses_comprehensive(self, location, business_type, max_results=25):
         """Comprehensive business scraping with cancellation support"""
-        driver = webdriver.Chrome(options=self.options)
+        driver = browser_pool.lease(self.options)
         self.driver = driver
         self.driver_pid = self.driver.service.process.pid
+        job_registry.attach(self.job_id, self.driver)
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         
         all_businesses = []
-        all_urls = set()
+        seen_places = {place_key(url) for url in self.checkpoint.urls}
         
         try:
             # Define search terms based on business type
             search_terms = self.get_search_terms(business_type, location)
             
-            for search_term in search_terms:
+            for term_index, search_term in enumerate(search_terms, start=1):
+                self.progress.searching(term_index, len(search_terms))
+                if self.checkpoint.skip_search(search_term, max_results):
+                    continue
                 if self.should_cancel():
                     print("Scraping cancelled by user - closing Chrome for this job")
                     self.close_chrome_tab()
@@ -157,34 +91,34 @@ class BusinessScraper:
                 try:
                     print(f"\n🔍 Searching: {search_term}")
                     
-                    driver.get("https://www.google.com/maps")
-                    time.sleep(3)
-                    
-                    search_box = WebDriverWait(driver, 15).until(
-                        EC.element_to_be_clickable((By.ID, "searchboxinput"))
-                    )
-                    search_box.clear()
-                    search_box.send_keys(search_term)
-                    search_box.send_keys(Keys.ENTER)
-                    time.sleep(5)
+                    self.navigator.search(driver, search_term)
                     
                     urls = self.enhanced_url_collection(driver, max_results)
-                    new_urls = [url for url in urls if url not in all_urls]
-                    all_urls.update(new_urls)
+                    new_urls = [url for url in urls if place_key(url) not in seen_places]
+                    seen_places.update(place_key(url) for url in new_urls)
+                    self.checkpoint.term_done(search_term, new_urls, self.details.listings)
+                    self.progress.urls_collected(len(seen_places))
                     
                     print(f"   Found {len(new_urls)} new business URLs")
                     
-                    if len(all_urls) >= max_results:
+                    if len(seen_places) >= max_results:
                         break
                         
                 except Exception as e:
                     print(f"   Error with search term '{search_term}': {e}")
                     continue
             
-            print(f"\n📊 Total unique business URLs collected: {len(all_urls)}")
-            url_list = list(all_urls)[:max_results]
+            print(f"\n📊 Total unique business URLs collected: {len(seen_places)}")
+            url_list = list(self.checkpoint.urls)[:max_results]
             
+            pending_urls = [url for url in url_list if not self.checkpoint.record_for(url)]
+            self.details.start(driver, pending_urls, self.extract_complete_business_data, profile=BUSINESS_PROFILE)
             for i, url in enumerate(url_list):
+                self.progress.extracting(i + 1, len(url_list), len(all_businesses))
+                done_record = self.checkpoint.record_for(url)
+                if done_record:
+                    all_businesses.append(done_record)
+                    continue
                 if self.should_cancel():
                     print("Scraping cancelled by user - closing Chrome for this job")
                     self.close_chrome_tab()
@@ -192,12 +126,11 @@ class BusinessScraper:
                     
                 try:
                     print(f"\n📍 Processing business {i+1}/{len(url_list)}...")
-                    driver.get(url)
-                    time.sleep(4)
-                    business_data = self.extract_complete_business_data(driver, url)
+                    business_data = self.details.fetch(url)
                     if business_data and business_data.get('name') and business_data['name'] != 'Results':
                         business_data['category'] = business_type.capitalize()
                         all_businesses.append(business_data)
+                        self.checkpoint.place_done(url, business_data)
                         print(f"   ✅ {business_data['name']}")
                 except Exception as e:
                     print(f"   Error processing URL {url}: {e}")
@@ -212,12 +145,13 @@ class BusinessScraper:
             return []
         
         finally:
-            # Remove this instance from global registry
-            if self.job_id in BusinessScraper.active_scrapers:
-                del BusinessScraper.active_scrapers[self.job_id]
+            self.details.close()
+            self.waits.flush()
+            # Remove this instance from the job registry
+            job_registry.unregister(self.job_id)
             
-            # Always close Chrome when done (unless already closed due to cancellation)
-            if not self.is_cancelled:
+            # Always hand the driver back when done (unless cancellation already did)
+            if self.driver:
                 self.close_chrome_tab()
         
         return all_businesses
@@ -243,192 +177,47 @@ class BusinessScraper:
 
     def enhanced_url_collection(self, driver, target_count):
         """Enhanced URL collection with scrolling and cancellation support"""
-        business_urls = []
-        time.sleep(5)
+        harvest = FeedHarvest(listings=self.details.listings)
+        self.waits.until(driver, feed_present, 5, replaces=5)
         
         scroll_attempts = 0
         max_scroll_attempts = 10
         
-        while scroll_attempts < max_scroll_attempts and len(business_urls) < target_count and not self.should_cancel():
-            links = driver.find_elements(By.CSS_SELECTOR, "a[href*='/maps/place/']")
-            
-            for link in links:
-                if self.should_cancel():
-                    return business_urls  # Return what we have so far
-                    
-                try:
-                    href = link.get_attribute('href')
-                    if href and href not in business_urls:
-                        business_urls.append(href)
-                except:
-                    continue
-            
-            try:
-                results_panel = driver.find_element(By.CSS_SELECTOR, "[role='main']")
-                driver.execute_script("arguments[0].scrollTop += 500;", results_panel)
-                time.sleep(2)
-            except:
-                driver.execute_script("window.scrollBy(0, 500);")
-                time.sleep(2)
-            
+        while scroll_attempts < max_scroll_attempts and len(harvest.urls) < target_count and not self.should_cancel():
+            # One script call reads the feed's links and scrolls the panel
+            harvest.scroll(driver, panel="[role='main']", step=500)
+            self.waits.until(driver, network_quiet(), 2, replaces=2)
             scroll_attempts += 1
         
-        return business_urls
+        return harvest.urls
     
     def extract_complete_business_data(self, driver, place_url):
         """Extract business data from Google Maps page with cancellation support"""
         if self.should_cancel():
             return {}
             
-        business_data = {}
-        
         try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "h1"))
-            )
-            time.sleep(3)
-            
-            if self.should_cancel():
-                return {}
-            
-            # Extract name
-            name_selectors = ["h1.DUwDvf", "h1"]
-            for selector in name_selectors:
-                if self.should_cancel():
-                    return {}
-                try:
-                    name_element = driver.find_element(By.CSS_SELECTOR, selector)
-                    name_text = name_element.text.strip()
-                    if name_text and len(name_text) > 1:
-                        business_data['name'] = name_text
-                        break
-                except:
-                    continue
-            
-            if self.should_cancel():
-                return {}
-            
-            # Address
-            try:
-                address = driver.find_element(By.CSS_SELECTOR, "[data-item-id='address']").text.strip()
-                business_data['address'] = address
-                encoded_address = urllib.parse.quote(address)
-                business_data['directions_url'] = f"https://www.google.com/maps/dir/?api=1&destination={encoded_address}"
-            except:
-                business_data['address'] = ''
-                business_data['directions_url'] = ''
-            
-            if self.should_cancel():
-                return {}
-            
-            # Phone
-            try:
-                phone = driver.find_element(By.CSS_SELECTOR, "[data-item-id*='phone']").text.strip()
-                business_data['phone'] = phone
-            except:
-                business_data['phone'] = ''
-            
-            if self.should_cancel():
-                return {}
-            
-            # Website
-            try:
-                website = driver.find_element(By.CSS_SELECTOR, "[data-item-id='authority']").get_attribute('href')
-                business_data['website'] = website
-            except:
-                business_data['website'] = ''
-            
-            if self.should_cancel():
-                return {}
-            
-            # Rating and reviews
-            try:
-                rating = driver.find_element(By.CSS_SELECTOR, "div.F7nice span[aria-hidden]").text.strip()
-                business_data['rating'] = rating
-                reviews_count = driver.find_element(By.CSS_SELECTOR, "div.F7nice span:last-child").text.strip()
-                business_data['reviews_count'] = reviews_count.replace('(', '').replace(')', '')
-            except:
-                business_data['rating'] = ''
-                business_data['reviews_count'] = ''
-            
-            if self.should_cancel():
-                return {}
-            
-            # Additional fields (email, hours, etc.)
-            business_data['email'] = ''
-            try:
-                email_elements = driver.find_elements(By.CSS_SELECTOR, 'a[href^="mailto:"]')
-                if email_elements:
-                    href = email_elements[0].get_attribute('href')
-                    business_data['email'] = href.replace('mailto:', '').strip()
-                else:
-                    page_text = driver.page_source
-                    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-                    email_matches = re.findall(email_pattern, page_text)
-                    if email_matches:
-                        business_data['email'] = email_matches[0]
-            except:
-                pass
-            
-            if self.should_cancel():
-                return {}
-            
-            business_data['hours'] = ''
-            try:
-                hours_selectors = [
-                    "button[data-item-id='oh'] .Io6YTe",
-                    "button[aria-label*='Hours'] .fontBodyMedium",
-                    ".t39EBf .G8aQO"
-                ]
-                for selector in hours_selectors:
-                    if self.should_cancel():
-                        return {}
-                    try:
-                        hours_element = driver.find_element(By.CSS_SELECTOR, selector)
-                        hours_text = hours_element.text.strip()
-                        if hours_text:
-                            business_data['hours'] = hours_text
-                            break
-                    except:
-                        continue
-            except:
-                pass
-            
-            if self.should_cancel():
-                return {}
-            
-            category_selectors = ["button[jsaction*='pane.category'] .DkEaL", ".DkEaL", ".YhemCb"]
-            for selector in category_selectors:
-                if self.should_cancel():
-                    return {}
-                try:
-                    category_element = driver.find_element(By.CSS_SELECTOR, selector)
-                    category_text = category_element.text.strip()
-                    if category_text and len(category_text) < 100:
-                        business_data['category'] = category_text
-                        break
-                except:
-                    continue
-            if 'category' not in business_data:
-                business_data['category'] = ''
-            
-            if self.should_cancel():
-                return {}
-            
-            try:
-                data_match = re.search(r'data=!4m7!3m6!1s0x[^:]+:0x[^!]+!8m2!3d([-\d.]+)!4d([-\d.]+)', place_url)
-                if data_match:
-                    lat, lng = data_match.groups()
-                    business_data['directions_url'] = f"{place_url}&dirflg=d&travelmode=driving&ll={lat}%2C{lng}"
-                else:
-                    business_data['directions_url'] = f"{place_url}&dirflg=d"
-            except:
-                business_data['directions_url'] = place_url
-
+            # One call once DetailPool's readiness wait has passed; a missing field is an immediate miss
+            fields = self.details.read_fields(driver)
         except (TimeoutException, NoSuchElementException, InvalidSessionIdException, NoSuchWindowException) as e:
             print(f"   Error extracting business  {e}")
             return {}
 
+        category = fields.get('category', '')
+        business_data = {
+            'name': fields.get('name', ''),
+            'address': fields.get('address', ''),
+            'phone': fields.get('phone', ''),
+            'website': fields.get('website', ''),
+            'rating': fields.get('rating', ''),
+            'reviews_count': fields.get('reviews', '').replace('(', '').replace(')', ''),
+            'email': fields.get('email', ''),
+            'hours': fields.get('hours', ''),
+            'category': category if len(category) < 100 else '',
+            'latitude': fields.get('latitude', ''),
+            'longitude': fields.get('longitude', ''),
+            'directions_url': place_directions_url(place_url),
+        }
         return business_data if business_data.get('name') else {}
 
     def save_simplified_csv(self, businesses, filename, business_type=None, base_dir='.'):
@@ -465,33 +254,3 @@ class BusinessScraper:
 def scrape_business_type(business_type, location, max_results, job_id=None):
     scraper = BusinessScraper(headless=True, job_id=job_id)
     return scraper.scrape_businesses_comprehensive(location, business_type, max_results)
-
-def close_business_scraper_by_job_id(job_id):
-    """Close a specific business scraper instance by job ID"""
-    scraper_instance = BusinessScraper.active_scrapers.get(job_id)
-    if scraper_instance:
-        try:
-            scraper_instance.close_chrome_tab()
-            return True
-        except Exception as e:
-            print(f"Error closing business scraper for job {job_id}: {e}")
-            return False
-    else:
-        # If instance not found in registry, try to kill by process
-        try:
-            import psutil
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    if 'chrome' in proc.info['name'].lower():
-                        cmdline = ' '.join(proc.info['cmdline'])
-                        if f'job_{job_id}' in cmdline or f'jobid_{job_id}' in cmdline:
-                            proc.kill()
-                            proc.wait(timeout=5)
-                            print(f"Killed Chrome process by cmdline for job {job_id}")
-                            return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
-                    continue
-        except Exception as e:
-            print(f"Error in fallback process killing: {e}")
-        
-        return False
\ No newline at end of file
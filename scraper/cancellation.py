@@ -0,0 +1,111 @@
+"""
+Job cancellation that reaches the worker running the job.
+
+Scrapers used to poll ``cache.get(f"cancel_scraping_{job_id}")`` many times
+per place. With the ``DummyCache`` backend the flag set by the cancel
+endpoint was never stored, so a cancel never reached the loop, and with a
+real cache every check was a network round trip.
+
+The cancel endpoint now calls ``request_cancel``, which sets
+``ScrapeJob.cancel_requested``. The job row is the one channel both the web
+process and the worker process can see. In the worker, ``cancel_signal``
+gives every part of the job (scraper, ``DetailPool``, ``jobs``) the same
+``CancelSignal``. Its ``is_set()`` is an in-process ``threading.Event``
+check, cheap enough for hot loops. A daemon thread polls the row every
+``SCRAPE_CANCEL_POLL_SECONDS`` and sets the event, so a cancel is noticed
+well within one page load. The scrapers stop at their next check and the
+records extracted so far stay in the job's checkpoint.
+
+A job that is still running ``SCRAPE_CANCEL_KILL_AFTER_SECONDS`` after the
+cancel (stuck in a driver call on a hung page) has its browsers killed by
+the same thread, through ``job_registry.terminate``.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_signals = {}  # job_id -> CancelSignal of a job running in this process
+_signals_lock = threading.Lock()
+
+
+class CancelSignal:
+    def __init__(self, job_id=None):
+        self.job_id = job_id
+        self._event = threading.Event()
+        self._stopped = threading.Event()
+        self._watcher = None
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def set(self):
+        self._event.set()
+
+    def watch(self, interval=None):
+        """Start polling the job row for a cancel request"""
+        if not self.job_id or self._watcher:
+            return
+        interval = settings.SCRAPE_CANCEL_POLL_SECONDS if interval is None else interval
+        self._watcher = threading.Thread(
+            target=self._poll, args=(interval,), name=f"cancel-{self.job_id}", daemon=True
+        )
+        self._watcher.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _poll(self, interval):
+        from .models import ScrapeJob
+        try:
+            while not self._event.is_set() and not self._stopped.wait(interval):
+                try:
+                    if ScrapeJob.objects.filter(job_id=self.job_id, cancel_requested=True).exists():
+                        logger.info(f"Cancel requested for job {self.job_id}")
+                        self._event.set()
+                except Exception as e:
+                    logger.warning(f"Could not check job {self.job_id} for cancellation: {e}")
+        finally:
+            # Threads get their own database connection from Django; do not leak it
+            connection.close()
+        # Released by then when the scraper honoured the cancel
+        if self._event.is_set() and not self._stopped.wait(settings.SCRAPE_CANCEL_KILL_AFTER_SECONDS):
+            self._force_stop()
+
+    def _force_stop(self):
+        from .job_registry import job_registry
+        logger.warning(f"Job {self.job_id} still running {settings.SCRAPE_CANCEL_KILL_AFTER_SECONDS}s after cancel")
+        job_registry.terminate(self.job_id)
+
+
+def cancel_signal(job_id):
+    """The job's signal in this process, watched from first use until ``release_cancel_signal``"""
+    if not job_id:
+        return CancelSignal()
+    with _signals_lock:
+        signal = _signals.get(job_id)
+        if signal is None:
+            signal = _signals[job_id] = CancelSignal(job_id)
+            signal.watch()
+        return signal
+
+
+def release_cancel_signal(job_id):
+    """Stop watching a job that has finished in this process"""
+    with _signals_lock:
+        signal = _signals.pop(job_id, None)
+    if signal:
+        signal.stop()
+
+
+def request_cancel(job_id):
+    """Ask the job to stop, wherever it runs; True when the job row exists"""
+    from .models import ScrapeJob
+    with _signals_lock:
+        signal = _signals.get(job_id)
+    if signal:
+        signal.set()
+    return bool(ScrapeJob.objects.filter(job_id=job_id).update(cancel_requested=True))
@@ -0,0 +1,91 @@
+"""
+Resumable scrape state for a ``ScrapeJob``.
+
+A ``JobCheckpoint`` remembers which search terms have finished, the ordered
+URL frontier they produced (with the feed-card record of each URL, for fast
+listing jobs) and every record extracted so far, and writes
+them to ``ScrapeJob.checkpoint`` as the job runs. When a worker is restarted
+mid-job the next attempt loads that state, skips finished terms and places
+and only visits what is left. Without a job id the checkpoint still keeps
+the frontier order in memory but never touches the database.
+"""
+import logging
+
+from django.utils import timezone
+
+from .feed import place_key
+
+logger = logging.getLogger(__name__)
+
+
+class JobCheckpoint:
+    def __init__(self, job_id=None):
+        self.job_id = job_id
+        self.completed_terms = []
+        self.urls = []
+        self.records = {}
+        self.listings = {}  # url -> feed-card record, see DetailPool.listings
+        self._known_places = set()  # place_key of every frontier URL
+        if job_id:
+            self._load()
+
+    def _load(self):
+        from .models import ScrapeJob
+        state = ScrapeJob.objects.filter(job_id=self.job_id).values_list('checkpoint', flat=True).first() or {}
+        self.completed_terms = list(state.get('completed_terms', []))
+        self.urls = list(state.get('urls', []))
+        self.records = dict(state.get('records', {}))
+        self.listings = dict(state.get('listings', {}))
+        self._known_places = {place_key(url) for url in self.urls}
+        if self.urls:
+            logger.info(
+                f"Resuming job {self.job_id}: {len(self.completed_terms)} search terms, "
+                f"{len(self.urls)} URLs and {len(self.records)} records already done"
+            )
+
+    @property
+    def resumed(self):
+        return bool(self.completed_terms or self.urls)
+
+    def skip_search(self, search_term, max_results=None):
+        """True when the term already ran, or the frontier already holds enough URLs"""
+        if search_term in self.completed_terms:
+            return True
+        return bool(max_results) and len(self.urls) >= max_results
+
+    def term_done(self, search_term, new_urls, listings=None):
+        """Record a finished search term and append its new URLs, with their ``listings`` feed cards, to the frontier"""
+        for url in new_urls:
+            if place_key(url) not in self._known_places:
+                self._known_places.add(place_key(url))
+                self.urls.append(url)
+                if listings and url in listings:
+                    self.listings[url] = listings[url]
+        self.completed_terms.append(search_term)
+        self._save()
+
+    def record_for(self, url):
+        """The record already extracted for ``url``, or None"""
+        return self.records.get(url)
+
+    def place_done(self, url, record):
+        self.records[url] = record
+        self._save()
+
+    def _save(self):
+        if not self.job_id:
+            return
+        from .models import ScrapeJob
+        try:
+            ScrapeJob.objects.filter(job_id=self.job_id).update(
+                checkpoint={
+                    'completed_terms': self.completed_terms,
+                    'urls': self.urls,
+                    'records': self.records,
+                    'listings': self.listings,
+                },
+                updated_at=timezone.now(),
+            )
+        except Exception as e:
+            # A missed checkpoint only costs extra page visits on resume
+            logger.warning(f"Could not save checkpoint for job {self.job_id}: {e}")
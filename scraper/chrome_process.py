@@ -0,0 +1,183 @@
+"""
+Process-tree lifecycle of the scrapers' Chrome sessions.
+
+Eight scraper modules each had a copy of ``kill_chrome_process``. It killed
+the chromedriver PID, then scanned every process on the host for the
+profile directory in its command line, then scanned again by start-time
+window. Under load that is several O(processes) scans per job teardown.
+It also missed the browser and its renderers whenever the first kill
+worked, and renderers orphaned by the kill were left as zombies.
+
+``chrome_service`` starts chromedriver in a new session. Chromedriver, the
+browser and every renderer, GPU and zygote helper then share one process
+group, whose id is chromedriver's PID and is known from launch.
+``terminate_browser`` tears the whole tree down with one ``killpg``, reaps
+the group's exited processes and removes the profile directory.
+``become_subreaper`` (Linux) makes a worker process the parent of
+renderers whose browser died, so those are reaped with the group instead
+of lingering as zombies under init. ``reap_children`` only ever waits on
+groups recorded by ``track_group``, never ``waitpid(-1)``, so it cannot
+steal the exit status of a ``subprocess.Popen`` elsewhere in the worker.
+
+Every session also carries ``OWNER_ENV`` in its environment, naming the
+worker that launched it. Chromedriver passes it on to the browser and
+its helpers, so the reaper can tell a live worker's idle pooled session
+from one whose worker died, whoever adopted it since.
+
+Where process groups do not exist (Windows) everything falls back to
+``driver.quit()``.
+"""
+import ctypes
+import logging
+import os
+import shutil
+import signal
+import time
+
+import psutil
+from selenium.webdriver.chrome.service import Service
+
+logger = logging.getLogger(__name__)
+
+PR_SET_CHILD_SUBREAPER = 36
+
+PROFILE_PREFIX = 'scrape-chrome-'  # Temp profile directories of scraper browsers, recognised by the reaper
+OWNER_ENV = 'SCRAPE_CHROME_OWNER'  # "<pid>:<create_time>" of the worker that launched a session
+
+_subreaper = False
+_groups = set()  # Process groups of the sessions this process launched, for reap_children
+
+
+def process_groups_supported():
+    return hasattr(os, 'killpg')
+
+
+def chrome_service():
+    """A chromedriver service that leads its own process group and names this process as its owner"""
+    env = {**os.environ, OWNER_ENV: owner_token()}
+    if not process_groups_supported():
+        return Service(env=env)
+    return Service(env=env, popen_kw={'start_new_session': True})
+
+
+def owner_token(pid=None):
+    """``"<pid>:<create_time>"`` of a process (this one by default), safe against PID reuse"""
+    process = psutil.Process(pid)
+    return f"{process.pid}:{process.create_time()}"
+
+
+def owner_alive(token):
+    """Whether the process an ``OWNER_ENV`` token names is still running"""
+    try:
+        pid, created = token.split(':', 1)
+        return abs(psutil.Process(int(pid)).create_time() - float(created)) <= 1
+    except (ValueError, psutil.Error):
+        return False
+
+
+def become_subreaper():
+    """Adopt orphaned descendants of this process, so dead browsers' renderers can be reaped (Linux only)"""
+    global _subreaper
+    if _subreaper or not os.path.exists('/proc/self'):
+        return _subreaper
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        _subreaper = libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) == 0
+    except (OSError, AttributeError) as e:
+        logger.debug(f"Could not become a child subreaper: {e}")
+    return _subreaper
+
+
+def process_group(driver):
+    """``[pgid, create_time]`` of the driver's chromedriver when it leads its process group, else None"""
+    try:
+        pid = driver.service.process.pid
+        if os.getpgid(pid) != pid:
+            return None
+        return [pid, psutil.Process(pid).create_time()]
+    except (AttributeError, OSError, psutil.Error):
+        return None
+
+
+def track_group(driver):
+    """Remember the driver's process group, so ``reap_children`` collects what exits from it later"""
+    group = process_group(driver)
+    if group is not None:
+        _groups.add(group[0])
+
+
+def reap_children():
+    """Collect exited children in the tracked groups, e.g. renderers adopted as a subreaper; the number reaped"""
+    reaped = 0
+    for pgid in list(_groups):
+        while True:
+            try:
+                pid, _ = os.waitpid(-pgid, os.WNOHANG)
+            except ChildProcessError:
+                if not _group_exists(pgid):
+                    _groups.discard(pgid)  # Nothing left in it that could still become ours
+                break
+            if not pid:
+                break
+            reaped += 1
+    return reaped
+
+
+def _group_exists(pgid):
+    try:
+        os.killpg(pgid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def reap_group(pgid, timeout=5):
+    """Collect the exit status of this process's children in the group; the number reaped"""
+    deadline = time.monotonic() + timeout
+    reaped = 0
+    while True:
+        try:
+            pid, _ = os.waitpid(-pgid, os.WNOHANG)
+        except ChildProcessError:
+            break  # None of our children are left in the group
+        if pid:
+            reaped += 1
+            continue
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(0.05)
+    return reaped
+
+
+def kill_group(pgid, created=None):
+    """SIGKILL a whole process group; False when it is gone, or ``pgid`` is now another process"""
+    if created is not None:
+        try:
+            if abs(psutil.Process(pgid).create_time() - created) > 1:
+                return False  # The PID now belongs to another process
+        except psutil.NoSuchProcess:
+            pass  # The leader exited but the rest of its group may not have
+        except psutil.Error:
+            return False
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+def terminate_browser(driver, profile_dir=None, timeout=5):
+    """Kill the driver's whole process tree at once, reap it and remove its profile directory"""
+    group = process_group(driver) if process_groups_supported() else None
+    if group is None:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+    else:
+        kill_group(group[0])
+        reap_group(group[0], timeout)
+    if profile_dir:
+        shutil.rmtree(profile_dir, ignore_errors=True)
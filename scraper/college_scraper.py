@@ -1,58 +1,46 @@
-import time
 import csv
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, InvalidSessionIdException, NoSuchWindowException
-from selenium.webdriver.common.keys import Keys
 import pandas as pd
 import os
-import urllib.parse
-from django.core.cache import cache
 import signal
-import psutil
 import atexit
 import threading
 import json
+from .cancellation import cancel_signal
+from .progress import JobProgress
+from .checkpoint import JobCheckpoint
+from .detail_pool import DetailPool
+from .job_registry import job_registry
+from .browser_pool import browser_pool, chrome_options
+from .feed import FeedHarvest, place_key
+from .navigation import MapsNavigator
+from .place_extract import directions_url
+from .waits import PageWaits, feed_present, network_quiet
 
 class SimplifiedGoogleMapsCollegeScraper:
-    # Class variable to store all active scrapers
-    active_scrapers = {}
-
     def __init__(self, headless=False, job_id=None):
         """Initialize the simplified college scraper with job_id for cancellation"""
-        self.options = Options()
-        if headless:
-            self.options.add_argument("--headless")
-        self.options.add_argument("--no-sandbox")
-        self.options.add_argument("--disable-dev-shm-usage")
-        self.options.add_argument("--disable-blink-features=AutomationControlled")
-        self.options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        self.options.add_experimental_option('useAutomationExtension', False)
-        self.options.add_argument("--window-size=1920,1080")
-        self.options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36")
-        
-        # Add a unique user data directory for this instance
-        import tempfile
-        self.user_data_dir = tempfile.mkdtemp()
-        self.options.add_argument(f"--user-data-dir={self.user_data_dir}")
+        self.options = chrome_options(headless)
         
         self.job_id = job_id  # Store job_id for cancellation checks
+        self.progress = JobProgress(job_id)
+        self.checkpoint = JobCheckpoint(job_id)
+        self.cancel = cancel_signal(job_id)
+        self.waits = PageWaits(job_id)
+        self.navigator = MapsNavigator(self.waits)
+        self.details = DetailPool(self, job_id)
         self.driver = None
         self.driver_pid = None
         self.is_cancelled = False
-        self.chrome_start_time = time.time()
         
-        # Register this instance globally
+        # Register this instance in the job registry
         if self.job_id:
-            SimplifiedGoogleMapsCollegeScraper.active_scrapers[self.job_id] = self
+            job_registry.register(self.job_id, self)
 
     def should_cancel(self):
         """Check if scraping should be cancelled"""
         if self.job_id:
-            cancelled = cache.get(f"cancel_scraping_{self.job_id}", False)
+            cancelled = self.cancel.is_set()
             if cancelled:
                 self.is_cancelled = True
             return cancelled
@@ -63,83 +51,28 @@ class SimplifiedGoogleMapsCollegeScraper:
         # Mark as cancelled
         self.is_cancelled = True
         
-        # First, try to close the driver normally
-        if self.driver:
+        # Stop the detail fetches first; their threads may still be loading pages on this driver
+        self.details.close()
+
+        # Hand the driver back to the pool (reset and kept warm, or quit when the pool is full), exactly once
+        driver, self.driver = self.driver, None
+        if driver:
             try:
-                self.driver.quit()
+                browser_pool.release(driver)
             except Exception as e:
-                # If driver closing failed, try to kill the process
-                self.kill_chrome_process()
-
-        # Clean up user data directory
-        try:
-            import shutil
-            shutil.rmtree(self.user_data_dir, ignore_errors=True)
-        except:
-            pass
-
-    def kill_chrome_process(self):
-        """Kill Chrome process for this specific scraper"""
-        try:
-            # If we have the PID, kill it directly
-            if self.driver_pid:
-                try:
-                    proc = psutil.Process(self.driver_pid)
-                    proc.kill()
-                    proc.wait(timeout=5)
-                    return True
-                except psutil.NoSuchProcess:
-                    # Process already terminated
-                    return True
-                except psutil.TimeoutExpired:
-                    # Force kill if timeout
-                    proc.kill()
-                    return True
-                except Exception:
-                    pass
-            
-            # If PID approach failed, try to find and kill by user data directory
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    if 'chrome' in proc.info['name'].lower():
-                        cmdline = ' '.join(proc.info['cmdline'])
-                        if self.user_data_dir in cmdline:
-                            proc.kill()
-                            proc.wait(timeout=5)
-                            return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
-                    continue
-            
-            # If user data approach failed, try to find by startup time (within last 30 seconds)
-            current_time = time.time()
-            for proc in psutil.process_iter(['pid', 'name', 'create_time', 'cmdline']):
-                try:
-                    if 'chrome' in proc.info['name'].lower():
-                        proc_start_time = proc.info['create_time']
-                        if (current_time - proc_start_time < 30 and 
-                            self.chrome_start_time - 5 <= proc_start_time <= self.chrome_start_time + 30):
-                            cmdline = ' '.join(proc.info['cmdline'])
-                            if '--user-data-dir' in cmdline:  # Likely our process
-                                proc.kill()
-                                proc.wait(timeout=5)
-                                return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
-                    continue
-            
-            return False
-        except Exception as e:
-            print(f"Error in kill_chrome_process: {e}")
-            return False
+                # If handing it back failed, kill its whole process group
+                browser_pool.terminate(driver)
 
     def scrape_colleges_comprehensive(self, location, max_results=None):
         """Simplified college scraping focused on essential data only with cancellation support"""
-        driver = webdriver.Chrome(options=self.options)
+        driver = browser_pool.lease(self.options)
         self.driver = driver
         self.driver_pid = self.driver.service.process.pid
+        job_registry.attach(self.job_id, self.driver)
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         
         all_colleges = []
-        all_urls = set()
+        seen_places = {place_key(url) for url in self.checkpoint.urls}
         
         try:
             is_near_me = "near me" in location.lower()
@@ -163,7 +96,10 @@ class SimplifiedGoogleMapsCollegeScraper:
                     f"technology colleges {location}"
                 ]
             
-            for search_term in search_terms:
+            for term_index, search_term in enumerate(search_terms, start=1):
+                self.progress.searching(term_index, len(search_terms))
+                if self.checkpoint.skip_search(search_term, max_results):
+                    continue
                 if self.should_cancel():
                     print("Scraping cancelled by user - closing Chrome for this job")
                     self.close_chrome_tab()
@@ -171,31 +107,32 @@ class SimplifiedGoogleMapsCollegeScraper:
                 
                 try:
                     print(f"\n🔍 Searching: {search_term}")
-                    driver.get("https://www.google.com/maps")
-                    time.sleep(3)
-                    search_box = WebDriverWait(driver, 15).until(
-                        EC.element_to_be_clickable((By.ID, "searchboxinput"))
-                    )
-                    search_box.clear()
-                    search_box.send_keys(search_term)
-                    search_box.send_keys(Keys.ENTER)
-                    time.sleep(5)
+                    self.navigator.search(driver, search_term)
                     
                     urls = self.enhanced_url_collection(driver, max_results)
-                    new_urls = [url for url in urls if url not in all_urls]
-                    all_urls.update(new_urls)
+                    new_urls = [url for url in urls if place_key(url) not in seen_places]
+                    seen_places.update(place_key(url) for url in new_urls)
+                    self.checkpoint.term_done(search_term, new_urls, self.details.listings)
+                    self.progress.urls_collected(len(seen_places))
                     print(f"   Found {len(new_urls)} new college URLs")
                     
-                    if max_results and len(all_urls) >= max_results:
+                    if max_results and len(seen_places) >= max_results:
                         break
                 except Exception as e:
                     print(f"   Error with search term '{search_term}': {e}")
                     continue
             
-            print(f"\n📊 Total unique college URLs collected: {len(all_urls)}")
-            url_list = list(all_urls)[:max_results] if max_results else list(all_urls)
+            print(f"\n📊 Total unique college URLs collected: {len(seen_places)}")
+            url_list = list(self.checkpoint.urls)[:max_results] if max_results else list(self.checkpoint.urls)
             
+            pending_urls = [url for url in url_list if not self.checkpoint.record_for(url)]
+            self.details.start(driver, pending_urls, lambda page, url: self.extract_complete_college_data(page))
             for i, url in enumerate(url_list):
+                self.progress.extracting(i + 1, len(url_list), len(all_colleges))
+                done_record = self.checkpoint.record_for(url)
+                if done_record:
+                    all_colleges.append(done_record)
+                    continue
                 if self.should_cancel():
                     print("Scraping cancelled by user - closing Chrome for this job")
                     self.close_chrome_tab()
@@ -203,12 +140,11 @@ class SimplifiedGoogleMapsCollegeScraper:
                 
                 try:
                     print(f"\n📍 Processing college {i+1}/{len(url_list)}...")
-                    driver.get(url)
-                    time.sleep(4)
-                    college_data = self.extract_complete_college_data(driver)
+                    college_data = self.details.fetch(url)
                     if college_data and college_data.get('name') and college_data['name'] != 'Results':
                         college_data['category'] = 'College'
                         all_colleges.append(college_data)
+                        self.checkpoint.place_done(url, college_data)
                         print(f"   ✅ {college_data['name']}")
                 except Exception as e:
                     print(f"   Error processing URL {url}: {e}")
@@ -223,137 +159,60 @@ class SimplifiedGoogleMapsCollegeScraper:
             return []
         
         finally:
-            # Remove this instance from global registry
-            if self.job_id in SimplifiedGoogleMapsCollegeScraper.active_scrapers:
-                del SimplifiedGoogleMapsCollegeScraper.active_scrapers[self.job_id]
+            self.details.close()
+            self.waits.flush()
+            # Remove this instance from the job registry
+            job_registry.unregister(self.job_id)
             
-            # Always close Chrome when done (unless already closed due to cancellation)
-            if not self.is_cancelled:
+            # Always hand the driver back when done (unless cancellation already did)
+            if self.driver:
                 self.close_chrome_tab()
         
         return all_colleges
 
     def enhanced_url_collection(self, driver, target_count):
         """Enhanced URL collection with scrolling and cancellation support"""
-        college_urls = []
-        time.sleep(5)
+        harvest = FeedHarvest(listings=self.details.listings)
+        self.waits.until(driver, feed_present, 5, replaces=5)
         scroll_attempts = 0
         max_scroll_attempts = 10
         
-        while scroll_attempts < max_scroll_attempts and (not target_count or len(college_urls) < target_count):
+        while scroll_attempts < max_scroll_attempts and (not target_count or len(harvest.urls) < target_count):
             if self.should_cancel():
-                return college_urls  # Return what we have so far
+                return harvest.urls  # Return what we have so far
             
-            links = driver.find_elements(By.CSS_SELECTOR, "a[href*='/maps/place/']")
-            for link in links:
-                if self.should_cancel():
-                    return college_urls  # Return what we have so far
-                
-                try:
-                    href = link.get_attribute('href')
-                    if href and href not in college_urls:
-                        college_urls.append(href)
-                except:
-                    continue
-            try:
-                results_panel = driver.find_element(By.CSS_SELECTOR, "[role='main']")
-                driver.execute_script("arguments[0].scrollTop += 500;", results_panel)
-                time.sleep(2)
-            except:
-                driver.execute_script("window.scrollBy(0, 500);")
-                time.sleep(2)
+            # One script call reads the feed's links and scrolls the panel
+            harvest.scroll(driver, panel="[role='main']", step=500)
+            self.waits.until(driver, network_quiet(), 2, replaces=2)
             scroll_attempts += 1
         
-        return college_urls
+        return harvest.urls
 
     def extract_complete_college_data(self, driver):
         """Extract essential college data from Google Maps page with cancellation support"""
         if self.should_cancel():
             return None
             
-        college_data = {}
         try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "h1"))
-            )
-            time.sleep(3)
-            
-            if self.should_cancel():
-                return None
-            
-            # Name
-            name_selectors = ["h1.DUwDvf", "h1"]
-            for selector in name_selectors:
-                if self.should_cancel():
-                    return None
-                try:
-                    name_element = driver.find_element(By.CSS_SELECTOR, selector)
-                    name_text = name_element.text.strip()
-                    if name_text and len(name_text) > 1:
-                        college_data['name'] = name_text
-                        break
-                except:
-                    continue
-            
-            if self.should_cancel():
-                return None
-            
-            # Address
-            try:
-                address = driver.find_element(By.CSS_SELECTOR, "[data-item-id='address']").text.strip()
-                college_data['address'] = address
-                encoded_address = urllib.parse.quote(address)
-                college_data['directions_url'] = f"https://www.google.com/maps/dir/?api=1&destination={encoded_address}"
-            except:
-                college_data['address'] = ''
-                college_data['directions_url'] = ''
-            
-            if self.should_cancel():
-                return None
-            
-            # Phone
-            try:
-                phone = driver.find_element(By.CSS_SELECTOR, "[data-item-id*='phone']").text.strip()
-                college_data['phone'] = phone
-            except:
-                college_data['phone'] = ''
-            
-            if self.should_cancel():
-                return None
-            
-            # Website
-            try:
-                website = driver.find_element(By.CSS_SELECTOR, "[data-item-id='authority']").get_attribute('href')
-                college_data['website'] = website
-            except:
-                college_data['website'] = ''
-            
-            if self.should_cancel():
-                return None
-            
-            # Rating and reviews
-            try:
-                rating = driver.find_element(By.CSS_SELECTOR, "div.F7nice span[aria-hidden]").text.strip()
-                college_data['rating'] = rating
-                reviews_count = driver.find_element(By.CSS_SELECTOR, "div.F7nice span:last-child").text.strip()
-                college_data['reviews_count'] = reviews_count.replace('(', '').replace(')', '')
-            except:
-                college_data['rating'] = ''
-                college_data['reviews_count'] = ''
-            
-            if self.should_cancel():
-                return None
-            
-            # Category (e.g., College Type)
-            try:
-                category = driver.find_element(By.CSS_SELECTOR, "button.DkEaL").text.strip()
-                college_data['category'] = category
-            except:
-                college_data['category'] = 'College'
+            # One call once DetailPool's readiness wait has passed; a missing field is an immediate miss
+            fields = self.details.read_fields(driver)
         except (TimeoutException, NoSuchElementException, InvalidSessionIdException, NoSuchWindowException) as e:
             print(f"   Error extracting college  {e}")
             return None
         
+        college_data = {
+            'name': fields.get('name', ''),
+            'address': fields.get('address', ''),
+            'directions_url': directions_url(fields.get('address', '')),
+            'phone': fields.get('phone', ''),
+            'website': fields.get('website', ''),
+            'rating': fields.get('rating', ''),
+            'reviews_count': fields.get('reviews', '').replace('(', '').replace(')', ''),
+            'hours': fields.get('hours', ''),
+            'latitude': fields.get('latitude', ''),
+            'longitude': fields.get('longitude', ''),
+        }
+        college_data['category'] = fields.get('category') or 'College'
         return college_data
 
     def save_simplified_csv(self, colleges, filename):
@@ -382,33 +241,3 @@ class SimplifiedGoogleMapsCollegeScraper:
 def scrape_college(location, max_results, job_id=None):
     scraper = SimplifiedGoogleMapsCollegeScraper(headless=True, job_id=job_id)
     return scraper.scrape_colleges_comprehensive(location, max_results)
-
-def close_college_scraper_by_job_id(job_id):
-    """Close a specific college scraper instance by job ID"""
-    scraper_instance = SimplifiedGoogleMapsCollegeScraper.active_scrapers.get(job_id)
-    if scraper_instance:
-        try:
-            scraper_instance.close_chrome_tab()
-            return True
-        except Exception as e:
-            print(f"Error closing college scraper for job {job_id}: {e}")
-            return False
-    else:
-        # If instance not found in registry, try to kill by process
-        try:
-            import psutil
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    if 'chrome' in proc.info['name'].lower():
-                        cmdline = ' '.join(proc.info['cmdline'])
-                        if f'job_{job_id}' in cmdline or f'jobid_{job_id}' in cmdline:
-                            proc.kill()
-                            proc.wait(timeout=5)
-                            print(f"Killed Chrome process by cmdline for job {job_id}")
-                            return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
-                    continue
-        except Exception as e:
-            print(f"Error in fallback process killing: {e}")
-        
-        return False
\ No newline at end of file
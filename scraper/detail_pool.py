@@ -0,0 +1,365 @@
+"""
+Parallel place-detail extraction for one scrape job.
+
+After URL collection every scraper visits its place pages one by one. A
+``DetailPool`` spreads those visits over up to ``ScrapeJob.detail_sessions``
+Chrome sessions: the scraper's own driver plus extra sessions started on
+demand from the worker's ``browser_pool``. Pages are fetched ahead in
+background threads while the scraper consumes them in the original URL
+order, so progress, checkpoints and the result list are unchanged. With one
+session (the default) nothing is prefetched and pages are fetched on the
+scraper's driver. Pages are opened through the scraper's
+``MapsNavigator``, which clicks the place in the loaded results feed when
+it can instead of reloading Maps. Places that need a full page load are
+pipelined over two tabs of the one Chrome session
+(``SCRAPE_PIPELINE_TABS``): while the scraper extracts such a place in one
+tab, the next one in URL order is already loading in the other, and the
+tabs swap roles on the next fetch. With in-app navigation on (the default)
+those are the places missing from the loaded feed, i.e. the earlier search
+terms' results; the feed keeps a tab of its own, so the navigator still
+clicks the rest. With it off, every place is a full load.
+
+For fast listing jobs the scraper's URL collection fills ``listings`` with a
+record per feed card. A place page is then only opened when the job asked
+for a detail field (``ScrapeJob.detail_fields``) its card does not show, and
+only those fields are taken from the page. The cards are kept in the job's
+checkpoint, so a resumed or topped-up job that skips its finished searches
+still has them.
+
+Jobs with ``extraction_backend='network'`` decode places from the Maps
+responses captured in the Chrome performance log (see ``maps_payload``):
+the search payloads read while the feed was scrolled usually cover every
+place, so its page is not opened at all; otherwise the place is decoded
+from the responses its page load produced, and the DOM extractor is the
+fallback.
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from .browser_pool import apply_resource_profile, browser_pool
+from .cancellation import cancel_signal
+from .field_latency import FieldLatency
+from .job_registry import job_registry
+from .maps_payload import ResponseCapture, enable_capture
+from .place_cache import cached_place, place_id_from_url, remember_place
+from .place_extract import read_place_fields
+from .selector_registry import selector_registry
+from .waits import place_ready
+
+logger = logging.getLogger(__name__)
+
+
+class DetailPool:
+    def __init__(self, scraper, job_id=None):
+        self.scraper = scraper
+        self.job_id = job_id
+        self.sessions = 1
+        self.detail_fields = []
+        self.listings = None  # url -> feed-card record, filled during URL collection in fast listing mode
+        self.backend = 'dom'
+        self.capture = None
+        self.profile = None  # The scraper's extraction profile (place_extract), passed to start()
+        self.field_latency = FieldLatency(job_id)
+        self.cancel = cancel_signal(job_id)
+        if job_id:
+            self._load()
+        self._driver = None
+        self._extract = None
+        self._settle = 4
+        self._futures = {}
+        self._executor = None
+        self._slots = None
+        self._extra_drivers = []
+        self._tabs = None  # [foreground, background] window handles of the two-tab pipeline
+        self._feed_tab = None  # Handle of the navigator's results feed, kept apart from the pipeline tabs
+        self._upcoming = []  # URLs whose pages are loaded on the scraper's driver, in order
+        self._upcoming_index = {}
+        self._preloaded = {}  # url -> handle of the background tab loading it
+        self._local = threading.local()  # url and cached fields of the place each thread is extracting
+
+    def _load(self):
+        from .models import ScrapeJob
+        row = ScrapeJob.objects.filter(job_id=self.job_id).values(
+            'detail_sessions', 'listing_only', 'detail_fields', 'extraction_backend', 'checkpoint'
+        ).first() or {}
+        self.sessions = max(1, min(row.get('detail_sessions') or 1, settings.SCRAPE_DETAIL_SESSIONS_MAX))
+        if row.get('listing_only'):
+            # Cards of the URLs a resumed or topped-up job collected before, which its search skips now
+            self.listings = dict((row.get('checkpoint') or {}).get('listings', {}))
+            self.detail_fields = list(row.get('detail_fields') or [])
+        self.backend = row.get('extraction_backend') or 'dom'
+        if self.backend == 'network':
+            # Sessions for this job must keep a performance log; the pool keys them apart
+            enable_capture(self.scraper.options)
+            self.capture = ResponseCapture()
+
+    def start(self, driver, urls, extract, settle=4, profile=None):
+        """
+        Begin fetching ``urls`` with ``extract(driver, url)``.
+
+        ``extract`` reads the page through ``read_fields``. ``profile`` is
+        the extraction profile it reads with. ``settle`` is the most seconds
+        to wait for a place page to be ready after navigation. Records are
+        then collected with ``fetch(url)``.
+        """
+        self._driver = driver
+        self._extract = extract
+        self._settle = settle
+        self.profile = profile
+        if self.capture:
+            # The search payloads received while the feed was scrolled
+            found = self.capture.drain(driver)
+            logger.info(f"Job {self.job_id}: {found} places decoded from captured search responses")
+        urls = [url for url in urls if self._needs_page(url)]
+        sessions = min(self.sessions, len(urls), 1 + self._spare_sessions())
+        if sessions <= 1:
+            if settings.SCRAPE_PIPELINE_TABS:
+                # Places answered from the cache or captured responses need no page
+                loads = [url for url in urls if not self._answered(url)]
+                navigator = self.scraper.navigator
+                if navigator.enabled and loads:
+                    # The navigator clicks what is in its feed; only the rest are full loads
+                    in_feed = navigator.feed_places(driver)
+                    loads = [url for url in loads if place_id_from_url(url) not in in_feed]
+                    if loads:
+                        self._open_pipeline(driver, loads, keep_feed=True)
+                elif not navigator.enabled and len(loads) > 1:
+                    self._open_pipeline(driver, loads)
+            return
+        logger.info(f"Job {self.job_id}: extracting {len(urls)} places over {sessions} browser sessions")
+        self._slots = queue.Queue()
+        self._slots.put(driver)
+        for _ in range(sessions - 1):
+            self._slots.put(None)  # Started on first use, inside the worker thread
+        self._executor = ThreadPoolExecutor(max_workers=sessions, thread_name_prefix=f"details-{self.job_id}")
+        self._futures = {url: self._executor.submit(self._fetch_in_thread, url) for url in urls}
+
+    def fetch(self, url):
+        """The extracted record for ``url`` (None when extraction found nothing)"""
+        card = self.listings.get(url) if self.listings is not None else None
+        if card is not None and not self._needs_page(url):
+            return dict(card)
+        future = self._futures.pop(url, None)
+        record = future.result() if future is not None else self._fetch_page(self._driver, url)
+        if card is None:
+            return record
+        # Only the asked-for fields come from the place page
+        merged = dict(card)
+        for field in self.detail_fields:
+            if not merged.get(field) and record and record.get(field):
+                merged[field] = record[field]
+        return merged
+
+    def read_fields(self, driver):
+        """
+        ``read_place_fields`` with the job's backend and profile, counting
+        each field's source and latency.
+
+        For a place served from the place cache these are the cached fields
+        and the page is not read; freshly read fields are cached, so every
+        category's extractor post-processes the same raw fields.
+        """
+        cached = getattr(self._local, 'cached', None)
+        if cached is not None:
+            return dict(cached)
+        fields = read_place_fields(driver, self.profile, backend=self.backend)
+        self.field_latency.record(fields.pop('trace', None))
+        selector_registry.record(fields.pop('attempts', None))
+        url = getattr(self._local, 'url', None)
+        if url:
+            remember_place(url, fields, self.profile)
+        return fields
+
+    def close(self):
+        """Stop outstanding fetches, return the extra sessions to the pool and store the field latencies"""
+        if self._executor:
+            for future in self._futures.values():
+                future.cancel()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._futures = {}
+        for driver in self._extra_drivers:
+            job_registry.detach(self.job_id, driver)
+            try:
+                browser_pool.release(driver)
+            except Exception:
+                pass
+        self._extra_drivers = []
+        self._close_pipeline()
+        if self.field_latency.histogram:
+            logger.info(f"Job {self.job_id} field sources: {self.field_latency.summary()}")
+        self.field_latency.flush()
+        selector_registry.flush()
+        if self.scraper.navigator.times.totals:
+            logger.info(f"Job {self.job_id} navigation: {self.scraper.navigator.times.summary()}")
+
+    def _needs_page(self, url):
+        """False for fast listing URLs whose feed card already has every requested field"""
+        if self.listings is None or url not in self.listings:
+            return True
+        card = self.listings[url]
+        return any(not card.get(field) for field in self.detail_fields)
+
+    def _answered(self, url):
+        """True when the place is served without opening its page"""
+        return cached_place(url, self.profile) is not None or bool(self.capture and self.capture.record_for(url))
+
+    def _spare_sessions(self):
+        """Extra Chrome sessions the host has memory for right now"""
+        from .workers import available_memory_mb
+        return int(available_memory_mb() // settings.SCRAPE_WORKER_MEMORY_MB)
+
+    def _cancelled(self):
+        return self.cancel.is_set()
+
+    def _fetch_page(self, driver, url):
+        fields = cached_place(url, self.profile)
+        if fields is not None:
+            return self._run_extract(driver, url, fields)
+        if self.capture:
+            record = self.capture.record_for(url)
+            if record:
+                return record
+        if self._cancelled():
+            return None
+        self._open(driver, url)
+        if self._cancelled():
+            return None
+        record = None
+        if self.capture:
+            self.capture.drain(driver)
+            record = self.capture.record_for(url)
+        if not record:
+            # Only fields read from the page are shared; decoded payloads depend on an unverified layout
+            record = self._run_extract(driver, url)
+        return record
+
+    def _run_extract(self, driver, url, cached=None):
+        """The scraper's extractor on the open page, or on ``cached`` fields read by an earlier job"""
+        self._local.url, self._local.cached = url, cached
+        try:
+            return self._extract(driver, url)
+        finally:
+            self._local.url = self._local.cached = None
+
+    def _open(self, driver, url):
+        """Bring up the place page: the preloaded tab if there is one, else navigate to it"""
+        pipelined = self._tabs and driver is self._driver
+        if pipelined and self._feed_tab and url not in self._upcoming_index:
+            # In the feed: clicked by the navigator in the feed's own tab
+            driver.switch_to.window(self._feed_tab)
+            self.scraper.navigator.open_place(driver, url, self._settle)
+            return
+        handle = self._preloaded.pop(url, None) if pipelined else None
+        if handle:
+            driver.switch_to.window(handle)
+            if not self._feed_tab:
+                self.scraper.navigator.forget(driver)
+            self.scraper.waits.until(driver, place_ready(), self._settle, replaces=self._settle)
+        elif pipelined and self._feed_tab:
+            # Not prefetched: load it in a pipeline tab that is not busy prefetching, never over the feed
+            driver.switch_to.window(next(handle for handle in self._tabs if handle not in self._preloaded.values()))
+            driver.get(url)
+            self.scraper.waits.until(driver, place_ready(), self._settle, replaces=self._settle)
+        else:
+            self.scraper.navigator.open_place(driver, url, self._settle)
+        if pipelined:
+            self._preload_after(driver, url)
+
+    def _open_pipeline(self, driver, urls, keep_feed=False):
+        """
+        Open the background tab the next place is loaded into.
+
+        With ``keep_feed`` the current tab is left to the navigator's feed
+        and both pipeline tabs are new; the first of ``urls`` starts loading
+        at once.
+        """
+        try:
+            current = driver.current_window_handle
+            tabs = [] if keep_feed else [current]
+            while len(tabs) < 2:
+                driver.switch_to.new_window('tab')
+                tabs.append(driver.current_window_handle)
+                try:
+                    apply_resource_profile(driver)
+                except Exception as e:
+                    logger.warning(f"Could not apply the resource profile to the prefetch tab: {e}")
+            driver.switch_to.window(current)
+        except Exception as e:
+            logger.warning(f"Job {self.job_id}: no prefetch tab, fetching places one by one: {e}")
+            return
+        self._tabs = tabs
+        self._feed_tab = current if keep_feed else None
+        self._upcoming = list(urls)
+        self._upcoming_index = {url: index for index, url in enumerate(urls)}
+        if keep_feed:
+            self._preload(driver, self._upcoming[0], tabs[0])
+
+    def _preload_after(self, driver, url):
+        """Start loading, in the other tab, the next URL after ``url`` that needs its page"""
+        index = self._upcoming_index.get(url)
+        if index is None or index + 1 >= len(self._upcoming) or self._cancelled():
+            return
+        foreground = driver.current_window_handle
+        self._preload(driver, self._upcoming[index + 1], next(handle for handle in self._tabs if handle != foreground))
+
+    def _preload(self, driver, upcoming, background):
+        """Start loading ``upcoming`` in the ``background`` tab and come back to the current one"""
+        foreground = driver.current_window_handle
+        try:
+            driver.switch_to.window(background)
+            # Returns at once; the tab keeps loading while the foreground one is extracted
+            driver.execute_script("window.location.href = arguments[0];", upcoming)
+            self._preloaded = {upcoming: background}
+        except Exception as e:
+            logger.warning(f"Job {self.job_id}: could not prefetch {upcoming}: {e}")
+            self._preloaded = {}
+        finally:
+            driver.switch_to.window(foreground)
+
+    def _close_pipeline(self):
+        """Close the prefetch tabs, leaving the scraper's driver on a single tab (the feed's, if kept)"""
+        if not self._tabs:
+            return
+        driver, tabs, feed_tab = self._driver, self._tabs, self._feed_tab
+        self._tabs, self._feed_tab, self._preloaded = None, None, {}
+        try:
+            keep = feed_tab or driver.current_window_handle
+            for handle in tabs:
+                if handle != keep:
+                    driver.switch_to.window(handle)
+                    driver.close()
+            driver.switch_to.window(keep)
+        except Exception as e:
+            logger.warning(f"Job {self.job_id}: could not close the prefetch tab: {e}")
+
+    def _fetch_in_thread(self, url):
+        driver = self._lease()
+        try:
+            return self._fetch_page(driver, url)
+        finally:
+            self._slots.put(driver)
+            # Threads get their own database connection from Django; do not leak it
+            connection.close()
+
+    def _lease(self):
+        while True:
+            driver = self._slots.get()
+            if driver is not None:
+                return driver
+            try:
+                return self._start_session()
+            except Exception as e:
+                # Carry on with the sessions we have; the slot is not returned
+                logger.warning(f"Job {self.job_id}: could not start an extra browser session: {e}")
+
+    def _start_session(self):
+        driver = browser_pool.lease(self.scraper.options)
+        job_registry.attach(self.job_id, driver)
+        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        self._extra_drivers.append(driver)
+        return driver
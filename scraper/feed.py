@@ -0,0 +1,144 @@
+"""
+Batched harvesting of the Google Maps results feed.
+
+URL collection used to call ``find_elements`` for the place links and then
+``get_attribute('href')`` on each one, a chromedriver round trip per link
+per scroll, and deduplicated against a list. ``FeedHarvest.scroll`` reads
+every place link and scrolls the results panel in one script call, and keys
+the collected URLs on the Maps place id so the same place reached through a
+different URL is only kept once. A 120-result feed costs one call per
+scroll plus the waits in between.
+
+In fast listing mode (``ScrapeJob.listing_only``) the same call also reads
+each feed card (name, rating, review count, category, short address, open
+status and, when shown, phone and website), so most records never need
+their place page opened.
+"""
+import re
+
+from .place_cache import place_id_from_url
+from .place_extract import place_directions_url
+
+PLACE_LINK_SELECTORS = ["a[href*='/maps/place/']"]
+
+HARVEST_AND_SCROLL_JS = r"""
+var selectors = arguments[0], panelSelector = arguments[1], step = arguments[2], withCards = arguments[3];
+function textOf(el) { return ((el && (el.innerText || el.textContent)) || '').trim(); }
+var PHONE = /^\+?\d[\d\s\-]{8,}\d$/;
+var OPEN = /\b(open|closed|closes|opens)\b/i;
+function readCard(link) {
+    var card = link.closest('div.Nv2PK') || link.parentElement;
+    var rating = textOf(card.querySelector('span.MW4etd'));
+    var info = {category: '', address: '', open_status: '', phone: textOf(card.querySelector('span.UsdlK'))};
+    var rows = card.querySelectorAll('div.W4Efsd');
+    for (var i = 0; i < rows.length; i++) {
+        if (rows[i].querySelector('div.W4Efsd')) { continue; }  // Only the innermost rows
+        var parts = textOf(rows[i]).split('\u00b7').map(function (part) { return part.trim(); }).filter(Boolean);
+        if (!parts.length || (rating && parts[0].indexOf(rating) === 0)) { continue; }
+        if (OPEN.test(parts[0])) {
+            info.open_status = parts[0];
+            parts.slice(1).forEach(function (part) { if (!info.phone && PHONE.test(part)) { info.phone = part; } });
+        } else if (!info.category) {
+            info.category = parts[0];
+            info.address = parts.length > 1 ? parts[parts.length - 1] : '';
+        }
+    }
+    var website = card.querySelector("a[data-value='Website']");
+    return {
+        href: link.href,
+        name: link.getAttribute('aria-label') || textOf(card.querySelector('div.qBF1Pd')),
+        rating: rating,
+        reviews: textOf(card.querySelector('span.UY7F9')),
+        category: info.category,
+        address: info.address,
+        open_status: info.open_status,
+        phone: info.phone,
+        website: website ? (website.getAttribute('href') || '') : ''
+    };
+}
+var hrefs = [], cards = [];
+for (var i = 0; i < selectors.length; i++) {
+    var links = document.querySelectorAll(selectors[i]);
+    for (var j = 0; j < links.length; j++) {
+        var href = links[j].href;
+        if (href && href.indexOf('/maps/place/') !== -1) {
+            hrefs.push(href);
+            if (withCards) { cards.push(readCard(links[j])); }
+        }
+    }
+}
+var panel = document.querySelector(panelSelector);
+if (panel) {
+    if (step) { panel.scrollTop += step; } else { panel.scrollTop = panel.scrollHeight; }
+} else {
+    if (step) { window.scrollBy(0, step); } else { window.scrollTo(0, document.body.scrollHeight); }
+}
+return [hrefs, panel ? panel.scrollHeight : document.body.scrollHeight, cards];
+"""
+
+# Place-page fields a fast listing job can ask for on top of the feed cards
+DETAIL_FIELD_CHOICES = [
+    ('phone', 'Phone'),
+    ('website', 'Website'),
+    ('hours', 'Opening hours'),
+    ('email', 'Email'),
+]
+
+
+def place_key(url):
+    """The place id of a Maps place URL, or the URL without its query string"""
+    return place_id_from_url(url) or url.split('?')[0]
+
+
+def listing_record(card):
+    """A scraper record built from a feed card; fields the card does not show are left empty"""
+    url = card.get('href', '')
+    coords = re.search(r'!3d(-?\d+\.\d+)!4d(-?\d+\.\d+)', url)
+    return {
+        'name': card.get('name', ''),
+        'address': card.get('address', ''),
+        'phone': card.get('phone', ''),
+        'website': card.get('website', ''),
+        'rating': card.get('rating', ''),
+        'reviews_count': re.sub(r'[^\d]', '', card.get('reviews', '')),
+        'category': card.get('category', ''),
+        'hours': '',
+        'open_status': card.get('open_status', ''),
+        'latitude': coords.group(1) if coords else '',
+        'longitude': coords.group(2) if coords else '',
+        'directions_url': place_directions_url(url) if url else '',
+    }
+
+
+class FeedHarvest:
+    def __init__(self, selectors=None, listings=None):
+        """``listings``, when given, is a dict that receives a feed-card record per collected URL"""
+        self.selectors = selectors or PLACE_LINK_SELECTORS
+        self.listings = listings
+        self.urls = []
+        self.height = None
+        self._keys = set()
+
+    def scroll(self, driver, panel="[role='feed']", step=None):
+        """
+        Collect the place links now in the page, then scroll ``panel``.
+
+        ``step`` scrolls by that many pixels; by default the panel is
+        scrolled to the bottom. Returns the number of new places found.
+        """
+        hrefs, self.height, cards = driver.execute_script(
+            HARVEST_AND_SCROLL_JS, self.selectors, panel, step, self.listings is not None
+        )
+        return self.add(hrefs, cards)
+
+    def add(self, hrefs, cards=None):
+        new = 0
+        for index, href in enumerate(hrefs):
+            key = place_key(href)
+            if key not in self._keys:
+                self._keys.add(key)
+                self.urls.append(href)
+                new += 1
+                if cards and self.listings is not None:
+                    self.listings[href] = listing_record(cards[index])
+        return new
@@ -0,0 +1,69 @@
+"""
+Per-field extraction latency for one scrape job.
+
+Every place read returns a trace saying, per field, which selector or
+fallback answered (the selector itself, ``contact rows``, ``panel html``,
+``miss``, ...) and how long the lookup took. ``FieldLatency`` counts those
+into a histogram of latency buckets per field and source, which shows which
+fallbacks actually fire and what they cost. It is added to
+``ScrapeJob.field_latency`` when the job's ``DetailPool`` closes.
+"""
+import logging
+import threading
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency buckets, in milliseconds
+BUCKETS_MS = (1, 5, 25, 100, 500)
+
+
+def bucket_label(ms):
+    for bound in BUCKETS_MS:
+        if ms < bound:
+            return f'<{bound}ms'
+    return f'{BUCKETS_MS[-1]}ms+'
+
+
+class FieldLatency:
+    def __init__(self, job_id=None):
+        self.job_id = job_id
+        self.histogram = {}  # field -> source -> bucket -> count
+        self._lock = threading.Lock()
+
+    def record(self, trace):
+        """Count one place's ``{field: [source, milliseconds]}`` trace"""
+        with self._lock:
+            for field, (source, ms) in (trace or {}).items():
+                buckets = self.histogram.setdefault(field, {}).setdefault(source, {})
+                label = bucket_label(ms)
+                buckets[label] = buckets.get(label, 0) + 1
+
+    def summary(self):
+        """'phone: [data-item-id*='phone'] x12, panel html x3, miss x2; ...' for the log"""
+        with self._lock:
+            return '; '.join(
+                f"{field}: " + ', '.join(f"{source} x{sum(buckets.values())}" for source, buckets in sources.items())
+                for field, sources in sorted(self.histogram.items())
+            )
+
+    def flush(self):
+        """Add the counts so far to the job row and start over"""
+        with self._lock:
+            histogram, self.histogram = self.histogram, {}
+        if not self.job_id or not histogram:
+            return
+        from .models import ScrapeJob
+        try:
+            with transaction.atomic():
+                job = ScrapeJob.objects.select_for_update().only('field_latency').get(job_id=self.job_id)
+                merged = job.field_latency or {}
+                for field, sources in histogram.items():
+                    for source, buckets in sources.items():
+                        stored = merged.setdefault(field, {}).setdefault(source, {})
+                        for label, count in buckets.items():
+                            stored[label] = stored.get(label, 0) + count
+                ScrapeJob.objects.filter(pk=job.pk).update(field_latency=merged)
+        except Exception as e:
+            logger.warning(f"Could not record field latency for job {self.job_id}: {e}")
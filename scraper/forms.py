@@ -1,4 +1,6 @@
 from django import forms
+from .feed import DETAIL_FIELD_CHOICES
+from .models import ScrapeJob
 
 class ScraperForm(forms.Form):
     MAIN_CATEGORIES = [
@@ -36,6 +38,10 @@ class ScraperForm(forms.Form):
     location = forms.CharField(max_length=100, initial="Chennai Tamil Nadu")
     near_me = forms.BooleanField(required=False)
     max_results = forms.IntegerField(initial=25, min_value=1, max_value=100)
+    detail_sessions = forms.IntegerField(required=False, min_value=1, max_value=4)
+    listing_only = forms.BooleanField(required=False)
+    detail_fields = forms.MultipleChoiceField(choices=DETAIL_FIELD_CHOICES, required=False, widget=forms.CheckboxSelectMultiple)
+    extraction_backend = forms.ChoiceField(choices=ScrapeJob.EXTRACTION_BACKENDS, required=False)
     custom_term = forms.CharField(max_length=100, required=False)
 
     def __init__(self, *args, **kwargs):
@@ -1,44 +1,49 @@
-import time
 import csv
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from selenium.webdriver.common.keys import Keys
+from selenium.common.exceptions import NoSuchElementException
 import pandas as pd
 import os
-import urllib.parse
 import logging
+from .cancellation import cancel_signal
+from .progress import JobProgress
+from .checkpoint import JobCheckpoint
+from .detail_pool import DetailPool
+from .job_registry import job_registry
+from .browser_pool import CHROME_USER_AGENT, browser_pool, chrome_options
+from .feed import FeedHarvest, place_key
+from .navigation import MapsNavigator
+from .place_extract import directions_url
+from .waits import PageWaits, main_panel_present, network_quiet
 
 logger = logging.getLogger(__name__)
 
 class SimplifiedGoogleMapsGeneralScraper:
-    def __init__(self, headless=False):
+    def __init__(self, headless=False, job_id=None):
         """Initialize the general scraper"""
-        self.options = Options()
-        if headless:
-            self.options.add_argument("--headless")
-        self.options.add_argument("--no-sandbox")
-        self.options.add_argument("--disable-dev-shm-usage")
+        self.options = chrome_options(headless, user_agent=CHROME_USER_AGENT)
         self.options.add_argument("--disable-gpu")  # Prevent GPU-related errors
-        self.options.add_argument("--disable-blink-features=AutomationControlled")
-        self.options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        self.options.add_experimental_option('useAutomationExtension', False)
-        self.options.add_argument("--window-size=1920,1080")
-        self.options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36")
         self.options.add_experimental_option("prefs", {
             "profile.default_content_setting_values.geolocation": 1  # Allow geolocation
         })
+        self.job_id = job_id
+        self.progress = JobProgress(job_id)
+        self.checkpoint = JobCheckpoint(job_id)
+        self.cancel = cancel_signal(job_id)
+        self.waits = PageWaits(job_id)
+        self.navigator = MapsNavigator(self.waits)
+        self.details = DetailPool(self, job_id)
+        
+        # Register this instance in the job registry
+        if self.job_id:
+            job_registry.register(self.job_id, self)
         
     def scrape_general_comprehensive(self, location, custom_term, max_results=None):
         """General scraping for any custom term"""
-        driver = webdriver.Chrome(options=self.options)
+        driver = browser_pool.lease(self.options)
+        job_registry.attach(self.job_id, driver)
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         
         all_items = []
-        all_urls = set()
+        seen_places = {place_key(url) for url in self.checkpoint.urls}
         
         try:
             if 'near me' in location.lower():
@@ -63,42 +68,51 @@ class SimplifiedGoogleMapsGeneralScraper:
                     f"{custom_term} near {location}"
                 ]
             
-            for search_term in search_terms:
+            for term_index, search_term in enumerate(search_terms, start=1):
+                self.progress.searching(term_index, len(search_terms))
+                if self.checkpoint.skip_search(search_term, max_results):
+                    continue
+                if self.cancel.is_set():
+                    print("Scraping cancelled by user")
+                    return "CANCELLED"
                 try:
                     print(f"\n🔍 Searching: {search_term}")
-                    driver.get("https://www.google.com/maps")
-                    WebDriverWait(driver, 15).until(
-                        EC.presence_of_element_located((By.ID, "searchboxinput"))
-                    )
-                    search_box = driver.find_element(By.ID, "searchboxinput")
-                    search_box.clear()
-                    search_box.send_keys(search_term)
-                    search_box.send_keys(Keys.ENTER)
-                    time.sleep(5)  # Wait for initial results to load
+                    self.navigator.search(driver, search_term)
                     
                     urls = self.enhanced_url_collection(driver, max_results)
-                    new_urls = [url for url in urls if url not in all_urls]
-                    all_urls.update(new_urls)
+                    new_urls = [url for url in urls if place_key(url) not in seen_places]
+                    seen_places.update(place_key(url) for url in new_urls)
+                    self.checkpoint.term_done(search_term, new_urls, self.details.listings)
+                    self.progress.urls_collected(len(seen_places))
                     print(f"   Found {len(new_urls)} new item URLs")
                     
-                    if max_results and len(all_urls) >= max_results:
+                    if max_results and len(seen_places) >= max_results:
                         break
                 except Exception as e:
                     print(f"   Error with search term '{search_term}': {e}")
                     logger.error(f"Search term error: {str(e)}")
                     continue
             
-            print(f"\n📊 Total unique item URLs collected: {len(all_urls)}")
-            url_list = list(all_urls)[:max_results] if max_results else list(all_urls)
+            print(f"\n📊 Total unique item URLs collected: {len(seen_places)}")
+            url_list = list(self.checkpoint.urls)[:max_results] if max_results else list(self.checkpoint.urls)
             
+            pending_urls = [url for url in url_list if not self.checkpoint.record_for(url)]
+            self.details.start(driver, pending_urls, lambda page, url: self.extract_complete_item_data(page))
             for i, url in enumerate(url_list):
+                self.progress.extracting(i + 1, len(url_list), len(all_items))
+                done_record = self.checkpoint.record_for(url)
+                if done_record:
+                    all_items.append(done_record)
+                    continue
+                if self.cancel.is_set():
+                    print("Scraping cancelled by user")
+                    return "CANCELLED"
                 try:
                     print(f"\n📍 Processing item {i+1}/{len(url_list)}: {url}")
-                    driver.get(url)
-                    time.sleep(4)
-                    item_data = self.extract_complete_item_data(driver)
+                    item_data = self.details.fetch(url)
                     if item_data and item_data.get('name') and item_data['name'] != 'Results':
                         all_items.append(item_data)
+                        self.checkpoint.place_done(url, item_data)
                         print(f"   ✅ {item_data['name']}")
                 except Exception as e:
                     print(f"   Error processing URL {url}: {e}")
@@ -106,124 +120,68 @@ class SimplifiedGoogleMapsGeneralScraper:
                     continue
         
         finally:
-            driver.quit()
+            self.details.close()
+            self.waits.flush()
+            job_registry.unregister(self.job_id)
+            browser_pool.release(driver)
         
         return all_items
 
     def enhanced_url_collection(self, driver, target_count):
         """Enhanced URL collection with scrolling"""
-        item_urls = []
+        harvest = FeedHarvest(["a[href*='/maps/place/']", "div[role='link'] a", ".hfpxzc"], listings=self.details.listings)
         scroll_attempts = 0
         max_scroll_attempts = 15  # Increased for more thorough scrolling
         
         # Wait for results to load
-        try:
-            WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "[role='main']"))
-            )
-        except TimeoutException:
+        if not self.waits.until(driver, main_panel_present, 15, replaces=0):
             logger.error("Timeout waiting for main results panel")
-            return item_urls
+            return harvest.urls
         
-        while scroll_attempts < max_scroll_attempts and (not target_count or len(item_urls) < target_count):
-            selectors = [
-                "a[href*='/maps/place/']",
-                "div[role='link'] a",
-                ".hfpxzc"  # Common class for place links in Google Maps
-            ]
-            links_found = False
+        while scroll_attempts < max_scroll_attempts and (not target_count or len(harvest.urls) < target_count):
+            if self.cancel.is_set():
+                return harvest.urls  # Return what we have so far
             
-            for selector in selectors:
-                try:
-                    links = driver.find_elements(By.CSS_SELECTOR, selector)
-                    for link in links:
-                        try:
-                            href = link.get_attribute('href')
-                            if href and '/maps/place/' in href and href not in item_urls:
-                                item_urls.append(href)
-                                links_found = True
-                        except:
-                            continue
-                except:
-                    continue
+            # One script call reads the feed's links and scrolls the panel
+            try:
+                found = harvest.scroll(driver, panel="[role='main']", step=1000)  # Increased scroll distance
+            except Exception as e:
+                logger.warning(f"Could not read the results feed: {e}")
+                found = 0
             
-            logger.info(f"Scroll attempt {scroll_attempts + 1}: Found {len(item_urls)} URLs so far")
+            logger.info(f"Scroll attempt {scroll_attempts + 1}: Found {len(harvest.urls)} URLs so far")
             
-            if not links_found:
+            if not found:
                 logger.warning(f"No links found in scroll attempt {scroll_attempts + 1}")
             
-            try:
-                results_panel = driver.find_element(By.CSS_SELECTOR, "[role='main']")
-                driver.execute_script("arguments[0].scrollTop += 1000;", results_panel)  # Increased scroll distance
-                time.sleep(3)  # Increased wait time for dynamic loading
-            except:
-                driver.execute_script("window.scrollBy(0, 1000);")
-                time.sleep(3)
-            
+            self.waits.until(driver, network_quiet(), 3, replaces=3)
             scroll_attempts += 1
         
-        return item_urls[:target_count]
+        return harvest.urls[:target_count]
 
     def extract_complete_item_data(self, driver):
         """Extract essential item data from Google Maps page"""
-        item_data = {}
         try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "h1"))
-            )
-            time.sleep(3)
-            # Name
-            name_selectors = ["h1.DUwDvf", "h1"]
-            for selector in name_selectors:
-                try:
-                    name_element = driver.find_element(By.CSS_SELECTOR, selector)
-                    name_text = name_element.text.strip()
-                    if name_text and len(name_text) > 1:
-                        item_data['name'] = name_text
-                        break
-                except:
-                    continue
-            # Address
-            try:
-                address = driver.find_element(By.CSS_SELECTOR, "[data-item-id='address']").text.strip()
-                item_data['address'] = address
-                encoded_address = urllib.parse.quote(address)
-                item_data['directions_url'] = f"https://www.google.com/maps/dir/?api=1&destination={encoded_address}"
-            except:
-                item_data['address'] = ''
-                item_data['directions_url'] = ''
-            # Phone
-            try:
-                phone = driver.find_element(By.CSS_SELECTOR, "[data-item-id*='phone']").text.strip()
-                item_data['phone'] = phone
-            except:
-                item_data['phone'] = ''
-            # Website
-            try:
-                website = driver.find_element(By.CSS_SELECTOR, "[data-item-id='authority']").get_attribute('href')
-                item_data['website'] = website
-            except:
-                item_data['website'] = ''
-            # Rating and reviews
-            try:
-                rating = driver.find_element(By.CSS_SELECTOR, "div.F7nice span[aria-hidden]").text.strip()
-                item_data['rating'] = rating
-                reviews_count = driver.find_element(By.CSS_SELECTOR, "div.F7nice span:last-child").text.strip()
-                item_data['reviews_count'] = reviews_count.replace('(', '').replace(')', '')
-            except:
-                item_data['rating'] = ''
-                item_data['reviews_count'] = ''
-            # Category
-            try:
-                category = driver.find_element(By.CSS_SELECTOR, "button.DkEaL").text.strip()
-                item_data['category'] = category
-            except:
-                item_data['category'] = ''
+            # One call once DetailPool's readiness wait has passed; a missing field is an immediate miss
+            fields = self.details.read_fields(driver)
         except Exception as e:
             print(f"   Error extracting data: {e}")
             logger.error(f"Data extraction error: {str(e)}")
+            return {}
         
-        return item_data
+        return {
+            'name': fields.get('name', ''),
+            'address': fields.get('address', ''),
+            'directions_url': directions_url(fields.get('address', '')),
+            'phone': fields.get('phone', ''),
+            'website': fields.get('website', ''),
+            'rating': fields.get('rating', ''),
+            'reviews_count': fields.get('reviews', '').replace('(', '').replace(')', ''),
+            'category': fields.get('category', ''),
+            'hours': fields.get('hours', ''),
+            'latitude': fields.get('latitude', ''),
+            'longitude': fields.get('longitude', ''),
+        }
 
     def save_simplified_csv(self, items, filename, base_dir=None):
         """Save data to CSV, optionally using base_dir for file path"""
@@ -257,6 +215,6 @@ class SimplifiedGoogleMapsGeneralScraper:
         print(f"\n🔗 CSV FILE LOCATION: {filename}")
         return len(item_data)
 
-def scrape_general(location, custom_term, max_results):
-    scraper = SimplifiedGoogleMapsGeneralScraper(headless=True)
+def scrape_general(location, custom_term, max_results, job_id=None):
+    scraper = SimplifiedGoogleMapsGeneralScraper(headless=True, job_id=job_id)
     return scraper.scrape_general_comprehensive(location, custom_term, max_results)
\ No newline at end of file
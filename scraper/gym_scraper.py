@@ -1,63 +1,52 @@
-import time
 import re
 import csv
 import os
 import logging
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException, InvalidSessionIdException, NoSuchWindowException
-from selenium.webdriver.common.keys import Keys
 import pandas as pd
-from django.core.cache import cache
 import signal
-import psutil
 import atexit
 import threading
 import json
+from .cancellation import cancel_signal
+from .progress import JobProgress
+from .checkpoint import JobCheckpoint
+from .detail_pool import DetailPool
+from .job_registry import job_registry
+from .browser_pool import CHROME_USER_AGENT, browser_pool, chrome_options
+from .feed import FeedHarvest, place_key
+from .navigation import MapsNavigator
+from .place_extract import GYM_PROFILE, place_directions_url
+from .waits import PageWaits, feed_present, network_quiet
 
 logger = logging.getLogger(__name__)
 
 class GymScraper:
-    # Class variable to store all active scrapers
-    active_scrapers = {}
-
     def __init__(self, headless=False, job_id=None):
-        self.options = Options()
-        if headless:
-            self.options.add_argument("--headless")
-        self.options.add_argument("--no-sandbox")
-        self.options.add_argument("--disable-dev-shm-usage")
-        self.options.add_argument("--disable-blink-features=AutomationControlled")
-        self.options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        self.options.add_experimental_option('useAutomationExtension', False)
-        self.options.add_argument("--window-size=1920,1080")
-        self.options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36")
+        self.options = chrome_options(headless, user_agent=CHROME_USER_AGENT)
         self.options.add_experimental_option("prefs", {
             "profile.default_content_setting_values.geolocation": 1   
         })
         
-        # Add a unique user data directory for this instance
-        import tempfile
-        self.user_data_dir = tempfile.mkdtemp()
-        self.options.add_argument(f"--user-data-dir={self.user_data_dir}")
-        
         self.job_id = job_id  # Store job_id for cancellation checks
+        self.progress = JobProgress(job_id)
+        self.checkpoint = JobCheckpoint(job_id)
+        self.cancel = cancel_signal(job_id)
+        self.waits = PageWaits(job_id)
+        self.navigator = MapsNavigator(self.waits)
+        self.details = DetailPool(self, job_id)
         self.driver = None
         self.driver_pid = None
         self.is_cancelled = False
-        self.chrome_start_time = time.time()
         
-        # Register this instance globally
+        # Register this instance in the job registry
         if self.job_id:
-            GymScraper.active_scrapers[self.job_id] = self
+            job_registry.register(self.job_id, self)
 
     def should_cancel(self):
         """Check if scraping should be cancelled"""
         if self.job_id:
-            cancelled = cache.get(f"cancel_scraping_{self.job_id}", False)
+            cancelled = self.cancel.is_set()
             if cancelled:
                 self.is_cancelled = True
             return cancelled
@@ -68,90 +57,38 @@ class GymScraper:
         # Mark as cancelled
         self.is_cancelled = True
         
-        # First, try to close the driver normally
-        if self.driver:
+        # Stop the detail fetches first; their threads may still be loading pages on this driver
+        self.details.close()
+
+        # Hand the driver back to the pool (reset and kept warm, or quit when the pool is full), exactly once
+        driver, self.driver = self.driver, None
+        if driver:
             try:
-                self.driver.quit()
+                browser_pool.release(driver)
             except Exception as e:
-                # If driver closing failed, try to kill the process
-                self.kill_chrome_process()
-
-        # Clean up user data directory
-        try:
-            import shutil
-            shutil.rmtree(self.user_data_dir, ignore_errors=True)
-        except:
-            pass
-
-    def kill_chrome_process(self):
-        """Kill Chrome process for this specific scraper"""
-        try:
-            # If we have the PID, kill it directly
-            if self.driver_pid:
-                try:
-                    proc = psutil.Process(self.driver_pid)
-                    proc.kill()
-                    proc.wait(timeout=5)
-                    return True
-                except psutil.NoSuchProcess:
-                    # Process already terminated
-                    return True
-                except psutil.TimeoutExpired:
-                    # Force kill if timeout
-                    proc.kill()
-                    return True
-                except Exception:
-                    pass
-            
-            # If PID approach failed, try to find and kill by user data directory
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    if 'chrome' in proc.info['name'].lower():
-                        cmdline = ' '.join(proc.info['cmdline'])
-                        if self.user_data_dir in cmdline:
-                            proc.kill()
-                            proc.wait(timeout=5)
-                            return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
-                    continue
-            
-            # If user data approach failed, try to find by startup time (within last 30 seconds)
-            current_time = time.time()
-            for proc in psutil.process_iter(['pid', 'name', 'create_time', 'cmdline']):
-                try:
-                    if 'chrome' in proc.info['name'].lower():
-                        proc_start_time = proc.info['create_time']
-                        if (current_time - proc_start_time < 30 and 
-                            self.chrome_start_time - 5 <= proc_start_time <= self.chrome_start_time + 30):
-                            cmdline = ' '.join(proc.info['cmdline'])
-                            if '--user-data-dir' in cmdline:  # Likely our process
-                                proc.kill()
-                                proc.wait(timeout=5)
-                                return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
-                    continue
-            
-            return False
-        except Exception as e:
-            print(f"Error in kill_chrome_process: {e}")
-            return False
+                # If handing it back failed, kill its whole process group
+                browser_pool.terminate(driver)
 
     def scrape_gyms_comprehensive(self, location, gym_type="gym", max_results=25, job_id=None):
         """
         Comprehensive gym scraping with cancellation support.
         """
-        driver = webdriver.Chrome(options=self.options)
+        driver = browser_pool.lease(self.options)
         self.driver = driver
         self.driver_pid = self.driver.service.process.pid
+        job_registry.attach(self.job_id, self.driver)
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         
         all_gyms = []
-        all_urls = set()
+        seen_places = {place_key(url) for url in self.checkpoint.urls}
         
         try:
             search_terms = self.get_gym_search_terms(gym_type, location)
             
-            for search_term in search_terms:
+            for term_index, search_term in enumerate(search_terms, start=1):
+                self.progress.searching(term_index, len(search_terms))
+                if self.checkpoint.skip_search(search_term, max_results):
+                    continue
                 if self.should_cancel():
                     print("Scraping cancelled by user - closing Chrome for this job")
                     self.close_chrome_tab()
@@ -159,33 +96,33 @@ class GymScraper:
                     
                 try:
                     print(f"\n🔍 Searching: {search_term}")
-                    driver.get("https://www.google.com/maps")
-                    time.sleep(3)
-                    
-                    search_box = WebDriverWait(driver, 15).until(
-                        EC.element_to_be_clickable((By.ID, "searchboxinput"))
-                    )
-                    search_box.clear()
-                    search_box.send_keys(search_term)
-                    search_box.send_keys(Keys.ENTER)
-                    time.sleep(5)
+                    self.navigator.search(driver, search_term)
                     
                     urls = self.enhanced_url_collection(driver, max_results)
-                    new_urls = [url for url in urls if url not in all_urls]
-                    all_urls.update(new_urls)
+                    new_urls = [url for url in urls if place_key(url) not in seen_places]
+                    seen_places.update(place_key(url) for url in new_urls)
+                    self.checkpoint.term_done(search_term, new_urls, self.details.listings)
+                    self.progress.urls_collected(len(seen_places))
                     print(f"   Found {len(new_urls)} new gym URLs")
                     
-                    if len(all_urls) >= max_results:
+                    if len(seen_places) >= max_results:
                         break
                         
                 except Exception as e:
                     print(f"   Error with search term '{search_term}': {e}")
                     continue
             
-            print(f"\n📊 Total unique gym URLs collected: {len(all_urls)}")
-            url_list = list(all_urls)[:max_results]
+            print(f"\n📊 Total unique gym URLs collected: {len(seen_places)}")
+            url_list = list(self.checkpoint.urls)[:max_results]
             
+            pending_urls = [url for url in url_list if not self.checkpoint.record_for(url)]
+            self.details.start(driver, pending_urls, self.extract_complete_gym_data, profile=GYM_PROFILE)
             for i, url in enumerate(url_list):
+                self.progress.extracting(i + 1, len(url_list), len(all_gyms))
+                done_record = self.checkpoint.record_for(url)
+                if done_record:
+                    all_gyms.append(done_record)
+                    continue
                 if self.should_cancel():
                     print("Scraping cancelled by user - closing Chrome for this job")
                     self.close_chrome_tab()
@@ -193,14 +130,12 @@ class GymScraper:
                     
                 try:
                     print(f"\n🏋️ Processing gym {i+1}/{len(url_list)}...")
-                    driver.get(url)
-                    time.sleep(4)
-                    
-                    gym_data = self.extract_complete_gym_data(driver, url)
+                    gym_data = self.details.fetch(url)
                     
                     if gym_data and gym_data.get('name') and gym_data['name'] != 'Results':
                         gym_data['gym_type'] = gym_type
                         all_gyms.append(gym_data)
+                        self.checkpoint.place_done(url, gym_data)
                         print(f"   ✅ {gym_data['name']}")
                         if gym_data.get('phone'):
                             print(f"      📞 {gym_data['phone']}")
@@ -225,12 +160,13 @@ class GymScraper:
             print(f"Unexpected error during scraping: {e}")
             return []
         finally:
-            # Remove this instance from global registry
-            if self.job_id in GymScraper.active_scrapers:
-                del GymScraper.active_scrapers[self.job_id]
+            self.details.close()
+            self.waits.flush()
+            # Remove this instance from the job registry
+            job_registry.unregister(self.job_id)
             
-            # Always close Chrome when done (unless already closed due to cancellation)
-            if not self.is_cancelled:
+            # Always hand the driver back when done (unless cancellation already did)
+            if self.driver:
                 self.close_chrome_tab()
 
     def get_gym_search_terms(self, gym_type, location):
@@ -249,194 +185,55 @@ class GymScraper:
         return base_terms.get(gym_type, [f"{gym_type} {location}"])
 
     def enhanced_url_collection(self, driver, target_count):
-        gym_urls = []
-        time.sleep(5)
+        harvest = FeedHarvest(listings=self.details.listings)
+        self.waits.until(driver, feed_present, 5, replaces=5)
         scroll_attempts = 0
         max_scroll_attempts = 30
-        last_count = 0
         stagnant_scrolls = 0
         
-        while scroll_attempts < max_scroll_attempts and len(gym_urls) < target_count:
+        while scroll_attempts < max_scroll_attempts and len(harvest.urls) < target_count:
             if self.should_cancel():
-                return gym_urls  # Return what we have so far
-                
-            links = driver.find_elements(By.CSS_SELECTOR, "a[href*='/maps/place/']")
-            for link in links:
-                if self.should_cancel():
-                    return gym_urls  # Return what we have so far
-                    
-                try:
-                    href = link.get_attribute('href')
-                    if href and 'google.com/maps' in href and href not in gym_urls:
-                        gym_urls.append(href)
-                except:
-                    continue
+                return harvest.urls  # Return what we have so far
             
-            current_count = len(gym_urls)
-            if current_count == last_count:
+            # One script call reads the feed's links and scrolls it to the bottom
+            if harvest.scroll(driver) == 0:
                 stagnant_scrolls += 1
                 if stagnant_scrolls >= 3:
                     break
             else:
                 stagnant_scrolls = 0
-            last_count = current_count
-            
-            try:
-                results_panel = driver.find_element(By.CSS_SELECTOR, "[role='feed']")
-                driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", results_panel)
-            except:
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
+            self.waits.until(driver, network_quiet(), 2, replaces=2)
             scroll_attempts += 1
         
-        return gym_urls[:target_count]
+        return harvest.urls[:target_count]
 
     def extract_complete_gym_data(self, driver, place_url):
         if self.should_cancel():
             return {}
             
-        gym_data = {}
         try:
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "h1")))
-            time.sleep(2)
-
-            if self.should_cancel():
-                return {}
-
-            # NAME
-            name_selectors = ["h1.DUwDvf.lfPIob", "h1"]
-            for selector in name_selectors:
-                if self.should_cancel():
-                    return {}
-                try:
-                    name = driver.find_element(By.CSS_SELECTOR, selector).text.strip()
-                    if name and len(name) > 1 and name != "Results":
-                        gym_data['name'] = name
-                        break
-                except:
-                    continue
-            if 'name' not in gym_data:
-                gym_data['name'] = ''
-
-            if self.should_cancel():
-                return {}
-
-            # ADDRESS
-            try:
-                address_btn = driver.find_element(By.CSS_SELECTOR, "button[data-item-id='address']")
-                gym_data['address'] = address_btn.text.strip()
-            except:
-                gym_data['address'] = ''
-
-            if self.should_cancel():
-                return {}
-
-            # PHONE NUMBER (FIXED)
-            gym_data['phone'] = ''
-            try:
-                # Method 1: New Google Maps structure
-                phone_btn = WebDriverWait(driver, 5).until(
-                    EC.presence_of_element_located((By.XPATH, "//button[contains(@jsaction, 'pane.wfvdle')]"))
-                )
-                phone_divs = phone_btn.find_elements(By.TAG_NAME, "div")
-                for div in phone_divs:
-                    if self.should_cancel():
-                        return {}
-                    text = div.text.strip()
-                    if re.match(r'^\+?\d[\d\s\-]{8,}\d$', text):
-                        gym_data['phone'] = text
-                        break
-
-                # Method 2: Fallback - scan visible text
-                if not gym_data['phone']:
-                    phone_elements = driver.find_elements(By.XPATH, "//div[contains(@class, 'fontBodyMedium') or contains(@class, 'Io6YTe')]")
-                    for elem in phone_elements:
-                        if self.should_cancel():
-                            return {}
-                        text = elem.text.strip()
-                        if re.match(r'^\+?\d[\d\s\-]{8,}\d$', text):
-                            gym_data['phone'] = text
-                            break
-
-                # Method 3: Last resort - page source
-                if not gym_data['phone']:
-                    all_text = driver.page_source
-                    phone_matches = re.findall(r'\+?\d[\d\s\-]{8,}\d', all_text)
-                    if phone_matches:
-                        for match in phone_matches:
-                            if self.should_cancel():
-                                return {}
-                            cleaned = re.sub(r'[^\d\+]', '', match)
-                            if 10 <= len(cleaned) <= 15:
-                                gym_data['phone'] = match
-                                break
-            except Exception as e:
-                print(f"   ⚠️ Phone extraction error: {e}")
-
-            if self.should_cancel():
-                return {}
-
-            # WEBSITE
-            try:
-                website_btn = driver.find_element(By.CSS_SELECTOR, "a[data-item-id='authority']")
-                gym_data['website'] = website_btn.get_attribute('href')
-            except:
-                gym_data['website'] = ''
-
-            if self.should_cancel():
-                return {}
-
-            # RATING
-            try:
-                rating_span = driver.find_element(By.CSS_SELECTOR, "div.F7nice span[aria-hidden='true']")
-                rating = rating_span.text.strip()
-                if re.match(r'^\d\.\d$', rating):
-                    gym_data['rating'] = rating
-                else:
-                    gym_data['rating'] = ''
-            except:
-                gym_data['rating'] = ''
-
-            if self.should_cancel():
-                return {}
-
-            # REVIEWS COUNT
-            try:
-                reviews_span = driver.find_element(By.CSS_SELECTOR, "div.F7nice span:last-child")
-                reviews_text = reviews_span.text.strip()
-                reviews_num = re.sub(r'[^\d]', '', reviews_text)
-                gym_data['reviews_count'] = reviews_num if reviews_num.isdigit() else ''
-            except:
-                gym_data['reviews_count'] = ''
-
-            if self.should_cancel():
-                return {}
-
-            # CATEGORY
-            try:
-                category_btn = driver.find_element(By.CSS_SELECTOR, "button.DkEaL")
-                gym_data['category'] = category_btn.text.strip()
-            except:
-                gym_data['category'] = 'Gym'
-
-            if self.should_cancel():
-                return {}
-
-            # DIRECTIONS URL
-            try:
-                data_match = re.search(r'data=!4m7!3m6!1s0x[^:]+:0x[^!]+!8m2!3d([-\d.]+)!4d([-\d.]+)', place_url)
-                if data_match:
-                    lat, lng = data_match.groups()
-                    gym_data['directions_url'] = f"{place_url}&dirflg=d&travelmode=driving&ll={lat}%2C{lng}"
-                else:
-                    gym_data['directions_url'] = f"{place_url}&dirflg=d"
-            except:
-                gym_data['directions_url'] = place_url
-
+            # One call once DetailPool's readiness wait has passed; a missing field is an immediate miss.
+            # The phone falls back to the contact rows, then the panel HTML.
+            fields = self.details.read_fields(driver)
         except (TimeoutException, NoSuchElementException, StaleElementReferenceException, InvalidSessionIdException, NoSuchWindowException) as e:
             print(f"   ❌ Data extraction failed: {e}")
             return {}
 
+        rating = fields.get('rating', '')
+        reviews_num = re.sub(r'[^\d]', '', fields.get('reviews', ''))
+        gym_data = {
+            'name': fields.get('name', ''),
+            'address': fields.get('address', ''),
+            'phone': fields.get('phone', ''),
+            'website': fields.get('website', ''),
+            'rating': rating if re.match(r'^\d\.\d$', rating) else '',
+            'reviews_count': reviews_num,
+            'category': fields.get('category') or 'Gym',
+            'hours': fields.get('hours', ''),
+            'latitude': fields.get('latitude', ''),
+            'longitude': fields.get('longitude', ''),
+            'directions_url': place_directions_url(place_url),
+        }
         return gym_data if gym_data.get('name') else {}
 
     def save_gym_csv(self, gyms, filename, gym_type, base_dir='.'):
@@ -463,38 +260,12 @@ class GymScraper:
         print(f"\n💾 Saved CSV: {full_path}")
         return len(gym_data)
 
+    def save_simplified_csv(self, gyms, filename, gym_type='gym'):
+        """Wrapper for save_gym_csv to match the job runner call"""
+        return self.save_gym_csv(gyms, filename, gym_type)
+
 
 # Standalone function (for non-Django use)
 def scrape_gym_type(gym_type, location, max_results, job_id=None):
     scraper = GymScraper(headless=True, job_id=job_id)
     return scraper.scrape_gyms_comprehensive(location, gym_type, max_results, job_id)
-
-def close_gym_scraper_by_job_id(job_id):
-    """Close a specific gym scraper instance by job ID"""
-    scraper_instance = GymScraper.active_scrapers.get(job_id)
-    if scraper_instance:
-        try:
-            scraper_instance.close_chrome_tab()
-            return True
-        except Exception as e:
-            print(f"Error closing gym scraper for job {job_id}: {e}")
-            return False
-    else:
-        # If instance not found in registry, try to kill by process
-        try:
-            import psutil
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    if 'chrome' in proc.info['name'].lower():
-                        cmdline = ' '.join(proc.info['cmdline'])
-                        if f'job_{job_id}' in cmdline or f'jobid_{job_id}' in cmdline:
-                            proc.kill()
-                            proc.wait(timeout=5)
-                            print(f"Killed Chrome process by cmdline for job {job_id}")
-                            return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
-                    continue
-        except Exception as e:
-            print(f"Error in fallback process killing: {e}")
-        
-        return False
\ No newline at end of file
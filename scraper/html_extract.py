@@ -0,0 +1,375 @@
+"""
+Offline parsing of Google Maps place and feed HTML.
+
+The ``html`` extraction backend reads a place's panel HTML in one script
+call and parses it in-process instead of querying the live DOM. The parse
+is a small tree built with the standard library's ``html.parser`` plus the
+subset of CSS selectors the extraction profiles use (tag, id, class,
+attribute tests, descendant and child combinators, ``:first-child`` and
+``:last-child``). ``parse_place_html`` returns the same fields as
+``place_extract.read_place_fields`` does for the live page, so the
+category extractors work unchanged, and pages can be parsed with no
+browser at all (see ``scraper/fixtures/synthetic_pages`` and
+``manage.py benchmark_parsers``).
+
+The selector matching is written here rather than taken from lxml with
+cssselect, or BeautifulSoup with soupsieve, because none of those is in
+requirements.txt. Adding a compiled parser dependency to every web and
+worker host would be a bigger change than the extraction backend itself.
+Its only input is the registry's and the feed's own selectors.
+``HtmlParserTests`` checks that each of them compiles, and it pins the
+supported subset. If one of those libraries is added to the deployment,
+``compile_selector`` and the ``Node`` matching are the only code to swap.
+"""
+import re
+import time
+from functools import lru_cache
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from .feed import listing_record
+from .place_extract import build_profile
+
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr',
+}
+# Elements whose content is not page text
+NO_TEXT_ELEMENTS = {'script', 'style', 'noscript', 'template'}
+
+PANEL_HTML_JS = """
+var panel = document.querySelector("div[role='main']");
+return [panel ? panel.outerHTML : document.documentElement.outerHTML, location.href];
+"""
+
+PHONE_RE = re.compile(r'^\+?\d[\d\s\-]{8,}\d$')
+PHONE_IN_HTML_RE = re.compile(r'\+?\d[\d\s\-]{8,}\d')
+EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+OPEN_RE = re.compile(r'\b(open|closed|closes|opens)\b', re.IGNORECASE)
+COORDS_RES = (re.compile(r'!3d(-?\d+\.\d+)!4d(-?\d+\.\d+)'), re.compile(r'@(-?\d+\.\d+),(-?\d+\.\d+)'))
+
+
+class Node:
+    __slots__ = ('tag', 'attrs', 'children', 'parent')
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.children = []  # Nodes and text strings, in document order
+        self.parent = parent
+
+    def get(self, name, default=None):
+        return self.attrs.get(name, default)
+
+    @property
+    def elements(self):
+        return [child for child in self.children if isinstance(child, Node)]
+
+    def text(self):
+        """The node's text with surrounding whitespace trimmed (scripts and styles left out)"""
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            elif node.tag not in NO_TEXT_ELEMENTS:
+                stack.extend(reversed(node.children))
+        return ''.join(parts).strip()
+
+    def iter(self):
+        """Descendant elements (and this one) in document order"""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.elements))
+
+    def select(self, selector):
+        alternatives = compile_selector(selector)
+        return [node for node in self.iter() if node.tag and any(_matches(node, steps) for steps in alternatives)]
+
+    def select_one(self, selector):
+        alternatives = compile_selector(selector)
+        for node in self.iter():
+            if node.tag and any(_matches(node, steps) for steps in alternatives):
+                return node
+        return None
+
+    def closest(self, selector):
+        alternatives = compile_selector(selector)
+        node = self
+        while node is not None and node.tag:
+            if any(_matches(node, steps) for steps in alternatives):
+                return node
+            node = node.parent
+        return None
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node(None)
+        self._open = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {name: value if value is not None else '' for name, value in attrs}, self._open[-1])
+        self._open[-1].children.append(node)
+        if tag not in VOID_ELEMENTS:
+            self._open.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        node = Node(tag, {name: value if value is not None else '' for name, value in attrs}, self._open[-1])
+        self._open[-1].children.append(node)
+
+    def handle_endtag(self, tag):
+        # Close up to the matching element; a stray end tag is ignored
+        for depth in range(len(self._open) - 1, 0, -1):
+            if self._open[depth].tag == tag:
+                del self._open[depth:]
+                return
+
+    def handle_data(self, data):
+        self._open[-1].children.append(data)
+
+
+def parse_html(html):
+    """The parsed document; its root node has no tag"""
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+_SIMPLE_RE = re.compile(r"""
+    (?P<tag>\*|[a-zA-Z][\w-]*)
+  | \#(?P<id>[\w-]+)
+  | \.(?P<cls>[\w-]+)
+  | \[\s*(?P<attr>[\w:-]+)\s*(?:(?P<op>[~^$*]?=)\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<bare>[^\]\s]+))\s*)?\]
+  | :(?P<pseudo>first-child|last-child)
+""", re.VERBOSE)
+
+
+@lru_cache(maxsize=256)
+def compile_selector(selector):
+    """``selector`` as alternatives, each a list of (combinator, tests) steps from left to right"""
+    alternatives = []
+    for group in selector.split(','):
+        steps = []
+        combinator = None
+        for token in re.findall(r'>|(?:[^\s>"\']|"[^"]*"|\'[^\']*\')+', group):
+            if token == '>':
+                combinator = '>'
+                continue
+            tests = []
+            position = 0
+            while position < len(token):
+                match = _SIMPLE_RE.match(token, position)
+                if not match:
+                    raise ValueError(f"Unsupported selector: {selector}")
+                position = match.end()
+                if match.group('attr'):
+                    value = next((v for v in match.group('dq', 'sq', 'bare') if v is not None), None)
+                    tests.append(('attr', match.group('attr'), match.group('op'), value))
+                else:
+                    kind = match.lastgroup
+                    tests.append((kind, match.group(kind), None, None))
+            steps.append((combinator or ' ', tests))
+            combinator = None
+        if steps:
+            alternatives.append(steps)
+    return tuple(alternatives)
+
+
+def _passes(node, tests):
+    for kind, name, op, value in tests:
+        if kind == 'tag':
+            if name != '*' and node.tag != name.lower():
+                return False
+        elif kind == 'id':
+            if node.get('id') != name:
+                return False
+        elif kind == 'cls':
+            if name not in node.get('class', '').split():
+                return False
+        elif kind == 'attr':
+            actual = node.get(name)
+            if actual is None:
+                return False
+            if op == '=' and actual != value:
+                return False
+            if op == '*=' and value not in actual:
+                return False
+            if op == '^=' and not actual.startswith(value):
+                return False
+            if op == '$=' and not actual.endswith(value):
+                return False
+            if op == '~=' and value not in actual.split():
+                return False
+        elif kind == 'pseudo':
+            siblings = node.parent.elements if node.parent else [node]
+            if siblings[0 if name == 'first-child' else -1] is not node:
+                return False
+    return True
+
+
+def _matches(node, steps, index=None):
+    index = len(steps) - 1 if index is None else index
+    combinator, tests = steps[index]
+    if not _passes(node, tests):
+        return False
+    if index == 0:
+        return True
+    if combinator == '>':
+        parent = node.parent
+        return parent is not None and parent.tag is not None and _matches(parent, steps, index - 1)
+    ancestor = node.parent
+    while ancestor is not None and ancestor.tag is not None:
+        if _matches(ancestor, steps, index - 1):
+            return True
+        ancestor = ancestor.parent
+    return False
+
+
+def _first_match(doc, selectors, tried, accept):
+    """Try selectors in order, appending ``[selector, hit, milliseconds]`` to ``tried``"""
+    for selector in selectors:
+        started = time.perf_counter()
+        value = accept(doc.select_one(selector))
+        tried.append([selector, bool(value), (time.perf_counter() - started) * 1000])
+        if value:
+            return value, selector
+    return None, 'miss'
+
+
+def _first_text(doc, selectors, tried, min_length=1):
+    def accept(node):
+        text = node.text() if node else ''
+        return text if len(text) >= min_length and text != 'Results' else ''
+    value, source = _first_match(doc, selectors, tried, accept)
+    return value or '', source
+
+
+def _first_node(doc, selectors, tried):
+    return _first_match(doc, selectors, tried, lambda node: node)
+
+
+def _scan_phone(doc, html):
+    button = doc.select_one("button[jsaction*='pane.wfvdle']")
+    for row in button.select('div') if button else []:
+        if PHONE_RE.match(row.text()):
+            return row.text(), 'contact rows'
+    for row in doc.select("div.fontBodyMedium, div.Io6YTe"):
+        if PHONE_RE.match(row.text()):
+            return row.text(), 'info rows'
+    for match in PHONE_IN_HTML_RE.findall(html):
+        if 10 <= len(re.sub(r'[^\d+]', '', match)) <= 15:
+            return match, 'panel html'
+    return '', 'miss'
+
+
+def _scan_email(doc, html):
+    mailto = doc.select_one('a[href^="mailto:"]')
+    if mailto:
+        return mailto.get('href').replace('mailto:', '').strip(), 'mailto'
+    match = EMAIL_RE.search(html)
+    return (match.group(0), 'panel html') if match else ('', 'miss')
+
+
+def parse_place_html(html, url='', profile=None):
+    """The fields ``read_place_fields`` returns, read from saved place HTML"""
+    profile = build_profile(profile)
+    doc = parse_html(html)
+    trace = {}
+    attempts = {}
+
+    def timed(field, read, *args):
+        started = time.perf_counter()
+        value, source = read(*args)
+        trace[field] = [source, (time.perf_counter() - started) * 1000]
+        return value
+
+    def lookup(read, field, *args):
+        return read(doc, profile[field], attempts.setdefault(field, []), *args)
+
+    def phone_lookup():
+        value, source = lookup(_first_text, 'phone')
+        return (value, source) if value or not profile['scan_phone'] else _scan_phone(doc, html)
+
+    website = timed('website', lookup, _first_node, 'website')
+    hours = timed('hours', lookup, _first_node, 'hours')
+    coords = next((m for m in (pattern.search(url) for pattern in COORDS_RES) if m), None)
+    return {
+        'name': timed('name', lookup, _first_text, 'name', 2),
+        'address': timed('address', lookup, _first_text, 'address'),
+        'phone': timed('phone', phone_lookup),
+        'website': website.get('href', '') if website else '',
+        'website_label': website.get('aria-label', '') if website else '',
+        'rating': timed('rating', lookup, _first_text, 'rating'),
+        'reviews': timed('reviews', lookup, _first_text, 'reviews'),
+        'email': timed('email', _scan_email, doc, html) if profile['scan_email'] else '',
+        'category': timed('category', lookup, _first_text, 'category'),
+        'hours': (hours.get('aria-label') or hours.text()) if hours else '',
+        'latitude': coords.group(1) if coords else '',
+        'longitude': coords.group(2) if coords else '',
+        'url': url,
+        'trace': trace,
+        'attempts': attempts,
+    }
+
+
+def read_place_html(driver, profile=None):
+    """Fetch the open place's panel HTML in one script call and parse it here"""
+    html, url = driver.execute_script(PANEL_HTML_JS)
+    return parse_place_html(html, url, profile)
+
+
+def parse_feed_html(html, base_url='https://www.google.com/', selectors=None):
+    """Feed-card records, one per distinct place link, read from saved results-feed HTML"""
+    from .feed import PLACE_LINK_SELECTORS, place_key
+    doc = parse_html(html)
+    records = []
+    seen = set()
+    for selector in selectors or PLACE_LINK_SELECTORS:
+        for link in doc.select(selector):
+            href = urljoin(base_url, link.get('href', ''))
+            if '/maps/place/' not in href or place_key(href) in seen:
+                continue
+            seen.add(place_key(href))
+            records.append(listing_record(_read_card(link, href)))
+    return records
+
+
+def _read_card(link, href):
+    card = link.closest('div.Nv2PK') or link.parent
+    rating_node = card.select_one('span.MW4etd')
+    rating = rating_node.text() if rating_node else ''
+    phone_node = card.select_one('span.UsdlK')
+    info = {'category': '', 'address': '', 'open_status': '', 'phone': phone_node.text() if phone_node else ''}
+    for row in card.select('div.W4Efsd'):
+        if row.select('div.W4Efsd')[1:]:
+            continue  # Only the innermost rows
+        parts = [part.strip() for part in row.text().split('·') if part.strip()]
+        if not parts or (rating and parts[0].startswith(rating)):
+            continue
+        if OPEN_RE.search(parts[0]):
+            info['open_status'] = parts[0]
+            for part in parts[1:]:
+                if not info['phone'] and PHONE_RE.match(part):
+                    info['phone'] = part
+        elif not info['category']:
+            info['category'] = parts[0]
+            info['address'] = parts[-1] if len(parts) > 1 else ''
+    website = card.select_one("a[data-value='Website']")
+    name_node = card.select_one('div.qBF1Pd')
+    reviews_node = card.select_one('span.UY7F9')
+    return {
+        'href': href,
+        'name': link.get('aria-label') or (name_node.text() if name_node else ''),
+        'rating': rating,
+        'reviews': reviews_node.text() if reviews_node else '',
+        'category': info['category'],
+        'address': info['address'],
+        'open_status': info['open_status'],
+        'phone': info['phone'],
+        'website': website.get('href', '') if website else '',
+    }
@@ -0,0 +1,118 @@
+"""
+The Chrome processes that belong to each running scrape job.
+
+Each scraper class used to keep its own unlocked ``active_scrapers`` dict.
+The cancel view only looked in the salon scraper's dict. When that failed,
+it killed every Chrome on the host that had started in the last 60
+seconds, including other users' jobs.
+
+``job_registry`` is the one registry for all scraper types. A scraper
+registers itself under its job id. Every driver it leases (the main one
+and ``DetailPool``'s extra sessions) is attached with its process group
+(chromedriver leads one group holding the browser and all its renderers,
+see ``chrome_process``) and its profile directory.
+
+The same entry is mirrored to ``ScrapeJob.browser_processes`` (host, worker
+PID, ``[pgid, create_time]`` pairs, profile directories), which the reaper
+(see ``reaper``) reads to tell live browsers from orphans.
+
+A cancel is cooperative (see ``cancellation``): the scraper stops at its
+next check and keeps its checkpoint. Only a job still running
+``SCRAPE_CANCEL_KILL_AFTER_SECONDS`` later has its browsers killed, by the
+worker's own cancel watcher calling ``terminate(job_id)``, so a driver call
+blocked on a hung page fails instead of holding the job.
+"""
+import logging
+import os
+import socket
+import threading
+
+from .browser_pool import browser_pool
+from .chrome_process import process_group
+
+logger = logging.getLogger(__name__)
+
+
+class JobEntry:
+    def __init__(self, job_id, scraper):
+        self.job_id = job_id
+        self.scraper = scraper
+        self.drivers = {}  # id(driver) -> (driver, [pgid, create_time] or None, profile_dir)
+
+
+class JobRegistry:
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def register(self, job_id, scraper):
+        if not job_id:
+            return
+        with self._lock:
+            self._jobs[job_id] = JobEntry(job_id, scraper)
+
+    def unregister(self, job_id):
+        with self._lock:
+            entry = self._jobs.pop(job_id, None)
+        if entry:
+            self._store(job_id, None)
+
+    def attach(self, job_id, driver):
+        """Record a driver leased for the job, with its process group and profile directory"""
+        with self._lock:
+            entry = self._jobs.get(job_id)
+        if entry is None:
+            return
+        record = (driver, process_group(driver), browser_pool.profile_dir(driver))
+        with self._lock:
+            entry.drivers[id(driver)] = record
+        self._store(job_id, entry)
+
+    def detach(self, job_id, driver):
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None or entry.drivers.pop(id(driver), None) is None:
+                return
+        self._store(job_id, entry)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_job_ids(self):
+        with self._lock:
+            return set(self._jobs)
+
+    def terminate(self, job_id):
+        """Kill the browsers of a job running in this process without a graceful close; how many were killed"""
+        entry = self.get(job_id)
+        if entry is None:
+            return 0
+        with self._lock:
+            drivers = [driver for driver, _, _ in entry.drivers.values()]
+        for driver in drivers:
+            browser_pool.terminate(driver)
+        if drivers:
+            logger.warning(f"Killed {len(drivers)} Chrome session(s) of job {job_id}")
+        return len(drivers)
+
+    def _store(self, job_id, entry):
+        from .models import ScrapeJob
+        state = {}
+        if entry is not None:
+            with self._lock:
+                drivers = list(entry.drivers.values())
+            state = {
+                'host': socket.gethostname(),
+                'worker_pid': os.getpid(),
+                'process_groups': [group for _, group, _ in drivers if group],
+                'profiles': [profile_dir for _, _, profile_dir in drivers if profile_dir],
+            }
+        try:
+            ScrapeJob.objects.filter(job_id=job_id).update(browser_processes=state)
+        except Exception as e:
+            logger.warning(f"Could not record browser processes for job {job_id}: {e}")
+
+
+# One registry per process; the job rows connect the processes
+job_registry = JobRegistry()
@@ -0,0 +1,506 @@
+"""
+Background scrape jobs.
+
+The web views only record a ``ScrapeJob`` row in ``pending`` state and hand
+its ``job_id`` back to the browser. The scrape itself runs in a separate
+worker process (see ``workers.py``) which claims pending rows, drives the
+matching scraper class and stores the results, CSV file and download history
+on the job.
+
+Completed result sets are also kept per query key in ``QueryResult``: a
+repeat request is answered from there without a browser, and a request for
+more results than were stored only scrapes the shortfall.
+"""
+import logging
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cancellation import cancel_signal, release_cancel_signal
+from .models import DownloadHistory, QueryResult, ScrapeJob
+from .scheduler import fair_share_order, over_quota
+
+logger = logging.getLogger(__name__)
+
+FITNESS_TYPES = ['crossfit', 'yoga', 'pilates', 'martial_arts', 'swimming', 'all_gyms']
+BUSINESS_TYPES = ['startup', 'manufacturing', 'consultant', 'all_business']
+
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+IN_FLIGHT_STATUSES = ('pending', 'running')
+
+
+def generate_job_id(user):
+    """Default job id used when the client does not send one"""
+    return f"scrape_{user.id if user.is_authenticated else 'guest'}_{int(timezone.now().timestamp())}"
+
+
+def normalize_location(location):
+    """'Chennai, Tamil Nadu ' and 'chennai tamil nadu' are the same place"""
+    return ' '.join((location or '').lower().replace(',', ' ').split())
+
+
+def build_query_key(main_category, subcategory, location, custom_term='', listing_only=False, detail_fields=()):
+    """Key shared by every request that would scrape exactly the same pages"""
+    parts = [
+        main_category or '',
+        subcategory or '',
+        normalize_location(location),
+        ' '.join((custom_term or '').lower().split()),
+    ]
+    if listing_only:
+        # Feed-card records lack fields full records have; keep them apart
+        parts.append('listing:' + ','.join(sorted(detail_fields or [])))
+    return '|'.join(parts)
+
+
+def submit_scrape_job(user, main_category, subcategory, location, max_results, custom_term='', job_id=None,
+                      detail_sessions=None, listing_only=False, detail_fields=None, extraction_backend=None):
+    """
+    Queue a scrape and return its ``ScrapeJob``.
+
+    Nothing is scraped here; the row is picked up by a scrape worker. A fresh
+    stored result set with enough records completes the job on the spot. If an
+    identical scrape (same query key, at least as many results) is already
+    queued or running, the new job is attached to it as a follower instead:
+    no worker ever claims it, and it receives the leader's results and CSV
+    when the leader finishes.
+
+    ``detail_sessions`` is how many browser sessions visit place pages in
+    parallel (SCRAPE_DETAIL_SESSIONS when not given). ``listing_only`` builds
+    records from the results feed cards and opens a place page only for the
+    ``detail_fields`` (phone, website, ...) a card does not show.
+    ``extraction_backend`` picks how place data is read (see
+    ``ScrapeJob.EXTRACTION_BACKENDS``); the DOM is the default.
+    """
+    detail_fields = sorted(set(detail_fields or [])) if listing_only else []
+    query_key = build_query_key(main_category, subcategory, location, custom_term, listing_only, detail_fields)
+    fields = dict(
+        user=user if user.is_authenticated else None,
+        location=location,
+        main_category=main_category,
+        subcategory=subcategory or '',
+        custom_term=custom_term or '',
+        max_results=max_results,
+        detail_sessions=max(1, min(detail_sessions or settings.SCRAPE_DETAIL_SESSIONS, settings.SCRAPE_DETAIL_SESSIONS_MAX)),
+        listing_only=listing_only,
+        detail_fields=detail_fields,
+        extraction_backend=extraction_backend or 'dom',
+        status='pending',
+        job_id=job_id or generate_job_id(user),
+        query_key=query_key,
+    )
+
+    cached = fresh_query_result(query_key)
+    if cached and len(cached.results) >= max_results:
+        with transaction.atomic():
+            job = ScrapeJob.objects.create(**fields)
+            results = cached.results[:max_results]
+            message = f"Scraped {len(results)} {main_category} facilities."
+            _store_outcome(job, 'completed', message, results, write_results_csv(job, results))
+        logger.info(f"Scrape job {job.job_id} served from stored results for {query_key}")
+        return job
+
+    with transaction.atomic():
+        # The lock keeps the leader from storing its outcome before this follower is attached
+        leader = in_flight_leader(query_key, max_results)
+        if leader:
+            return _attach_follower(leader, fields)
+
+        if cached:
+            # Top-up: start from the stored frontier so only the shortfall is visited
+            fields['checkpoint'] = {'completed_terms': [], 'urls': cached.frontier.get('urls', []),
+                                    'records': cached.frontier.get('records', {}),
+                                    'listings': cached.frontier.get('listings', {})}
+        try:
+            with transaction.atomic():
+                job = ScrapeJob.objects.create(**fields)
+        except IntegrityError:
+            # An identical request became the leader between the lookup and the insert
+            leader = in_flight_leader(query_key, max_results)
+            if leader is None:
+                raise
+            fields.pop('checkpoint', None)
+            return _attach_follower(leader, fields)
+
+    if cached:
+        logger.info(f"Scrape job {job.job_id} tops up {len(cached.results)} stored results to {max_results}")
+    return job
+
+
+def in_flight_leader(query_key, max_results):
+    """The queued or running job an identical request for ``max_results`` can follow, locked; or None"""
+    return ScrapeJob.objects.select_for_update().filter(
+        query_key=query_key,
+        status__in=IN_FLIGHT_STATUSES,
+        coalesced_with__isnull=True,
+        cancel_requested=False,
+        max_results__gte=max_results,
+    ).order_by('created_at').first()
+
+
+def _attach_follower(leader, fields):
+    job = ScrapeJob.objects.create(coalesced_with=leader, **fields)
+    logger.info(f"Scrape job {job.job_id} attached to in-flight job {leader.job_id} ({job.query_key})")
+    return job
+
+
+def fresh_query_result(query_key):
+    """The stored result set for ``query_key`` if it is within SCRAPE_RESULT_CACHE_TTL, else None"""
+    ttl = settings.SCRAPE_RESULT_CACHE_TTL
+    if ttl <= 0:
+        return None
+    return QueryResult.objects.filter(
+        query_key=query_key, refreshed_at__gte=timezone.now() - timedelta(seconds=ttl)
+    ).first()
+
+
+def remember_query_result(job, results):
+    """Store a completed job's records and URL frontier under its query key"""
+    if not job.query_key or settings.SCRAPE_RESULT_CACHE_TTL <= 0:
+        return
+    state = ScrapeJob.objects.filter(pk=job.pk).values_list('checkpoint', flat=True).first() or {}
+    QueryResult.objects.update_or_create(
+        query_key=job.query_key,
+        defaults={
+            'main_category': job.main_category,
+            'results': results,
+            'frontier': {
+                'urls': state.get('urls', []), 'records': state.get('records', {}),
+                'listings': state.get('listings', {}),
+            },
+            'source_job': job,
+            'refreshed_at': timezone.now(),
+        },
+    )
+
+
+def promote_follower(job):
+    """
+    Hand an in-flight job's followers to the one asking for the most results before it is cancelled.
+
+    The promoted follower (the oldest among equals) becomes a normal queued
+    job carrying the leader's checkpoint, so its worker resumes instead of
+    starting over; every other follower asked for no more and follows it.
+    When an identical request already leads that query, all of them follow
+    that job instead.
+    """
+    followers = list(job.followers.filter(status__in=IN_FLIGHT_STATUSES).order_by('-max_results', 'created_at'))
+    if not followers:
+        return None
+    new_leader = followers[0]
+    try:
+        with transaction.atomic():
+            ScrapeJob.objects.filter(pk=new_leader.pk).update(
+                coalesced_with=None, checkpoint=ScrapeJob.objects.get(pk=job.pk).checkpoint
+            )
+            ScrapeJob.objects.filter(pk__in=[f.pk for f in followers[1:]]).update(coalesced_with=new_leader)
+    except IntegrityError:
+        # one_leader_per_in_flight_query: an identical request became a leader of its own meanwhile
+        with transaction.atomic():
+            new_leader = in_flight_leader(new_leader.query_key, new_leader.max_results)
+            if new_leader is None:
+                raise
+            ScrapeJob.objects.filter(pk__in=[f.pk for f in followers]).update(coalesced_with=new_leader)
+    logger.info(f"Scrape job {new_leader.job_id} takes over from cancelled job {job.job_id}")
+    return new_leader
+
+
+def claim_next_job():
+    """
+    Atomically move the next pending job to ``running`` and return it.
+
+    Jobs are tried in fair-share order (see ``scheduler.py``). The claim is a
+    conditional UPDATE, so two workers polling at the same time can never
+    both start the same job; a claim that races another worker past the
+    user's running-job quota is handed back.
+    """
+    for pk in fair_share_order()[:10]:
+        previous_start = ScrapeJob.objects.filter(pk=pk).values_list('started_at', flat=True).first()
+        claimed = ScrapeJob.objects.filter(pk=pk, status='pending').update(
+            status='running', started_at=timezone.now(), updated_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if not claimed:
+            continue
+        job = ScrapeJob.objects.get(pk=pk)
+        if over_quota(job):
+            # Undo the claim entirely; a start left behind would count against the user's fair share
+            ScrapeJob.objects.filter(pk=pk, status='running').update(
+                status='pending', started_at=previous_start, attempts=F('attempts') - 1
+            )
+            continue
+        if job.queue_wait_seconds is None:
+            job.queue_wait_seconds = (job.started_at - job.created_at).total_seconds()
+            ScrapeJob.objects.filter(pk=pk).update(queue_wait_seconds=job.queue_wait_seconds)
+        return job
+    return None
+
+
+def release_job(job):
+    """Put a job this worker can no longer finish back in the queue, keeping its checkpoint"""
+    ScrapeJob.objects.filter(pk=job.pk, status='running').update(status='pending', updated_at=timezone.now())
+    logger.info(f"Scrape job {job.job_id} released back to the queue")
+
+
+def requeue_stale_jobs():
+    """
+    Requeue running jobs whose worker died without releasing them.
+
+    A live job touches ``updated_at`` on every progress or checkpoint write, so
+    a row that has been quiet for ``SCRAPE_JOB_STALE_SECONDS`` belongs to a
+    crashed worker. It resumes from its checkpoint, up to
+    ``SCRAPE_JOB_MAX_ATTEMPTS`` attempts in total.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.SCRAPE_JOB_STALE_SECONDS)
+    stale = ScrapeJob.objects.filter(status='running', updated_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=settings.SCRAPE_JOB_MAX_ATTEMPTS).update(
+        status='failed', error_message='Scrape worker stopped responding', finished_at=timezone.now()
+    )
+    requeued = stale.filter(attempts__lt=settings.SCRAPE_JOB_MAX_ATTEMPTS).update(
+        status='pending', updated_at=timezone.now()
+    )
+    if failed:
+        ScrapeJob.objects.filter(status__in=IN_FLIGHT_STATUSES, coalesced_with__status='failed').update(
+            status='failed', error_message='Scrape worker stopped responding', finished_at=timezone.now()
+        )
+    if failed or requeued:
+        logger.warning(f"Stale scrape jobs: {requeued} requeued, {failed} failed")
+    return requeued
+
+
+def get_scraper_by_category(category):
+    """Return a scraper instance for the category (only the one needed is created)"""
+    from .gym_scraper import GymScraper
+    from .business_scraper import BusinessScraper
+    from .electronic_scraper import SimplifiedGoogleMapsElectronicShopScraper
+    from .ebike_scraper import SimplifiedGoogleMapsEbikeShowroomScraper
+    from .college_scraper import SimplifiedGoogleMapsCollegeScraper
+    from .training_scraper import SimplifiedGoogleMapsTrainingInstituteScraper
+    from .salon_scraper import EnhancedGoogleMapsScraper
+    from .boutique_scraper import SimplifiedGoogleMapsBoutiqueScraper
+    from .general_scraper import SimplifiedGoogleMapsGeneralScraper
+
+    scrapers = {
+        'fitness': GymScraper,
+        'business': BusinessScraper,
+        'electronic_shop': SimplifiedGoogleMapsElectronicShopScraper,
+        'ebike': SimplifiedGoogleMapsEbikeShowroomScraper,
+        'college': SimplifiedGoogleMapsCollegeScraper,
+        'training_institute': SimplifiedGoogleMapsTrainingInstituteScraper,
+        'salon': EnhancedGoogleMapsScraper,
+        'boutique': SimplifiedGoogleMapsBoutiqueScraper,
+        'custom': SimplifiedGoogleMapsGeneralScraper,
+    }
+    scraper_class = scrapers.get(category)
+    return scraper_class() if scraper_class else None
+
+
+def perform_scraping_with_cancellation(main_category, subcategory, location, max_results, custom_term, job_id):
+    """
+    Perform scraping with cancellation support
+    """
+    cancel = cancel_signal(job_id)
+
+    # Import the scraper functions
+    from .gym_scraper import scrape_gym_type
+    from .business_scraper import scrape_business_type
+    from .electronic_scraper import scrape_electronic_shop
+    from .ebike_scraper import scrape_ebike
+    from .college_scraper import scrape_college
+    from .training_scraper import scrape_training_institute
+    from .salon_scraper import scrape_salon
+    from .boutique_scraper import scrape_boutique
+    from .general_scraper import scrape_general
+
+    try:
+        if main_category == 'fitness' and subcategory in FITNESS_TYPES:
+            results = scrape_gym_type(subcategory, location, max_results, job_id=job_id)
+        elif main_category == 'business' and subcategory in BUSINESS_TYPES:
+            results = scrape_business_type(subcategory, location, max_results, job_id=job_id)
+        elif main_category == 'electronic_shop':
+            results = scrape_electronic_shop(location, max_results, job_id=job_id)
+        elif main_category == 'ebike':
+            results = scrape_ebike(location, max_results, job_id=job_id)
+        elif main_category == 'college':
+            results = scrape_college(location, max_results, job_id=job_id)
+        elif main_category == 'training_institute':
+            results = scrape_training_institute(location, max_results, job_id=job_id)
+        elif main_category == 'salon':
+            results = scrape_salon(location, max_results, job_id=job_id)
+        elif main_category == 'boutique':
+            results = scrape_boutique(location, max_results, job_id=job_id)
+        elif main_category == 'custom':
+            if not custom_term:
+                return []
+            results = scrape_general(location, custom_term, max_results, job_id=job_id)
+        else:
+            return []
+
+        # Check if cancellation was requested
+        if cancel.is_set():
+            return "CANCELLED"
+
+        return results
+
+    except Exception as e:
+        # Check if cancellation was requested
+        if cancel.is_set():
+            return "CANCELLED"
+        raise e
+
+
+def csv_filename_for(job):
+    """Absolute CSV path for a job, named the way the synchronous views did plus the job id"""
+    location_slug = job.location.replace(' ', '_').replace(',', '').lower()
+    if job.main_category == 'custom':
+        stem = f"{job.custom_term.replace(' ', '_')}_{location_slug}"
+    else:
+        stem = f"{job.main_category}_{location_slug}_{job.main_category}s"
+    # Every job gets its own file; jobs for the same query must not overwrite each other's download
+    job_slug = re.sub(r'[^\w-]', '_', job.job_id or str(job.pk))
+    return os.path.join(settings.MEDIA_ROOT, f"{stem}_{job_slug}.csv")
+
+
+def write_results_csv(job, results):
+    """Write ``results`` to the job's CSV in its category's column layout and return the media URLs"""
+    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+    scraper = get_scraper_by_category(job.main_category)
+    if not scraper:
+        return []
+    filename = csv_filename_for(job)
+    scraper.save_simplified_csv(results, filename)
+    return ['/media/' + os.path.basename(filename)]
+
+
+def execute_job(job):
+    """
+    Run a claimed job to completion and store its outcome on the row.
+
+    Called from a scrape worker, never from a request thread.
+    """
+    csv_files = []
+    results = []
+
+    try:
+        results = perform_scraping_with_cancellation(
+            job.main_category, job.subcategory, job.location, job.max_results, job.custom_term, job.job_id
+        )
+
+        if results == "CANCELLED":
+            status = 'cancelled'
+            # Keep what was extracted before the cancel
+            results = checkpoint_records(job)
+            message = f"Scraping was cancelled by user after {len(results)} results."
+            if results:
+                csv_files = write_results_csv(job, results)
+        elif results:
+            csv_files = write_results_csv(job, results)
+            status = 'completed'
+            message = f"Scraped {len(results)} {job.main_category} facilities."
+        else:
+            status = 'failed'
+            message = f"No {job.main_category} facilities found."
+            results = []
+
+    except Exception as e:
+        logger.exception(f"Scrape job {job.job_id} failed")
+        status = 'failed'
+        message = f"Error during scraping: {str(e)}"
+        results = []
+    finally:
+        release_cancel_signal(job.job_id)
+
+    with transaction.atomic():
+        # Followers attaching right now wait for this, so none is left without the outcome
+        ScrapeJob.objects.select_for_update().filter(pk=job.pk).first()
+        if status == 'completed':
+            remember_query_result(job, results)
+        _store_outcome(job, status, message, results, csv_files)
+        # Requests coalesced onto this job get the same result set and CSV
+        for follower in job.followers.filter(status__in=IN_FLIGHT_STATUSES):
+            _store_outcome(follower, status, message, results[:follower.max_results], csv_files)
+
+    logger.info(f"Scrape job {job.job_id} finished: {status} ({len(results)} results)")
+    return job
+
+
+def checkpoint_records(job):
+    """Records the job's checkpoint holds, in URL frontier order"""
+    state = ScrapeJob.objects.filter(pk=job.pk).values_list('checkpoint', flat=True).first() or {}
+    records = state.get('records', {})
+    return [records[url] for url in state.get('urls', []) if url in records][:job.max_results]
+
+
+def _store_outcome(job, status, message, results, csv_files):
+    job.status = status
+    job.results = results
+    job.total_found = len(results)
+    job.progress = 100 if status == 'completed' else 0
+    job.error_message = message if status != 'completed' else None
+    job.finished_at = timezone.now()
+    fields = ['status', 'results', 'total_found', 'progress', 'error_message', 'finished_at', 'updated_at']
+    if csv_files:
+        job.csv_file.name = os.path.basename(csv_files[0])
+        fields.append('csv_file')
+    if status == 'completed':
+        job.checkpoint = {}
+        fields.append('checkpoint')
+    # Columns the run wrote itself (checkpoint, wait savings, field latency) keep their stored values
+    job.save(update_fields=fields)
+
+    # Create download history entries for each CSV file
+    if job.user_id:
+        for csv_file in csv_files:
+            file_path = csv_file.replace('/media/', '')
+            full_file_path = os.path.join(settings.MEDIA_ROOT, file_path)
+            file_size = 0
+            try:
+                file_size = os.path.getsize(full_file_path)
+            except OSError:
+                pass
+
+            DownloadHistory.objects.create(
+                user_id=job.user_id,
+                scrape_job=job,
+                file_name=os.path.basename(file_path),
+                file_path=csv_file,
+                file_size=file_size,
+                download_count=0
+            )
+
+
+def job_status_payload(job):
+    """JSON-serialisable view of a job for the status endpoint"""
+    finished = job.status in FINISHED_STATUSES
+    success = job.status == 'completed'
+    # A follower has no progress of its own; show the job doing the work
+    progress_source = job.coalesced_with if job.coalesced_with_id and not finished else job
+    if success:
+        message = f"Scraped {job.total_found} {job.main_category} facilities."
+    elif finished:
+        message = job.error_message or f"No {job.main_category} facilities found."
+    elif progress_source is not job:
+        message = 'Attached to an identical scrape already in progress'
+    else:
+        message = 'Scraping in progress' if job.status == 'running' else 'Waiting for a scrape worker'
+    return {
+        'job_id': job.job_id,
+        'status': job.status,
+        'success': success,
+        'message': message,
+        # A cancelled job keeps the records extracted before the cancel
+        'results': job.results if success or job.status == 'cancelled' else [],
+        'csv_files': [job.csv_file.url] if job.status in ('completed', 'cancelled') and job.csv_file else [],
+        'message_type': 'info' if success else 'error',
+        'is_processing': not finished,
+        'progress': progress_source.progress,
+        'progress_detail': progress_source.progress_detail,
+        'queue_wait_seconds': job.queue_wait_seconds,
+        'wait_seconds_saved': round(job.wait_seconds_saved, 1),
+        'field_latency': job.field_latency,
+    }
+
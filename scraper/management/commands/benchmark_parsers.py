@@ -0,0 +1,63 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from scraper.html_extract import parse_feed_html, parse_place_html
+from scraper.place_extract import CATEGORY_PROFILES, read_place_fields
+
+CORPUS = Path(__file__).resolve().parents[2] / 'fixtures' / 'synthetic_pages'
+
+
+class Command(BaseCommand):
+    help = "Measure place/feed parsing throughput (pages/sec) on the synthetic page corpus, offline and through Selenium"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=200, help='Passes over the corpus per backend')
+        parser.add_argument('--selenium', action='store_true',
+                            help='Also run the live-DOM script path in Chrome on the same pages')
+
+    def handle(self, *args, **options):
+        entries = json.loads((CORPUS / 'index.json').read_text(encoding='utf-8'))
+        pages = [(entry, (CORPUS / entry['file']).read_text(encoding='utf-8')) for entry in entries]
+        places = [(entry, html) for entry, html in pages if entry['kind'] == 'place']
+        feeds = [(entry, html) for entry, html in pages if entry['kind'] == 'feed']
+        rounds = options['rounds']
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for entry, html in places:
+                parse_place_html(html, entry['url'], CATEGORY_PROFILES.get(entry['category']))
+        self.report('html', 'place', rounds * len(places), time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for entry, html in feeds:
+                parse_feed_html(html, entry['url'])
+        self.report('html', 'feed', rounds * len(feeds), time.perf_counter() - started)
+
+        if options['selenium']:
+            self.benchmark_selenium(places, rounds)
+
+    def benchmark_selenium(self, places, rounds):
+        """The DOM backend: one extraction script per page, timed without the page load"""
+        from scraper.browser_pool import browser_pool, chrome_options
+        driver = browser_pool.lease(chrome_options())
+        try:
+            elapsed = 0.0
+            for entry, _ in places:
+                driver.get((CORPUS / entry['file']).as_uri())
+                profile = CATEGORY_PROFILES.get(entry['category'])
+                started = time.perf_counter()
+                for _ in range(rounds):
+                    read_place_fields(driver, profile)
+                elapsed += time.perf_counter() - started
+            self.report('selenium', 'place', rounds * len(places), elapsed)
+        finally:
+            browser_pool.release(driver)
+            browser_pool.shutdown()
+
+    def report(self, backend, kind, count, seconds):
+        rate = count / seconds if seconds else float('inf')
+        self.stdout.write(f"{backend:<9}{kind:<6}{count:>7} pages in {seconds:7.3f}s  {rate:10.1f} pages/sec")
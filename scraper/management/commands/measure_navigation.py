@@ -0,0 +1,93 @@
+import time
+
+from django.core.management.base import BaseCommand
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+
+from scraper.browser_pool import browser_pool, chrome_options
+from scraper.feed import FeedHarvest
+from scraper.navigation import MAPS_HOME, MapsNavigator
+from scraper.waits import PageWaits, place_ready, results_ready, search_box_ready
+
+
+class Command(BaseCommand):
+    help = "Compare average search and place navigation time: full reloads versus the in-app navigator"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--terms', nargs='+', default=['gyms in Chennai', 'salons in Chennai', 'colleges in Chennai'],
+                            help='Searches to run, in order')
+        parser.add_argument('--places', type=int, default=5, help='Places opened after the last search')
+        parser.add_argument('--runs', type=int, default=3, help='Fresh browser sessions per mode')
+
+    def handle(self, *args, **options):
+        navigator = MapsNavigator(PageWaits(), enabled=True)
+        samples = {mode: {'search': [], 'place': []} for mode in ('reload', 'in-app')}
+        try:
+            for run in range(options['runs']):
+                # Each mode gets a fresh session, so neither reuses the Maps scripts the other cached;
+                # the order alternates, so neither always runs second against warmed-up servers
+                for mode in ('reload', 'in-app') if run % 2 == 0 else ('in-app', 'reload'):
+                    driver = browser_pool.lease(chrome_options())
+                    try:
+                        if mode == 'reload':
+                            measured = self.measure_reloads(driver, options['terms'], options['places'])
+                        else:
+                            measured = self.measure_navigator(navigator, driver, options['terms'], options['places'])
+                    finally:
+                        navigator.forget(driver)
+                        # Never handed back to the pool: the next lease starts a new session
+                        browser_pool.terminate(driver)
+                    for kind, seconds in measured.items():
+                        samples[mode][kind].extend(seconds)
+        finally:
+            browser_pool.shutdown()
+        before, after = samples['reload'], samples['in-app']
+
+        self.stdout.write(f"{'':<8}{'reload s':>10}{'in-app s':>10}{'in-app share':>14}")
+        for kind in ('search', 'place'):
+            first_loads = navigator.times.totals.get((kind, 'reload'), (0, 0))[0]
+            in_app = navigator.times.totals.get((kind, 'in-app'), (0, 0))[0]
+            share = in_app / ((first_loads + in_app) or 1)
+            self.stdout.write(f"{kind:<8}{self.seconds(before[kind]):>10}{self.seconds(after[kind]):>10}{share:>14.0%}")
+
+    def measure_reloads(self, driver, terms, places):
+        """The old flow: Maps home page, type the term, ENTER; a driver.get per place"""
+        waits = PageWaits()
+        searches, opens = [], []
+        for term in terms:
+            started = time.monotonic()
+            driver.get(MAPS_HOME)
+            waits.until(driver, search_box_ready, 15)
+            box = driver.find_element(By.ID, 'searchboxinput')
+            box.clear()
+            box.send_keys(term)
+            box.send_keys(Keys.ENTER)
+            waits.until(driver, results_ready, 15)
+            searches.append(time.monotonic() - started)
+        for url in self.place_urls(driver, places):
+            started = time.monotonic()
+            driver.get(url)
+            waits.until(driver, place_ready(), 15)
+            opens.append(time.monotonic() - started)
+        return {'search': searches, 'place': opens}
+
+    def measure_navigator(self, navigator, driver, terms, places):
+        """Search URL first, then in-app searches; places clicked from the feed"""
+        searches, opens = [], []
+        for term in terms:
+            started = time.monotonic()
+            navigator.search(driver, term, ceiling=15)
+            searches.append(time.monotonic() - started)
+        for url in self.place_urls(driver, places):
+            started = time.monotonic()
+            navigator.open_place(driver, url, ceiling=15)
+            opens.append(time.monotonic() - started)
+        return {'search': searches, 'place': opens}
+
+    def place_urls(self, driver, places):
+        harvest = FeedHarvest()
+        harvest.scroll(driver)
+        return harvest.urls[:places]
+
+    def seconds(self, samples):
+        return f"{sum(samples) / len(samples):.2f}" if samples else '-'
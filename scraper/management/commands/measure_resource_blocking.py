@@ -0,0 +1,82 @@
+import json
+import shutil
+import tempfile
+import time
+from urllib.parse import quote_plus
+
+from django.core.management.base import BaseCommand
+from selenium import webdriver
+
+from scraper.browser_pool import apply_resource_profile, chrome_options
+from scraper.chrome_process import PROFILE_PREFIX
+from scraper.feed import FeedHarvest
+from scraper.waits import PageWaits, network_quiet, place_ready, results_ready
+
+
+class Command(BaseCommand):
+    help = "Compare bytes transferred and page-ready time with and without the resource-blocking profile"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', default='gyms in Chennai Tamil Nadu', help='Google Maps search to load')
+        parser.add_argument('--runs', type=int, default=3, help='Fresh browser sessions per profile')
+        parser.add_argument('--places', type=int, default=3, help='Place pages opened per run after the search')
+
+    def handle(self, *args, **options):
+        rows = []
+        for block in (False, True):
+            pages = []
+            for _ in range(options['runs']):
+                pages.extend(self.measure_run(block, options['query'], options['places']))
+            rows.append((block, pages))
+
+        self.stdout.write(f"{'profile':<10}{'pages':>7}{'MB/page':>10}{'requests':>10}{'blocked':>9}{'ready s':>9}")
+        for block, pages in rows:
+            count = len(pages) or 1
+            self.stdout.write(
+                f"{'blocking' if block else 'full':<10}{len(pages):>7}"
+                f"{sum(p['bytes'] for p in pages) / count / 1e6:>10.2f}"
+                f"{sum(p['requests'] for p in pages) / count:>10.0f}"
+                f"{sum(p['blocked'] for p in pages) / count:>9.0f}"
+                f"{sum(p['ready'] for p in pages) / count:>9.2f}"
+            )
+
+    def measure_run(self, block, query, places):
+        options = chrome_options()
+        profile_dir = tempfile.mkdtemp(prefix=PROFILE_PREFIX)
+        options.add_argument(f"--user-data-dir={profile_dir}")
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+        driver = webdriver.Chrome(options=options)
+        waits = PageWaits()
+        pages = []
+        try:
+            apply_resource_profile(driver, block)
+            search_url = f"https://www.google.com/maps/search/{quote_plus(query)}"
+            pages.append(self.measure_page(driver, waits, search_url, results_ready))
+            harvest = FeedHarvest()
+            harvest.scroll(driver)
+            for url in harvest.urls[:places]:
+                pages.append(self.measure_page(driver, waits, url, place_ready()))
+        finally:
+            driver.quit()
+            shutil.rmtree(profile_dir, ignore_errors=True)
+        return pages
+
+    def measure_page(self, driver, waits, url, ready):
+        driver.get_log('performance')  # Drop events from the previous page
+        started = time.monotonic()
+        driver.get(url)
+        waits.until(driver, ready, 30)
+        ready_seconds = time.monotonic() - started
+        waits.until(driver, network_quiet(), 10)
+
+        transferred = requests = blocked = 0
+        for entry in driver.get_log('performance'):
+            message = json.loads(entry['message'])['message']
+            if message['method'] == 'Network.requestWillBeSent':
+                requests += 1
+            elif message['method'] == 'Network.loadingFinished':
+                transferred += message['params'].get('encodedDataLength', 0)
+            elif message['method'] == 'Network.loadingFailed' and message['params'].get('blockedReason'):
+                blocked += 1
+        return {'bytes': transferred, 'requests': requests, 'blocked': blocked, 'ready': ready_seconds}
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from scraper.reaper import ChromeReaper, run_reaper_loop
+
+
+class Command(BaseCommand):
+    help = "Kill Chrome processes and remove profile directories left behind by dead scrape jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=None,
+                            help='Seconds an orphan must have existed (default: SCRAPE_REAPER_GRACE_SECONDS)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be reaped')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep sweeping every SCRAPE_REAPER_INTERVAL seconds, as run_scrape_workers does')
+
+    def handle(self, *args, **options):
+        if options['loop']:
+            run_reaper_loop(grace=options['grace'])
+            return
+        report = ChromeReaper(grace=options['grace'], dry_run=options['dry_run']).sweep()
+        action = 'Would reap' if options['dry_run'] else 'Reaped'
+        self.stdout.write(f"{action} {report}")
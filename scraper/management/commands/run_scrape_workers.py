@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from scraper.workers import available_memory_mb, memory_capped_concurrency, run_worker_loop, run_worker_pool
+
+
+class Command(BaseCommand):
+    help = "Run a pool of scrape worker processes that claim pending ScrapeJob rows and execute them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Number of worker processes (default: SCRAPE_WORKER_CONCURRENCY)')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Run a single in-process worker and exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            run_worker_loop(poll_interval=options['poll_interval'], once=True)
+            return
+
+        requested = options['workers'] or settings.SCRAPE_WORKER_CONCURRENCY
+        concurrency = memory_capped_concurrency(requested)
+        if concurrency < requested:
+            self.stdout.write(self.style.WARNING(
+                f"Only {available_memory_mb():.0f} MB free: starting {concurrency} of {requested} workers"
+            ))
+        self.stdout.write(f"Starting {concurrency} scrape worker(s), waiting for jobs...")
+        run_worker_pool(concurrency, poll_interval=options['poll_interval'])
+        self.stdout.write("Scrape workers stopped")
@@ -0,0 +1,186 @@
+"""
+Place records decoded from the Maps UI's own network responses.
+
+The Maps web app loads its results as JSON payloads: ``/search?tbm=map``
+while the results feed is scrolled, and ``/maps/preview/place`` for a place
+panel. A job with ``extraction_backend='network'`` runs Chrome with
+performance logging, reads those responses back with CDP
+``Network.getResponseBody`` and decodes the place arrays into the same record
+dict the DOM extractors build, keyed by place id. Most places are then
+already known once URL collection finishes; the rest are decoded after their
+page loads, and anything still missing falls back to the DOM extractor.
+
+The payloads are positional arrays with no field names. The indexes below
+are the ones the Maps UI has used for a long time; a place whose array does
+not match them decodes to None and takes the DOM path. The test payloads in
+``scraper/fixtures/synthetic_payloads`` are hand-built to that layout, so
+they pin the decoder down but cannot show the layout is still current. With
+``SCRAPE_PAYLOAD_CAPTURE_DIR`` set, every payload a job reads is also saved
+there raw, to be redacted and added as a real fixture.
+"""
+import base64
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .place_cache import place_id_from_url
+from .place_extract import directions_url
+
+logger = logging.getLogger(__name__)
+
+XSSI_PREFIX = ")]}'"
+
+# Responses that carry place arrays
+SEARCH_PAYLOAD_PATH = '/search?tbm=map'
+PLACE_PAYLOAD_PATH = '/maps/preview/place'
+
+
+def _at(data, *path):
+    """``data[path[0]][path[1]]...`` or None when the shape does not match"""
+    for index in path:
+        try:
+            data = data[index]
+        except (IndexError, KeyError, TypeError):
+            return None
+    return data
+
+
+def load_payload(body):
+    """Parse a Maps response body, unwrapping the XSSI guard and the ``{"d": ...}`` envelope"""
+    text = body.strip()
+    if text.endswith('/*""*/'):
+        text = text[:-len('/*""*/')]
+    if text.startswith('{'):
+        text = json.loads(text).get('d', '')
+    if text.startswith(XSSI_PREFIX):
+        text = text[len(XSSI_PREFIX):]
+    return json.loads(text)
+
+
+def place_record(info):
+    """Record dict for one place array, or None when it has no name"""
+    name = _at(info, 11)
+    if not isinstance(name, str) or not name:
+        return None
+    address = _at(info, 39) or ', '.join(part for part in (_at(info, 2) or []) if isinstance(part, str))
+    rating = _at(info, 4, 7)
+    reviews = _at(info, 4, 8)
+    hours = []
+    for day in _at(info, 34, 1) or []:
+        day_name, times = _at(day, 0), _at(day, 1)
+        if isinstance(day_name, str) and isinstance(times, list):
+            hours.append(f"{day_name}: {', '.join(times)}")
+    latitude, longitude = _at(info, 9, 2), _at(info, 9, 3)
+    return {
+        'place_id': _at(info, 10) or '',
+        'name': name,
+        'address': address or '',
+        'directions_url': directions_url(address),
+        'phone': _at(info, 178, 0, 0) or '',
+        'website': _at(info, 7, 0) or '',
+        'rating': str(rating) if rating is not None else '',
+        'reviews_count': str(reviews) if reviews is not None else '',
+        'category': _at(info, 13, 0) or '',
+        'hours': '; '.join(hours),
+        'latitude': str(latitude) if latitude is not None else '',
+        'longitude': str(longitude) if longitude is not None else '',
+    }
+
+
+def search_records(payload):
+    """Records for every place in a ``/search?tbm=map`` payload"""
+    records = []
+    for entry in _at(payload, 0, 1) or []:
+        record = place_record(_at(entry, 14))
+        if record:
+            records.append(record)
+    return records
+
+
+def preview_record(payload):
+    """The record in a ``/maps/preview/place`` payload, or None"""
+    return place_record(_at(payload, 6))
+
+
+def records_from_response(url, body):
+    """Records decoded from one captured response; empty for responses without place data"""
+    try:
+        if SEARCH_PAYLOAD_PATH in url:
+            return search_records(load_payload(body))
+        if PLACE_PAYLOAD_PATH in url:
+            record = preview_record(load_payload(body))
+            return [record] if record else []
+    except (ValueError, AttributeError) as e:
+        logger.debug(f"Could not decode Maps payload from {url[:80]}: {e}")
+    return []
+
+
+def enable_capture(options):
+    """Have Chrome keep a performance log, which is where captured responses are found"""
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+
+class ResponseCapture:
+    def __init__(self, save_dir=None):
+        self.records = {}  # place id -> record
+        self.save_dir = settings.SCRAPE_PAYLOAD_CAPTURE_DIR if save_dir is None else save_dir
+        self._lock = threading.Lock()
+
+    def drain(self, driver):
+        """Decode the place payloads the driver received since the last drain"""
+        found = 0
+        for request_id, url in self._payload_requests(driver):
+            try:
+                response = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            except Exception:
+                continue  # Evicted or from a page that is gone
+            body = response.get('body', '')
+            if response.get('base64Encoded'):
+                body = base64.b64decode(body).decode('utf-8', 'replace')
+            if self.save_dir:
+                self._save(request_id, url, body)
+            for record in records_from_response(url, body):
+                place_id = record.pop('place_id', '').lower()
+                if place_id:
+                    with self._lock:
+                        self.records[place_id] = record
+                    found += 1
+        return found
+
+    def record_for(self, url):
+        """A copy of the captured record for the place at ``url``, or None"""
+        place_id = place_id_from_url(url)
+        with self._lock:
+            record = self.records.get(place_id) if place_id else None
+        return dict(record) if record else None
+
+    def _save(self, request_id, url, body):
+        """Keep a raw payload as a fixture candidate; its URL goes on the first line"""
+        kind = 'search' if SEARCH_PAYLOAD_PATH in url else 'preview'
+        path = os.path.join(self.save_dir, f"{kind}_{int(time.time())}_{request_id.replace('.', '_')}.txt")
+        try:
+            os.makedirs(self.save_dir, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"{url}\n{body}")
+        except OSError as e:
+            logger.warning(f"Could not save Maps payload to {path}: {e}")
+
+    def _payload_requests(self, driver):
+        try:
+            entries = driver.get_log('performance')
+        except Exception as e:
+            logger.warning(f"Performance log unavailable, using the DOM path: {e}")
+            return []
+        requests = []
+        for entry in entries:
+            message = json.loads(entry['message']).get('message', {})
+            if message.get('method') != 'Network.responseReceived':
+                continue
+            url = message['params']['response'].get('url', '')
+            if SEARCH_PAYLOAD_PATH in url or PLACE_PAYLOAD_PATH in url:
+                requests.append((message['params']['requestId'], url))
+        return requests
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0002_scrapejob_background'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='progress_detail',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
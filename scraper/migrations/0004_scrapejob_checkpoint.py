@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0003_scrapejob_progress_detail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='scrapejob',
+            name='checkpoint',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
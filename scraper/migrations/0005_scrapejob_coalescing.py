@@ -0,0 +1,24 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0004_scrapejob_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='coalesced_with',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='followers', to='scraper.scrapejob'),
+        ),
+        migrations.AddField(
+            model_name='scrapejob',
+            name='query_key',
+            field=models.CharField(blank=True, db_index=True, max_length=400),
+        ),
+    ]
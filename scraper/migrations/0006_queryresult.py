@@ -0,0 +1,26 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0005_scrapejob_coalescing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query_key', models.CharField(max_length=400, unique=True)),
+                ('main_category', models.CharField(max_length=20)),
+                ('results', models.JSONField(blank=True, default=list)),
+                ('frontier', models.JSONField(blank=True, default=dict)),
+                ('refreshed_at', models.DateTimeField()),
+                ('source_job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='scraper.scrapejob')),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0006_queryresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaceRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('place_id', models.CharField(max_length=64, unique=True)),
+                ('record', models.JSONField(default=dict)),
+                ('last_seen', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
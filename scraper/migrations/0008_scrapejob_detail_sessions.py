@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0007_placerecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='detail_sessions',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
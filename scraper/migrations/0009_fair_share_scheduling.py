@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0008_scrapejob_detail_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='queue_wait_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='scrape_weight',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0009_fair_share_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='wait_seconds_saved',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0010_scrapejob_wait_seconds_saved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='detail_fields',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='scrapejob',
+            name='listing_only',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0011_scrapejob_listing_only'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='extraction_backend',
+            field=models.CharField(choices=[('dom', 'Rendered page (DOM)'), ('network', 'Captured Maps responses')], default='dom', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0012_scrapejob_extraction_backend'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scrapejob',
+            name='extraction_backend',
+            field=models.CharField(choices=[('dom', 'Rendered page (DOM)'), ('network', 'Captured Maps responses'), ('html', 'Panel HTML, parsed offline')], default='dom', max_length=10),
+        ),
+    ]
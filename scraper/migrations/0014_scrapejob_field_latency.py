@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0013_alter_scrapejob_extraction_backend'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='field_latency',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0014_scrapejob_field_latency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SelectorStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('field', models.CharField(max_length=20)),
+                ('selector', models.CharField(max_length=200)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('misses', models.PositiveIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('version', 'field', 'selector')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0015_selectorstat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='cancel_requested',
+            field=models.BooleanField(default=False),
+        ),
+    ]
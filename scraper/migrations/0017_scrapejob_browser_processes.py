@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0016_scrapejob_cancel_requested'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='browser_processes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
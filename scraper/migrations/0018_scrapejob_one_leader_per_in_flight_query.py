@@ -0,0 +1,34 @@
+# Generated by Django 5.0.3 on 2026-10-17 02:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def attach_duplicate_leaders(apps, schema_editor):
+    """Make later duplicates of an in-flight leader its followers, so the constraint can be added"""
+    ScrapeJob = apps.get_model('scraper', 'ScrapeJob')
+    leaders = {}
+    in_flight = ScrapeJob.objects.filter(
+        status__in=['pending', 'running'], coalesced_with__isnull=True, cancel_requested=False
+    ).exclude(query_key='').order_by('created_at')
+    for job in in_flight:
+        key = (job.query_key, job.max_results)
+        if key in leaders:
+            ScrapeJob.objects.filter(pk=job.pk).update(coalesced_with_id=leaders[key])
+        else:
+            leaders[key] = job.pk
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0017_scrapejob_browser_processes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(attach_duplicate_leaders, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='scrapejob',
+            constraint=models.UniqueConstraint(condition=models.Q(('cancel_requested', False), ('coalesced_with__isnull', True), ('status__in', ['pending', 'running']), models.Q(('query_key', ''), _negated=True)), fields=('query_key', 'max_results'), name='one_leader_per_in_flight_query'),
+        ),
+    ]
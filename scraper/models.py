@@ -52,6 +52,7 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     phone = models.CharField(max_length=15, blank=True)
     is_email_verified = models.BooleanField(default=False)
+    scrape_weight = models.PositiveSmallIntegerField(default=1)  # Share of scrape worker capacity relative to other users
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -136,6 +137,13 @@ class ScrapeJob(models.Model):
         ('running', 'Running'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    EXTRACTION_BACKENDS = [
+        ('dom', 'Rendered page (DOM)'),
+        ('network', 'Captured Maps responses'),
+        ('html', 'Panel HTML, parsed offline'),
     ]
     
     MAIN_CATEGORIES = [
@@ -170,26 +178,90 @@ class ScrapeJob(models.Model):
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     job_id = models.CharField(max_length=100, unique=True, null=True, blank=True)  # Add this field
-    user = models.ForeignKey(User, on_delete=models.CASCADE)  # Made required
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)  # Null for guest jobs
     location = models.CharField(max_length=200)
     main_category = models.CharField(max_length=20, choices=MAIN_CATEGORIES, default='ebike')
     subcategory = models.CharField(max_length=20, blank=True, null=True)
     custom_term = models.CharField(max_length=100, blank=True)
     max_results = models.PositiveIntegerField(default=25)
+    detail_sessions = models.PositiveSmallIntegerField(default=1)  # Browser sessions used to visit place pages in parallel
+    listing_only = models.BooleanField(default=False)  # Fast listing mode: records come from the results feed cards
+    detail_fields = models.JSONField(default=list, blank=True)  # Place-page fields still fetched in fast listing mode
+    extraction_backend = models.CharField(max_length=10, choices=EXTRACTION_BACKENDS, default='dom')  # How place pages are read; DOM is the fallback
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    cancel_requested = models.BooleanField(default=False)  # Set by the cancel endpoint, watched by the worker running the job
+    browser_processes = models.JSONField(default=dict, blank=True)  # Host, worker PID, [pgid, create_time] process groups and profile dirs of the job's Chrome
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     progress = models.IntegerField(default=0)
+    progress_detail = models.JSONField(default=dict, blank=True)  # Stage, search term i/N, place j/M, records so far
     total_found = models.IntegerField(default=0)
     error_message = models.TextField(blank=True, null=True)
     csv_file = models.FileField(upload_to='csv_files/', blank=True, null=True)
+    results = models.JSONField(default=list, blank=True)  # Scraped records, returned by the job status endpoint
+    query_key = models.CharField(max_length=400, blank=True, db_index=True)  # category|subcategory|location|custom_term
+    coalesced_with = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='followers')  # Identical in-flight job this one waits on
+    checkpoint = models.JSONField(default=dict, blank=True)  # Finished search terms, URL frontier, feed cards and records, for resuming
+    attempts = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    queue_wait_seconds = models.FloatField(null=True, blank=True)  # Time from submission to first claim by a worker
+    wait_seconds_saved = models.FloatField(default=0)  # Page-wait time saved against the old fixed sleeps
+    field_latency = models.JSONField(default=dict, blank=True)  # Field -> selector/fallback that answered -> latency bucket -> count
+    finished_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            # Identical requests submitted at the same time must not both start a scrape
+            models.UniqueConstraint(
+                fields=['query_key', 'max_results'],
+                condition=models.Q(
+                    status__in=['pending', 'running'], coalesced_with__isnull=True, cancel_requested=False
+                ) & ~models.Q(query_key=''),
+                name='one_leader_per_in_flight_query',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.main_category} - {self.subcategory or 'No subcategory'} in {self.location} - {self.status}"
 
+class QueryResult(models.Model):
+    """Latest completed result set for a query key, reused by repeat scrapes"""
+    query_key = models.CharField(max_length=400, unique=True)
+    main_category = models.CharField(max_length=20)
+    results = models.JSONField(default=list, blank=True)
+    frontier = models.JSONField(default=dict, blank=True)  # URL frontier, feed cards and per-URL records of the job that produced it
+    source_job = models.ForeignKey(ScrapeJob, on_delete=models.SET_NULL, null=True, blank=True)
+    refreshed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.query_key} ({len(self.results)} results)"
+
+class PlaceRecord(models.Model):
+    """Last fields read from a Google Maps place page, shared by every category scraper"""
+    place_id = models.CharField(max_length=64, unique=True)  # 0x...:0x... from the place URL
+    record = models.JSONField(default=dict)  # {'fields': read_place_fields output, 'scans': [profile scan flags]}
+    last_seen = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.record.get('fields', {}).get('name', self.place_id)} ({self.place_id})"
+
+class SelectorStat(models.Model):
+    """Hit/miss counts of one place-page selector, per selector registry version"""
+    version = models.PositiveIntegerField()  # selector_registry.REGISTRY_VERSION
+    field = models.CharField(max_length=20)
+    selector = models.CharField(max_length=200)
+    hits = models.PositiveIntegerField(default=0)
+    misses = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)  # Summed lookup time of every try
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('version', 'field', 'selector')
+
+    def __str__(self):
+        return f"v{self.version} {self.field} {self.selector}: {self.hits}/{self.hits + self.misses}"
+
 class Gym(models.Model):
     scrape_job = models.ForeignKey(ScrapeJob, on_delete=models.CASCADE, related_name='gyms')
     name = models.CharField(max_length=300)
@@ -0,0 +1,249 @@
+"""
+Navigation inside the loaded Google Maps app.
+
+The scrapers used to reload ``https://www.google.com/maps`` for every
+search term, wait for the search box, type the term and press ENTER, and
+then load every place page with its own ``driver.get``. Each of those is a
+full boot of the Maps application.
+
+``MapsNavigator`` keeps the app loaded instead. The first search of a
+session opens the search-results URL directly, with no home page and no
+typing. Later searches submit the term through the search box of the
+already loaded app; the new results are recognised by the URL switching to
+the new term or the feed element being replaced, not by their first entry,
+which synonym terms often share. A place is opened by clicking its entry in
+the results feed, and the navigator returns to the feed through the app's
+history. A place that is not in the loaded feed (URL lists mix several
+terms' feeds) is loaded by URL on its own; the feed stays in the history
+behind it, so the next place that is in the feed is clicked again.
+``DetailPool`` asks ``feed_places`` up front and prefetches those places in
+tabs of their own, leaving the feed's tab to the navigator. Each
+in-app step waits for the new results or place, and falls back to a full
+load when they do not appear. ``SCRAPE_SPA_NAVIGATION=0`` turns this off.
+
+Every navigation is timed by kind (``search``, ``place``) and mode
+(``reload``, ``in-app``). ``summary()`` gives the averages of both modes,
+and ``manage.py measure_navigation`` compares them with the old
+home-page-and-typing flow.
+"""
+import logging
+import threading
+import time
+from urllib.parse import quote_plus, unquote_plus, urlparse
+
+from django.conf import settings
+
+from .place_cache import place_id_from_url
+from .waits import feed_present, network_quiet, place_ready, results_ready
+
+logger = logging.getLogger(__name__)
+
+MAPS_HOME = 'https://www.google.com/maps'
+
+# Mark the feed on screen, so the one a new search renders can be told from it
+_MARK_FEED_JS = """
+var feed = document.querySelector("[role='feed']");
+if (feed) { feed.setAttribute('data-scrape-previous', '1'); }
+"""
+
+_FEED_REPLACED_JS = """
+var feed = document.querySelector("[role='feed']");
+return !!feed && !feed.hasAttribute('data-scrape-previous');
+"""
+
+_IN_APP_SEARCH_JS = """
+var box = document.getElementById('searchboxinput');
+var button = document.getElementById('searchbox-searchbutton') || document.querySelector("button[aria-label='Search']");
+if (!box || box.disabled || !button) { return false; }
+box.focus();
+box.value = arguments[0];
+box.dispatchEvent(new Event('input', {bubbles: true}));
+button.click();
+return true;
+"""
+
+# Click the feed entry of the place; returns the heading shown before the click,
+# or the feed's place links when the place is not in it
+_OPEN_FROM_FEED_JS = """
+var key = arguments[0], encoded = key.replace(':', '%3A');
+var links = document.querySelectorAll("[role='feed'] a[href*='/maps/place/']");
+for (var i = 0; i < links.length; i++) {
+    var href = links[i].getAttribute('href') || '';
+    if (href.toLowerCase().indexOf(key) >= 0 || href.toLowerCase().indexOf(encoded) >= 0) {
+        var heading = document.querySelector('h1.DUwDvf');
+        links[i].scrollIntoView({block: 'center'});
+        links[i].click();
+        return {clicked: true, heading: heading ? heading.textContent.trim() : ''};
+    }
+}
+return {clicked: false, links: Array.prototype.map.call(links, function (link) { return link.href; })};
+"""
+
+_FEED_LINKS_JS = """
+return Array.prototype.map.call(
+    document.querySelectorAll("[role='feed'] a[href*='/maps/place/']"), function (link) { return link.href; }
+);
+"""
+
+
+def search_url(term):
+    return f"{MAPS_HOME}/search/{quote_plus(term)}"
+
+
+def searched_term(url):
+    """The term of a ``/maps/search/<term>`` URL, normalised, or None"""
+    parts = urlparse(url).path.split('/')
+    if 'search' not in parts or parts.index('search') + 1 >= len(parts):
+        return None
+    return normalize_term(unquote_plus(parts[parts.index('search') + 1]))
+
+
+def normalize_term(term):
+    return ' '.join(term.lower().split())
+
+
+def fresh_results(term, previous_url):
+    """Condition for results of a new search: the URL names the term, the feed was replaced, or a place opened"""
+    def condition(driver):
+        if not results_ready(driver):
+            return False
+        url = driver.current_url
+        if url != previous_url and (searched_term(url) == normalize_term(term) or '/maps/place/' in url):
+            return True
+        return driver.execute_script(_FEED_REPLACED_JS)
+
+    return condition
+
+
+def place_opened(key, previous_heading):
+    """Condition for an in-app place open: the URL names the place, a new heading shows, network quiet"""
+    quiet = network_quiet()
+
+    def condition(driver):
+        if key not in driver.current_url.lower().replace('%3a', ':'):
+            return False
+        heading = driver.execute_script(
+            "var h = document.querySelector('h1.DUwDvf'); return h ? h.textContent.trim() : '';"
+        )
+        return bool(heading) and heading != previous_heading and quiet(driver)
+
+    return condition
+
+
+class NavigationTimes:
+    """Seconds spent per navigation, by kind and mode"""
+
+    def __init__(self):
+        self.totals = {}  # (kind, mode) -> [count, seconds]
+        self._lock = threading.Lock()
+
+    def record(self, kind, mode, seconds):
+        with self._lock:
+            total = self.totals.setdefault((kind, mode), [0, 0.0])
+            total[0] += 1
+            total[1] += seconds
+
+    def average(self, kind, mode):
+        count, seconds = self.totals.get((kind, mode), (0, 0.0))
+        return seconds / count if count else None
+
+    def summary(self):
+        """'search: reload 1 x 4.20s, in-app 4 x 1.10s; place: ...' for the log"""
+        with self._lock:
+            kinds = sorted({kind for kind, _ in self.totals})
+            return '; '.join(
+                f"{kind}: " + ', '.join(
+                    f"{mode} {count} x {seconds / count:.2f}s"
+                    for (k, mode), (count, seconds) in sorted(self.totals.items()) if k == kind
+                )
+                for kind in kinds
+            )
+
+
+class MapsNavigator:
+    def __init__(self, waits, enabled=None):
+        self.waits = waits
+        self.enabled = settings.SCRAPE_SPA_NAVIGATION if enabled is None else enabled
+        self.times = NavigationTimes()
+        self._depth = {}  # id() of drivers showing a search this navigator ran -> history entries since its feed
+        self._feed_keys = {}  # id() -> place ids in that feed, once a place was found missing from it
+
+    def search(self, driver, term, ceiling=8):
+        """Show the results for ``term``; True once a feed or a single place is on screen"""
+        started = time.monotonic()
+        if self.enabled and id(driver) in self._depth:
+            previous_url = driver.current_url
+            driver.execute_script(_MARK_FEED_JS)
+            if driver.execute_script(_IN_APP_SEARCH_JS, term) and self.waits.until(
+                driver, fresh_results(term, previous_url), ceiling, replaces=8
+            ):
+                self._showing_feed(driver)
+                self.times.record('search', 'in-app', time.monotonic() - started)
+                return True
+            logger.debug(f"In-app search for '{term}' did not show new results; loading its URL")
+        self.forget(driver)
+        driver.get(search_url(term))
+        met = self.waits.until(driver, results_ready, ceiling, replaces=8)
+        self.times.record('search', 'reload', time.monotonic() - started)
+        if self.enabled and met:
+            self._showing_feed(driver)
+        return met
+
+    def open_place(self, driver, url, ceiling=4):
+        """Show the place at ``url``; True once its page is ready"""
+        started = time.monotonic()
+        key = place_id_from_url(url)
+        if self.enabled and key and id(driver) in self._depth and self._open_in_app(driver, key, ceiling):
+            self.times.record('place', 'in-app', time.monotonic() - started)
+            return True
+        # Only this place is loaded by URL; the feed stays one more history entry back
+        driver.get(url)
+        if id(driver) in self._depth:
+            self._depth[id(driver)] += 1
+        met = self.waits.until(driver, place_ready(), ceiling, replaces=ceiling)
+        self.times.record('place', 'reload', time.monotonic() - started)
+        return met
+
+    def feed_places(self, driver):
+        """Place ids in the results feed the driver shows, or the one it can go back to; empty when unknown"""
+        if not self.enabled or id(driver) not in self._depth:
+            return set()
+        if self._depth[id(driver)]:
+            return set(self._feed_keys.get(id(driver), ()))
+        try:
+            links = driver.execute_script(_FEED_LINKS_JS) or []
+        except Exception:
+            return set()
+        return {place_id_from_url(link) for link in links} - {None}
+
+    def forget(self, driver):
+        """The driver's tab was navigated by someone else; it no longer shows this navigator's feed"""
+        self._depth.pop(id(driver), None)
+        self._feed_keys.pop(id(driver), None)
+
+    def _showing_feed(self, driver):
+        self._depth[id(driver)] = 0
+        self._feed_keys.pop(id(driver), None)
+
+    def _open_in_app(self, driver, key, ceiling):
+        """Click the place in the feed, going back to the feed first; False when it has to be loaded by URL"""
+        depth = self._depth[id(driver)]
+        if depth:
+            known = self._feed_keys.get(id(driver))
+            if known is not None and key not in known:
+                return False  # Not in the feed either; stay where we are
+            driver.execute_script("history.go(arguments[0]);", -depth)
+            self._depth[id(driver)] = 0
+            if not self.waits.until(driver, feed_present, ceiling, replaces=0):
+                self.forget(driver)
+                return False
+        found = driver.execute_script(_OPEN_FROM_FEED_JS, key)
+        if not found or not found.get('clicked'):
+            self._feed_keys[id(driver)] = {place_id_from_url(link) for link in (found or {}).get('links', [])}
+            return False
+        if self.waits.until(driver, place_opened(key, found['heading']), ceiling, replaces=ceiling):
+            self._depth[id(driver)] = 1
+            return True
+        # The click went somewhere unknown; a full load of this place resets the state
+        self.forget(driver)
+        return False
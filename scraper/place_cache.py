@@ -0,0 +1,74 @@
+"""
+Cross-job cache of place-page fields.
+
+Google Maps place URLs carry a stable feature id (``!1s0x...:0x...``). The
+scrapers look a URL up here before opening it, so overlapping searches
+(salon and boutique, college and training institute) skip pages another
+job has already read. What is cached is the raw ``read_place_fields``
+output, not a scraper's record: each category still runs its own
+post-processing (booking links, directions URL, default category) on it.
+An entry read within ``SCRAPE_PLACE_CACHE_TTL`` seconds is reused when it
+was read with at least the scans (``SCAN_FLAGS``) the asking profile turns
+on; a business job's email scan is not skipped because a gym job read the
+page without one. Only fields read from the place page are stored: places
+decoded from captured network payloads (``maps_payload``) stay with the
+job that decoded them.
+"""
+import logging
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PLACE_ID_RE = re.compile(r'!1s(0x[0-9a-f]+:0x[0-9a-f]+)', re.IGNORECASE)
+SCAN_FLAGS = ('scan_phone', 'scan_email')  # Profile flags that find fields a plainer read misses
+
+
+def place_id_from_url(url):
+    """The ``0x...:0x...`` place id in a Maps URL, or None"""
+    match = PLACE_ID_RE.search(url or '')
+    return match.group(1).lower() if match else None
+
+
+def profile_scans(profile):
+    """The ``SCAN_FLAGS`` an extraction profile turns on"""
+    return sorted(flag for flag in SCAN_FLAGS if (profile or {}).get(flag))
+
+
+def cached_place(url, profile=None):
+    """A copy of the fresh cached fields of the place at ``url`` read with ``profile``'s scans, or None"""
+    place_id = place_id_from_url(url)
+    ttl = settings.SCRAPE_PLACE_CACHE_TTL
+    if not place_id or ttl <= 0:
+        return None
+    from .models import PlaceRecord
+    try:
+        entry = PlaceRecord.objects.filter(
+            place_id=place_id, last_seen__gte=timezone.now() - timedelta(seconds=ttl)
+        ).values_list('record', flat=True).first()
+    except Exception as e:
+        logger.warning(f"Place cache lookup failed for {place_id}: {e}")
+        return None
+    # Entries without 'fields' are finished records cached by older code; never reuse those
+    if not entry or 'fields' not in entry or not set(profile_scans(profile)) <= set(entry.get('scans', [])):
+        return None
+    return dict(entry['fields'])
+
+
+def remember_place(url, fields, profile=None):
+    """Store the fields just read from the page of the place at ``url`` with ``profile``"""
+    place_id = place_id_from_url(url)
+    if not place_id or not fields or not fields.get('name') or fields['name'] == 'Results':
+        return
+    from .models import PlaceRecord
+    try:
+        PlaceRecord.objects.update_or_create(
+            place_id=place_id,
+            defaults={'record': {'fields': fields, 'scans': profile_scans(profile)}, 'last_seen': timezone.now()},
+        )
+    except Exception as e:
+        # The cache only saves page visits; a failed write must not fail the scrape
+        logger.warning(f"Could not cache place {place_id}: {e}")
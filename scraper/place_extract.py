@@ -0,0 +1,155 @@
+"""
+One-round-trip extraction of a Google Maps place page.
+
+Reading a place with ``find_element``/``.text``/``get_attribute`` costs one
+chromedriver HTTP round trip per call, 10-20 per place. ``read_place_fields``
+runs a single script instead and gets every field back as one JSON object:
+name, address, phone, website, rating, reviews, category, hours and
+coordinates. The selectors come from ``selector_registry`` in its current
+order; a category profile only switches the phone and email scans on.
+``trace`` in the result says, per field, which selector or fallback
+answered (or ``miss``) and how many milliseconds the lookup took;
+``attempts`` lists every selector tried with its hit and time, for the
+registry's counts.
+
+With the ``html`` extraction backend the same profile is applied to the
+panel HTML by the in-process parser in ``html_extract`` instead.
+"""
+import re
+import urllib.parse
+
+from .selector_registry import selector_registry
+
+DEFAULT_PROFILE = {
+    # Also look for a phone number in the contact rows and finally the panel HTML
+    'scan_phone': False,
+    # Look for a mailto: link, then an address anywhere in the panel HTML
+    'scan_email': False,
+}
+
+GYM_PROFILE = {
+    'scan_phone': True,
+}
+
+BUSINESS_PROFILE = {
+    'scan_email': True,
+}
+
+# Profile per main category; the others use DEFAULT_PROFILE
+CATEGORY_PROFILES = {
+    'fitness': GYM_PROFILE,
+    'business': BUSINESS_PROFILE,
+}
+
+PLACE_FIELDS_JS = r"""
+var profile = arguments[0];
+var trace = {};
+var attempts = {};
+// Fallback scans stay inside the place panel rather than the whole document
+var panel = document.querySelector("div[role='main']") || document.documentElement;
+function textOf(el) { return ((el && (el.innerText || el.textContent)) || '').trim(); }
+// Try a field's selectors in order, noting for each whether it hit and how long it took
+function firstMatch(field, accept) {
+    var selectors = profile[field], tried = attempts[field] = [];
+    for (var i = 0; i < selectors.length; i++) {
+        var started = performance.now();
+        var value = accept(document.querySelector(selectors[i]));
+        tried.push([selectors[i], !!value, performance.now() - started]);
+        if (value) { return [value, selectors[i]]; }
+    }
+    return [null, 'miss'];
+}
+function firstText(field, minLength) {
+    var hit = firstMatch(field, function (el) {
+        var text = textOf(el);
+        return (text && text.length >= (minLength || 1) && text !== 'Results') ? text : '';
+    });
+    return [hit[0] || '', hit[1]];
+}
+function firstElement(field) {
+    return firstMatch(field, function (el) { return el; });
+}
+// Run one field's lookup, noting which selector or fallback answered and how long it took
+function timed(field, read) {
+    var started = performance.now();
+    var result = read();
+    trace[field] = [result[1], performance.now() - started];
+    return result[0];
+}
+var PHONE = /^\+?\d[\d\s\-]{8,}\d$/;
+function scanPhone() {
+    var button = document.querySelector("button[jsaction*='pane.wfvdle']");
+    var rows = button ? button.querySelectorAll('div') : [];
+    for (var i = 0; i < rows.length; i++) {
+        if (PHONE.test(textOf(rows[i]))) { return [textOf(rows[i]), 'contact rows']; }
+    }
+    rows = panel.querySelectorAll("div.fontBodyMedium, div.Io6YTe");
+    for (var j = 0; j < rows.length; j++) {
+        if (PHONE.test(textOf(rows[j]))) { return [textOf(rows[j]), 'info rows']; }
+    }
+    var matches = panel.outerHTML.match(/\+?\d[\d\s\-]{8,}\d/g) || [];
+    for (var k = 0; k < matches.length; k++) {
+        var digits = matches[k].replace(/[^\d+]/g, '');
+        if (digits.length >= 10 && digits.length <= 15) { return [matches[k], 'panel html']; }
+    }
+    return ['', 'miss'];
+}
+function scanEmail() {
+    var mailto = panel.querySelector('a[href^="mailto:"]');
+    if (mailto) { return [mailto.getAttribute('href').replace('mailto:', '').trim(), 'mailto']; }
+    var match = panel.outerHTML.match(/\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b/);
+    return match ? [match[0], 'panel html'] : ['', 'miss'];
+}
+var website = timed('website', function () { return firstElement('website'); });
+var hours = timed('hours', function () { return firstElement('hours'); });
+var coords = location.href.match(/!3d(-?\d+\.\d+)!4d(-?\d+\.\d+)/) || location.href.match(/@(-?\d+\.\d+),(-?\d+\.\d+)/);
+var phone = timed('phone', function () {
+    var hit = firstText('phone');
+    return (hit[0] || !profile.scan_phone) ? hit : scanPhone();
+});
+return {
+    name: timed('name', function () { return firstText('name', 2); }),
+    address: timed('address', function () { return firstText('address'); }),
+    phone: phone,
+    website: website ? (website.getAttribute('href') || '') : '',
+    website_label: website ? (website.getAttribute('aria-label') || '') : '',
+    rating: timed('rating', function () { return firstText('rating'); }),
+    reviews: timed('reviews', function () { return firstText('reviews'); }),
+    email: profile.scan_email ? timed('email', scanEmail) : '',
+    category: timed('category', function () { return firstText('category'); }),
+    hours: hours ? (hours.getAttribute('aria-label') || textOf(hours)) : '',
+    latitude: coords ? coords[1] : '',
+    longitude: coords ? coords[2] : '',
+    url: location.href,
+    trace: trace,
+    attempts: attempts
+};
+"""
+
+
+def build_profile(profile=None):
+    """The registry's current selector order plus DEFAULT_PROFILE's flags, overridden by ``profile``"""
+    return {**DEFAULT_PROFILE, **selector_registry.profile(), **(profile or {})}
+
+
+def read_place_fields(driver, profile=None, backend='dom'):
+    """All fields of the open place page in one script call"""
+    if backend == 'html':
+        from .html_extract import read_place_html
+        return read_place_html(driver, profile)
+    return driver.execute_script(PLACE_FIELDS_JS, build_profile(profile)) or {}
+
+
+def directions_url(address):
+    if not address:
+        return ''
+    return f"https://www.google.com/maps/dir/?api=1&destination={urllib.parse.quote(address)}"
+
+
+def place_directions_url(place_url):
+    """Driving directions link built from the place URL and its embedded coordinates"""
+    match = re.search(r'data=!4m7!3m6!1s0x[^:]+:0x[^!]+!8m2!3d([-\d.]+)!4d([-\d.]+)', place_url)
+    if match:
+        lat, lng = match.groups()
+        return f"{place_url}&dirflg=d&travelmode=driving&ll={lat}%2C{lng}"
+    return f"{place_url}&dirflg=d"
@@ -0,0 +1,60 @@
+"""
+Real scrape progress for a ``ScrapeJob``.
+
+The scrapers call a ``JobProgress`` as they move through their loops. Each
+call writes ``progress`` (0-99) and ``progress_detail`` on the job row, which
+the SSE endpoint in ``views.job_progress_stream`` streams to the browser.
+Scrapers run without a job id outside Django, and every call is then a no-op.
+"""
+import logging
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Share of the progress ring given to URL collection; extraction gets the rest up to 99
+SEARCH_SHARE = 30
+
+
+class JobProgress:
+    def __init__(self, job_id=None):
+        self.job_id = job_id
+        self.detail = {
+            'stage': 'starting',
+            'term_index': 0,
+            'term_total': 0,
+            'urls_collected': 0,
+            'place_index': 0,
+            'place_total': 0,
+            'records': 0,
+        }
+
+    def searching(self, term_index, term_total):
+        """Search term ``term_index`` of ``term_total`` is being run"""
+        self.detail.update(stage='searching', term_index=term_index, term_total=term_total)
+        self._save(SEARCH_SHARE * (term_index - 1) // max(term_total, 1))
+
+    def urls_collected(self, count):
+        """``count`` unique place URLs collected so far"""
+        self.detail['urls_collected'] = count
+        term_total = max(self.detail['term_total'], 1)
+        self._save(SEARCH_SHARE * self.detail['term_index'] // term_total)
+
+    def extracting(self, place_index, place_total, records):
+        """Place ``place_index`` of ``place_total`` is being extracted, ``records`` kept so far"""
+        self.detail.update(stage='extracting', place_index=place_index, place_total=place_total, records=records)
+        self._save(SEARCH_SHARE + (99 - SEARCH_SHARE) * (place_index - 1) // max(place_total, 1))
+
+    def _save(self, percent):
+        if not self.job_id:
+            return
+        from .models import ScrapeJob
+        try:
+            ScrapeJob.objects.filter(job_id=self.job_id).update(
+                progress=min(max(percent, 0), 99),
+                progress_detail=dict(self.detail),
+                updated_at=timezone.now(),
+            )
+        except Exception as e:
+            # Progress is informational; never let it break a scrape
+            logger.warning(f"Could not save progress for job {self.job_id}: {e}")
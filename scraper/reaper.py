@@ -0,0 +1,264 @@
+"""
+Reaping of Chrome processes and profile directories left behind by dead jobs.
+
+A scrape worker that crashes or is OOM-killed never runs its scrapers'
+``close_chrome_tab``. Its chromedriver, browser and renderers keep running
+and hold their RAM, and its ``tempfile.mkdtemp()`` profile directory stays
+in /tmp. On busy days the host ran out of both.
+
+``ChromeReaper.sweep`` reads the process table once. It then compares it,
+and the scraper profile directories in the temp directory, against what is
+still owned:
+
+- the process groups and profiles recorded in ``ScrapeJob.browser_processes``
+  (see ``job_registry``) for running jobs on this host whose worker is alive;
+- a session whose ``OWNER_ENV`` names a worker that is still alive (a pooled
+  idle session, or a job not attached yet);
+- a profile directory named on the command line of a live Chrome.
+
+Everything else is orphaned: a session whose worker died, whichever process
+adopted it (init, or a subreaper such as ``systemd --user``), a browser
+without an owner running on a scraper profile, a profile directory nothing
+uses. A chromedriver carrying no owner was not started by a scrape worker
+and is left alone. Once it is older
+than ``SCRAPE_REAPER_GRACE_SECONDS``, its process group or tree is killed
+and the directory removed. Each sweep returns a ``ReapReport`` with counts
+and the reclaimed RSS and disk bytes.
+
+``run_scrape_workers`` runs ``run_reaper_loop`` in its own process every
+``SCRAPE_REAPER_INTERVAL`` seconds. ``manage.py reap_chrome_orphans`` runs
+one sweep by hand, with ``--dry-run`` to only report.
+"""
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import time
+
+import psutil
+from django.conf import settings
+from django.db import close_old_connections
+
+from .chrome_process import OWNER_ENV, PROFILE_PREFIX, kill_group, owner_alive
+
+logger = logging.getLogger(__name__)
+
+CHROME_NAMES = ('chrome', 'chromium')
+PROFILE_MARKERS = ('Local State', 'Default')  # A bare mkdtemp() directory holding a Chrome profile
+
+
+def is_chrome(info):
+    name = (info.get('name') or '').lower()
+    return any(chrome in name for chrome in CHROME_NAMES)
+
+
+def is_chromedriver(info):
+    return 'chromedriver' in (info.get('name') or '').lower()
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+class ReapReport:
+    def __init__(self):
+        self.processes = 0
+        self.memory_bytes = 0
+        self.profiles = 0
+        self.disk_bytes = 0
+
+    def add(self, other):
+        self.processes += other.processes
+        self.memory_bytes += other.memory_bytes
+        self.profiles += other.profiles
+        self.disk_bytes += other.disk_bytes
+
+    def __bool__(self):
+        return bool(self.processes or self.profiles)
+
+    def __str__(self):
+        return (
+            f"{self.processes} Chrome processes ({self.memory_bytes / 2 ** 20:.1f} MB RSS), "
+            f"{self.profiles} profile dirs ({self.disk_bytes / 2 ** 20:.1f} MB)"
+        )
+
+
+class ChromeReaper:
+    def __init__(self, grace=None, temp_dir=None, dry_run=False):
+        self.grace = settings.SCRAPE_REAPER_GRACE_SECONDS if grace is None else grace
+        self.temp_dir = temp_dir or tempfile.gettempdir()
+        self.dry_run = dry_run
+        self.totals = ReapReport()
+
+    def sweep(self):
+        """Kill orphaned Chrome trees and remove orphaned profile directories; a ``ReapReport``"""
+        report = ReapReport()
+        now = time.time()
+        groups, profiles = self.claimed()
+        table = self.process_table()
+        roots = {pid: self.root_of(pid, table) for pid in table}
+
+        orphans, in_use = set(), set(profiles)
+        for root in set(roots.values()):
+            if self.orphaned(root, table[root], groups, now):
+                orphans.add(root)
+        for pid, root in roots.items():
+            if root not in orphans:
+                in_use.add(self.profile_of(table[pid]))
+        in_use.discard(None)
+        # A helper outliving its parent (crashpad) may still serve a live browser on the same profile
+        orphans = {
+            root for root in orphans
+            if is_chromedriver(table[root]) or self.profile_of(table[root]) not in in_use
+        }
+
+        for root in orphans:
+            self.kill_tree(root, [pid for pid, top in roots.items() if top == root], table, report)
+        for path in self.orphan_profiles(in_use, now):
+            size = directory_size(path)
+            if not self.dry_run:
+                shutil.rmtree(path, ignore_errors=True)
+            report.profiles += 1
+            report.disk_bytes += size
+
+        self.totals.add(report)
+        if report:
+            action = 'Would reap' if self.dry_run else 'Reaped'
+            logger.info(f"{action} orphaned {report} (since start: {self.totals})")
+        return report
+
+    def claimed(self):
+        """Process group ids and profile directories of running jobs whose worker on this host is alive"""
+        from .models import ScrapeJob
+        groups, profiles = set(), set()
+        states = ScrapeJob.objects.filter(status='running').values_list('browser_processes', flat=True)
+        for state in states:
+            if not state or state.get('host') != socket.gethostname():
+                continue
+            if not psutil.pid_exists(state.get('worker_pid') or 0):
+                continue  # The worker died; whatever it recorded is up for reaping
+            groups.update(pgid for pgid, _ in state.get('process_groups', []))
+            profiles.update(state.get('profiles', []))
+        return groups, profiles
+
+    def process_table(self):
+        """pid -> name, ppid, create_time and cmdline of every Chrome process, from one scan"""
+        table = {}
+        for proc in psutil.process_iter(['name', 'ppid', 'create_time', 'cmdline', 'status']):
+            info = proc.info
+            if not is_chrome(info) or info['status'] == psutil.STATUS_ZOMBIE:
+                continue
+            info['cmdline'] = info['cmdline'] or []
+            table[proc.pid] = info
+        return table
+
+    def root_of(self, pid, table):
+        """The top Chrome process of the tree ``pid`` belongs to"""
+        while table[pid]['ppid'] in table:
+            pid = table[pid]['ppid']
+        return pid
+
+    def orphaned(self, root, info, groups, now):
+        if now - info['create_time'] < self.grace:
+            return False
+        try:
+            if os.getpgid(root) in groups:
+                return False
+        except OSError:
+            return False
+        owner = self.owner_of(root)
+        if owner is not None:
+            # Pooled or running sessions live as long as the worker that launched them
+            return not owner_alive(owner)
+        if is_chromedriver(info):
+            return False
+        # A browser without its driver; only ours, never one someone started by hand
+        return self.profile_of(info) is not None
+
+    def owner_of(self, pid):
+        """The ``OWNER_ENV`` token a process was started with, or None"""
+        try:
+            return psutil.Process(pid).environ().get(OWNER_ENV)
+        except psutil.Error:
+            return None
+
+    def profile_of(self, info):
+        """The scraper profile directory a Chrome process runs on, or None"""
+        prefix = self.temp_dir + os.sep
+        for arg in info['cmdline']:
+            value = arg.split('=', 1)[-1]
+            if value.startswith(prefix):
+                path = os.path.join(self.temp_dir, value[len(prefix):].split(os.sep)[0])
+                if self.is_profile_dir(path):
+                    return path
+        return None
+
+    def is_profile_dir(self, path):
+        name = os.path.basename(path)
+        if name.startswith(PROFILE_PREFIX):
+            return True
+        return name.startswith('tmp') and any(os.path.exists(os.path.join(path, m)) for m in PROFILE_MARKERS)
+
+    def kill_tree(self, root, members, table, report):
+        """Kill a Chrome tree: its process group when the root leads one, else each of its processes"""
+        memory = 0
+        for pid in members:
+            try:
+                memory += psutil.Process(pid).memory_info().rss
+            except psutil.Error:
+                continue
+        if not self.dry_run:
+            try:
+                leads_group = os.getpgid(root) == root
+            except OSError:
+                return
+            if leads_group:
+                kill_group(root, table[root]['create_time'])
+            else:
+                for pid in members:
+                    try:
+                        psutil.Process(pid).kill()
+                    except psutil.Error:
+                        continue
+        report.processes += len(members)
+        report.memory_bytes += memory
+
+    def orphan_profiles(self, in_use, now):
+        """Scraper profile directories in the temp dir that no live Chrome or running job uses"""
+        try:
+            entries = list(os.scandir(self.temp_dir))
+        except OSError:
+            return []
+        orphans = []
+        for entry in entries:
+            try:
+                if not entry.is_dir(follow_symlinks=False) or entry.path in in_use:
+                    continue
+                if now - entry.stat(follow_symlinks=False).st_mtime < self.grace:
+                    continue
+            except OSError:
+                continue
+            if self.is_profile_dir(entry.path):
+                orphans.append(entry.path)
+        return orphans
+
+
+def run_reaper_loop(interval=None, grace=None):
+    """Sweep every ``SCRAPE_REAPER_INTERVAL`` seconds until the process is stopped"""
+    interval = settings.SCRAPE_REAPER_INTERVAL if interval is None else interval
+    reaper = ChromeReaper(grace=grace)
+    while True:
+        close_old_connections()
+        try:
+            reaper.sweep()
+        except Exception as e:
+            logger.warning(f"Chrome reaper sweep failed: {e}")
+        time.sleep(interval)
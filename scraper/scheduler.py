@@ -0,0 +1,77 @@
+"""
+Fair-share ordering of the scrape queue.
+
+Workers do not take the oldest pending job blindly. ``fair_share_order``
+interleaves the queue per user with weighted fair queuing: every user's next
+job gets a virtual finish tag of (jobs started for that user in the last
+``SCRAPE_FAIR_SHARE_WINDOW`` seconds + 1) / weight, and the lowest tag goes
+first, oldest job first within a user. Users already running
+``SCRAPE_MAX_RUNNING_PER_USER`` jobs are skipped until one finishes. The
+weight comes from ``UserProfile.scrape_weight``; all guests share one bucket
+with weight 1.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import ScrapeJob, UserProfile
+
+# How many pending jobs are considered per scheduling decision
+SCHEDULING_WINDOW = 500
+
+
+def running_jobs_by_user():
+    rows = ScrapeJob.objects.filter(status='running').values('user_id').annotate(n=Count('pk'))
+    return {row['user_id']: row['n'] for row in rows}
+
+
+def fair_share_order():
+    """Pending job pks in the order workers should try to claim them"""
+    pending = list(
+        ScrapeJob.objects.filter(status='pending', coalesced_with__isnull=True)
+        .order_by('created_at').values_list('pk', 'user_id')[:SCHEDULING_WINDOW]
+    )
+    if not pending:
+        return []
+
+    position = {pk: i for i, (pk, _) in enumerate(pending)}
+    queues = {}
+    for pk, user_id in pending:
+        queues.setdefault(user_id, []).append(pk)
+
+    running = running_jobs_by_user()
+    limit = settings.SCRAPE_MAX_RUNNING_PER_USER
+    queues = {user_id: pks for user_id, pks in queues.items() if running.get(user_id, 0) < limit}
+
+    since = timezone.now() - timedelta(seconds=settings.SCRAPE_FAIR_SHARE_WINDOW)
+    served = {
+        row['user_id']: row['n']
+        for row in ScrapeJob.objects.filter(started_at__gte=since, user_id__in=[u for u in queues if u is not None])
+        .values('user_id').annotate(n=Count('pk'))
+    }
+    served[None] = ScrapeJob.objects.filter(started_at__gte=since, user__isnull=True).count()
+    weights = dict(
+        UserProfile.objects.filter(user_id__in=[u for u in queues if u is not None])
+        .values_list('user_id', 'scrape_weight')
+    )
+
+    order = []
+    while queues:
+        # Lowest virtual finish tag wins; ties go to the user with the oldest waiting job
+        user_id = min(
+            queues,
+            key=lambda u: ((served.get(u, 0) + 1) / max(weights.get(u, 1), 1), position[queues[u][0]]),
+        )
+        order.append(queues[user_id].pop(0))
+        served[user_id] = served.get(user_id, 0) + 1
+        if not queues[user_id]:
+            del queues[user_id]
+    return order
+
+
+def over_quota(job):
+    """True when claiming ``job`` put its user above SCRAPE_MAX_RUNNING_PER_USER"""
+    running = ScrapeJob.objects.filter(status='running', user_id=job.user_id).count()
+    return running > settings.SCRAPE_MAX_RUNNING_PER_USER
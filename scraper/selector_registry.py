@@ -0,0 +1,168 @@
+"""
+The one list of CSS selectors used to read a Google Maps place page.
+
+Each field maps to an ordered list of selectors, tried until one matches:
+the specific selectors of ``FIELD_SELECTORS``, then the generic fallbacks
+of ``FALLBACK_SELECTORS`` (a bare ``h1``, any ``[data-item-id='address']``).
+Every scraper reads its fields through this registry, through
+``place_extract.build_profile``. Category profiles only switch fallbacks
+such as the phone scan on or off.
+
+Each lookup reports per selector whether it hit and how long it took.
+``SelectorRegistry`` keeps those counts per ``REGISTRY_VERSION`` in
+``SelectorStat`` rows shared by all workers, and orders each field's
+selectors by smoothed hit rate (then latency), so the selector that usually
+hits is tried first. Only the specific selectors are ranked. A fallback
+matches almost every page, including wrong elements on pages where the
+precise selector missed, so its high hit rate says nothing about its
+accuracy. Fallbacks always come last, in their listed order. Bump
+``REGISTRY_VERSION`` when the lists change so old counts do not reorder the
+new ones.
+"""
+import logging
+import threading
+import time
+
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_VERSION = 2
+
+FIELD_SELECTORS = {
+    'name': ["h1.DUwDvf"],
+    'address': ["button[data-item-id='address']", ".rogA2c"],
+    'phone': ["[data-item-id*='phone']"],
+    'website': ["a[data-item-id='authority']"],
+    'rating': ["div.F7nice span[aria-hidden='true']"],
+    'reviews': ["div.F7nice span:last-child"],
+    'category': ["button.DkEaL", "button[jsaction*='pane.category'] .DkEaL", ".YhemCb"],
+    'hours': [
+        "div.t39EBf[aria-label]", "button[data-item-id='oh'] .Io6YTe",
+        "button[aria-label*='Hours'] .fontBodyMedium", ".t39EBf .G8aQO", "table.eK4R0e",
+    ],
+}
+
+# Generic selectors tried after every specific one, never ranked
+FALLBACK_SELECTORS = {
+    'name': ["div[role='main'] h1", "h1"],
+    'address': ["[data-item-id='address']"],
+    'website': ["[data-item-id='authority']"],
+    'rating': ["div.F7nice span[aria-hidden]"],
+    'category': [".DkEaL"],
+    'hours': ["[data-item-id='oh']"],
+}
+
+# Tries before a selector's own hit rate is trusted over its place in the list
+MIN_SAMPLES = 20
+# Seconds between reloads of the shared counts
+REFRESH_SECONDS = 60
+
+
+class SelectorRegistry:
+    def __init__(self, selectors=None, fallbacks=None, version=REGISTRY_VERSION, persist=True):
+        self.selectors = selectors or FIELD_SELECTORS
+        self.fallbacks = FALLBACK_SELECTORS if fallbacks is None else fallbacks
+        self.version = version
+        self.persist = persist
+        self._shared = {}  # (field, selector) -> [hits, misses, total_ms] as last loaded
+        self._pending = {}  # The same, recorded here and not yet written
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def ordered(self, field):
+        """The field's specific selectors, most reliable first, then its fallbacks"""
+        self._refresh()
+        with self._lock:
+            scored = []
+            for index, selector in enumerate(self.selectors[field]):
+                hits, misses, total_ms = self._totals(field, selector)
+                tries = hits + misses
+                if tries < MIN_SAMPLES:
+                    scored.append((-0.5, 0.0, index, selector))
+                else:
+                    scored.append((-(hits + 1) / (tries + 2), total_ms / tries, index, selector))
+        return [selector for *_, selector in sorted(scored)] + self.fallbacks.get(field, [])
+
+    def profile(self):
+        """Every field's ordered selectors, as an extraction profile"""
+        return {field: self.ordered(field) for field in self.selectors}
+
+    def record(self, attempts):
+        """Count one page's ``{field: [[selector, hit, milliseconds], ...]}`` lookups"""
+        with self._lock:
+            for field, tried in (attempts or {}).items():
+                for selector, hit, ms in tried:
+                    counts = self._pending.setdefault((field, selector), [0, 0, 0.0])
+                    counts[0 if hit else 1] += 1
+                    counts[2] += ms
+
+    def stats(self):
+        """``{field: {selector: {'hits', 'misses', 'avg_ms'}}}`` in registry order"""
+        self._refresh()
+        with self._lock:
+            report = {}
+            for field, selectors in self.selectors.items():
+                for selector in selectors + self.fallbacks.get(field, []):
+                    hits, misses, total_ms = self._totals(field, selector)
+                    report.setdefault(field, {})[selector] = {
+                        'hits': hits, 'misses': misses,
+                        'avg_ms': round(total_ms / (hits + misses), 3) if hits + misses else None,
+                    }
+            return report
+
+    def flush(self):
+        """Add the counts recorded here to the shared ``SelectorStat`` rows"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not self.persist or not pending:
+            self._merge_back(pending)
+            return
+        from .models import SelectorStat
+        try:
+            for (field, selector), (hits, misses, total_ms) in pending.items():
+                SelectorStat.objects.get_or_create(version=self.version, field=field, selector=selector)
+                SelectorStat.objects.filter(version=self.version, field=field, selector=selector).update(
+                    hits=F('hits') + hits, misses=F('misses') + misses, total_ms=F('total_ms') + total_ms, updated_at=timezone.now(),
+                )
+        except Exception as e:
+            logger.warning(f"Could not store selector statistics: {e}")
+            self._merge_back(pending)
+            return
+        self._loaded_at = None  # Pick up everyone's counts on the next lookup
+
+    def _totals(self, field, selector):
+        shared = self._shared.get((field, selector), (0, 0, 0.0))
+        pending = self._pending.get((field, selector), (0, 0, 0.0))
+        return shared[0] + pending[0], shared[1] + pending[1], shared[2] + pending[2]
+
+    def _merge_back(self, counts):
+        with self._lock:
+            target = self._pending if self.persist else self._shared
+            for key, (hits, misses, total_ms) in counts.items():
+                totals = target.setdefault(key, [0, 0, 0.0])
+                totals[0] += hits
+                totals[1] += misses
+                totals[2] += total_ms
+
+    def _refresh(self):
+        if not self.persist or (self._loaded_at and time.monotonic() - self._loaded_at < REFRESH_SECONDS):
+            return
+        self._loaded_at = time.monotonic()
+        from .models import SelectorStat
+        try:
+            rows = SelectorStat.objects.filter(version=self.version).values_list(
+                'field', 'selector', 'hits', 'misses', 'total_ms'
+            )
+            shared = {(field, selector): [hits, misses, total_ms] for field, selector, hits, misses, total_ms in rows}
+        except Exception as e:
+            # No database (offline parsing, tests): keep the registry order
+            logger.debug(f"Selector statistics unavailable: {e}")
+            return
+        with self._lock:
+            self._shared = shared
+
+
+# Shared by every scraper in the process
+selector_registry = SelectorRegistry()
@@ -1,3 +1,731 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import psutil
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .chrome_process import (
+    OWNER_ENV, PROFILE_PREFIX, become_subreaper, owner_token, process_group, process_groups_supported, reap_children,
+    terminate_browser, track_group,
+)
+from .detail_pool import DetailPool
+from .feed import PLACE_LINK_SELECTORS
+from .gym_scraper import GymScraper
+from .html_extract import compile_selector, parse_feed_html, parse_html, parse_place_html
+from .cancellation import CancelSignal, cancel_signal, release_cancel_signal, request_cancel
+from .checkpoint import JobCheckpoint
+from .jobs import (
+    build_query_key, checkpoint_records, claim_next_job, csv_filename_for, execute_job, promote_follower,
+    requeue_stale_jobs, submit_scrape_job,
+)
+from .maps_payload import ResponseCapture, load_payload, preview_record, records_from_response, search_records
+from .models import QueryResult, ScrapeJob, UserProfile
+from .navigation import MapsNavigator
+from .place_cache import cached_place, remember_place
+from .place_extract import BUSINESS_PROFILE, CATEGORY_PROFILES, GYM_PROFILE
+from .reaper import ChromeReaper
+from .salon_scraper import EnhancedGoogleMapsScraper
+from .scheduler import fair_share_order, over_quota
+from .selector_registry import FALLBACK_SELECTORS, FIELD_SELECTORS, SelectorRegistry
+from .waits import PageWaits
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+
+
+def read_fixture(*parts):
+    return FIXTURES.joinpath(*parts).read_text(encoding='utf-8')
+
+
+def page_corpus(kind):
+    """Entries of the synthetic page corpus (scraper/fixtures/synthetic_pages/index.json) of one kind"""
+    return [entry for entry in json.loads(read_fixture('synthetic_pages', 'index.json')) if entry['kind'] == kind]
+
+
+def wait_for(condition, timeout=5):
+    """Poll ``condition`` until it holds or ``timeout`` seconds pass; its last value"""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def submit(job_id, max_results=10, location='Chennai', **kwargs):
+    """A guest gym scrape request, as the home view submits it"""
+    return submit_scrape_job(AnonymousUser(), 'fitness', 'yoga', location, max_results, job_id=job_id, **kwargs)
+
+
+class MapsPayloadTests(SimpleTestCase):
+    """Decoding of Maps payloads hand-built to the documented array layout (no browser or network needed)"""
+
+    def test_search_payload_records(self):
+        records = search_records(load_payload(read_fixture('synthetic_payloads', 'search_tbm_map.txt')))
+        self.assertEqual([r['name'] for r in records], ["Gold's Gym Anna Nagar", 'Cult Fitness T Nagar'])
+        gym = records[0]
+        self.assertEqual(gym['place_id'], '0x3a5267e9b1a2b3c5:0x1f2e3d4c5b6a7981')
+        self.assertEqual(gym['address'], '2nd Ave, Anna Nagar, Chennai, Tamil Nadu 600040')
+        self.assertEqual(gym['phone'], '098400 12345')
+        self.assertEqual(gym['website'], 'https://www.goldsgym.in/')
+        self.assertEqual((gym['rating'], gym['reviews_count']), ('4.4', '1287'))
+        self.assertEqual(gym['category'], 'Gym')
+        self.assertEqual(gym['hours'], 'Monday: 6 am–10 pm; Sunday: Closed')
+        self.assertEqual((gym['latitude'], gym['longitude']), ('13.085', '80.2101'))
+        self.assertTrue(gym['directions_url'].startswith('https://www.google.com/maps/dir/?api=1&destination='))
+
+    def test_search_payload_missing_fields(self):
+        records = search_records(load_payload(read_fixture('synthetic_payloads', 'search_tbm_map.txt')))
+        studio = records[1]
+        # No full address: the address parts are joined instead
+        self.assertEqual(studio['address'], 'Usman Rd, T. Nagar, Chennai')
+        self.assertEqual((studio['phone'], studio['website'], studio['hours']), ('', '', ''))
+
+    def test_preview_payload_record(self):
+        record = preview_record(load_payload(read_fixture('synthetic_payloads', 'preview_place.txt')))
+        self.assertEqual(record['name'], 'Green Trends Unisex Salon')
+        self.assertEqual(record['phone'], '+91 44 2491 2345')
+        self.assertEqual(record['category'], 'Beauty salon')
+
+    def test_unexpected_shapes_decode_to_nothing(self):
+        url = 'https://www.google.com/maps/preview/place?authuser=0&pb=x'
+        self.assertEqual(records_from_response(url, read_fixture('synthetic_payloads', 'preview_place_unexpected.txt')), [])
+        self.assertEqual(records_from_response(url, 'not json'), [])
+        self.assertEqual(records_from_response('https://www.google.com/maps/vt?pb=x', '[]'), [])
+
+    def test_capture_reads_responses_from_the_performance_log(self):
+        body = read_fixture('synthetic_payloads', 'search_tbm_map.txt')
+
+        class FakeDriver:
+            def get_log(self, kind):
+                message = {'message': {'method': 'Network.responseReceived', 'params': {
+                    'requestId': '7.1', 'response': {'url': 'https://www.google.com/search?tbm=map&q=gyms'},
+                }}}
+                return [{'message': json.dumps(message)}]
+
+            def execute_cdp_cmd(self, command, params):
+                return {'body': body, 'base64Encoded': False}
+
+        with tempfile.TemporaryDirectory() as save_dir:
+            capture = ResponseCapture(save_dir=save_dir)
+            self.assertEqual(capture.drain(FakeDriver()), 2)
+            # The raw response is kept for turning into a real fixture
+            saved = os.listdir(save_dir)
+            self.assertEqual(len(saved), 1)
+            self.assertTrue(saved[0].startswith('search_'))
+            self.assertEqual(Path(save_dir, saved[0]).read_text(encoding='utf-8').split('\n', 1)[1], body)
+        url = "https://www.google.com/maps/place/Gold's+Gym/data=!4m7!3m6!1s0x3a5267e9b1a2b3c5:0x1f2e3d4c5b6a7981!8m2"
+        self.assertEqual(capture.record_for(url)['name'], "Gold's Gym Anna Nagar")
+        self.assertIsNone(capture.record_for('https://www.google.com/maps/place/Other/data=!1s0x1:0x2'))
+
+    def test_network_and_html_backends_agree(self):
+        entry = next(entry for entry in page_corpus('place') if entry['category'] == 'fitness')
+        page = parse_place_html(read_fixture('synthetic_pages', entry['file']), entry['url'], GYM_PROFILE)
+        network = search_records(load_payload(read_fixture('synthetic_payloads', 'search_tbm_map.txt')))[0]
+        for field in ('name', 'phone', 'website', 'rating'):
+            self.assertEqual(network[field], page[field], field)
+
+
+
+class PageWaitsTests(SimpleTestCase):
+    """Saved time is counted against the sleep a wait replaced (no browser needed)"""
+
+    def test_saved_seconds(self):
+        waits = PageWaits()
+        waits.until(None, lambda driver: True, 5, replaces=2)
+        self.assertAlmostEqual(waits.saved_seconds, 2, delta=0.1)
+        # A wait that replaced no sleep saves nothing, however long its ceiling
+        waits.until(None, lambda driver: True, 30)
+        self.assertAlmostEqual(waits.saved_seconds, 2, delta=0.1)
+        # Waiting past the replaced sleep is not negative saving
+        self.assertFalse(waits.until(None, lambda driver: False, 0.3, replaces=0.1))
+        self.assertAlmostEqual(waits.saved_seconds, 2, delta=0.1)
+
+
+class HtmlParserTests(SimpleTestCase):
+    """The offline HTML backend against the synthetic page corpus (hand-written, modelled on Maps markup)"""
+
+    def test_place_pages(self):
+        for entry in page_corpus('place'):
+            with self.subTest(page=entry['file']):
+                fields = parse_place_html(
+                    read_fixture('synthetic_pages', entry['file']), entry['url'], CATEGORY_PROFILES.get(entry['category'])
+                )
+                for field, value in entry['expected'].items():
+                    self.assertEqual(fields[field], value, field)
+
+    def test_corpus_covers_every_category(self):
+        from .forms import ScraperForm
+        covered = {entry['category'] for entry in page_corpus('place')}
+        self.assertEqual(covered, {value for value, _ in ScraperForm.MAIN_CATEGORIES})
+
+    def test_feed_pages(self):
+        for entry in page_corpus('feed'):
+            with self.subTest(page=entry['file']):
+                records = parse_feed_html(read_fixture('synthetic_pages', entry['file']))
+                # The repeated card for the same place is dropped
+                self.assertEqual(len(records), len(entry['expected']))
+                for record, expected in zip(records, entry['expected']):
+                    for field, value in expected.items():
+                        self.assertEqual(record[field], value, field)
+
+    def test_selectors(self):
+        doc = parse_html(
+            '<div class="a b" data-id="x:1"><p>one</p><span><p id="two">two</p></span><br><p>three</p></div>'
+        )
+        self.assertEqual([n.text() for n in doc.select('div p')], ['one', 'two', 'three'])
+        self.assertEqual([n.text() for n in doc.select('div > p')], ['one', 'three'])
+        self.assertEqual(doc.select_one("div.a.b[data-id^='x'] #two").text(), 'two')
+        self.assertEqual(doc.select_one('div p:last-child').text(), 'two')
+        self.assertEqual(len(doc.select('p, span')), 4)
+        self.assertIsNone(doc.select_one("div[data-id='x']"))
+
+    def test_every_extraction_selector_is_supported(self):
+        registry = [s for lists in (FIELD_SELECTORS, FALLBACK_SELECTORS) for selectors in lists.values() for s in selectors]
+        for selector in PLACE_LINK_SELECTORS + registry:
+            with self.subTest(selector=selector):
+                self.assertTrue(compile_selector(selector))
+
+
+class SelectorRegistryTests(SimpleTestCase):
+    """Selector ordering from hit counts, without the shared database rows"""
+
+    def registry(self):
+        return SelectorRegistry({'name': ['h1.a', 'h1.b']}, {'name': ['h1']}, persist=False)
+
+    def test_registry_order_until_enough_samples(self):
+        registry = self.registry()
+        registry.record({'name': [['h1.a', False, 1.0], ['h1.b', True, 1.0]]})
+        self.assertEqual(registry.ordered('name'), ['h1.a', 'h1.b', 'h1'])
+
+    def test_reliable_selector_moves_first(self):
+        registry = self.registry()
+        for _ in range(30):
+            registry.record({'name': [['h1.a', False, 2.0], ['h1.b', True, 1.0]]})
+        registry.flush()
+        self.assertEqual(registry.ordered('name'), ['h1.b', 'h1.a', 'h1'])
+        self.assertEqual(registry.stats()['name']['h1.a'], {'hits': 0, 'misses': 30, 'avg_ms': 2.0})
+
+    def test_fallbacks_stay_last(self):
+        registry = self.registry()
+        # The generic selector hits on every page the specific ones missed
+        for _ in range(30):
+            registry.record({'name': [['h1.a', False, 1.0], ['h1.b', False, 1.0], ['h1', True, 1.0]]})
+        registry.record({'name': [['h1.a', True, 1.0]]})
+        registry.flush()
+        self.assertEqual(registry.ordered('name'), ['h1.a', 'h1.b', 'h1'])
+        self.assertEqual(registry.stats()['name']['h1']['hits'], 30)
+
+    def test_place_parse_reports_attempts(self):
+        entry = page_corpus('place')[0]
+        fields = parse_place_html(read_fixture('synthetic_pages', entry['file']), entry['url'])
+        tried = fields['attempts']['name']
+        self.assertEqual(tried[-1][:2], [fields['trace']['name'][0], True])
+        self.assertTrue(all(not hit for _, hit, _ in tried[:-1]))
+
+
+@unittest.skipUnless(process_groups_supported(), 'needs POSIX process groups')
+class ChromeProcessTests(SimpleTestCase):
+    """Group teardown of a stand-in process tree (no Chrome needed)"""
+
+    def test_terminate_kills_the_whole_group(self):
+        # As in a worker: orphaned grandchildren come back to us to be reaped
+        adopting = become_subreaper()
+        # A leader with a child and a grandchild, like chromedriver -> chrome -> renderer
+        leader = subprocess.Popen(
+            ['sh', '-c', '(sleep 60 & sleep 60) & sleep 60'], start_new_session=True
+        )
+        driver = SimpleNamespace(service=SimpleNamespace(process=leader))
+        profile_dir = tempfile.mkdtemp()
+        self.assertEqual(process_group(driver)[0], leader.pid)
+
+        terminate_browser(driver, profile_dir)
+
+        self.assertIsNotNone(leader.poll())
+        self.assertFalse(os.path.exists(profile_dir))
+        if adopting:
+            # Nothing of the group is left, not even zombies
+            with self.assertRaises(ProcessLookupError):
+                os.killpg(leader.pid, 0)
+
+    def test_reap_children_leaves_other_children_alone(self):
+        leader = subprocess.Popen(['sh', '-c', 'exit 0'], start_new_session=True)
+        track_group(SimpleNamespace(service=SimpleNamespace(process=leader)))
+        other = subprocess.Popen(['sh', '-c', 'exit 3'])
+        for child in (leader, other):
+            wait_for(lambda: psutil.Process(child.pid).status() == psutil.STATUS_ZOMBIE)
+
+        self.assertEqual(reap_children(), 1)
+        self.assertEqual(other.wait(), 3)
+
+    def test_sessions_are_orphaned_with_their_owner(self):
+        reaper = ChromeReaper(grace=0, temp_dir=tempfile.mkdtemp())
+        exited = subprocess.Popen(['true'])
+        dead_owner = owner_token(exited.pid)
+        exited.wait()
+        for owner, orphaned in ((owner_token(), False), (dead_owner, True)):
+            with self.subTest(orphaned=orphaned):
+                session = subprocess.Popen(['sleep', '60'], env={**os.environ, OWNER_ENV: owner})
+                self.addCleanup(session.wait)
+                self.addCleanup(session.kill)
+                info = {'name': 'chromedriver', 'create_time': 0, 'cmdline': []}
+                self.assertIs(reaper.orphaned(session.pid, info, set(), time.time()), orphaned)
+                self.assertFalse(reaper.orphaned(session.pid, info, {os.getpgid(session.pid)}, time.time()))
+
+
+class ChromeReaperTests(SimpleTestCase):
+    """Which leftover profile directories the reaper removes (no processes or database needed)"""
+
+    def test_orphan_profiles(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            def make(name, *files):
+                path = os.path.join(temp_dir, name)
+                os.mkdir(path)
+                for file in files:
+                    Path(path, file).touch()
+                return path
+
+            unused = make(PROFILE_PREFIX + 'a')
+            in_use = make(PROFILE_PREFIX + 'b')
+            legacy = make('tmpchrome', 'Local State')
+            make('tmpother')  # Some other program's temp dir
+            reaper = ChromeReaper(grace=0, temp_dir=temp_dir)
+
+            self.assertEqual(sorted(reaper.orphan_profiles({in_use}, time.time())), [unused, legacy])
+            self.assertEqual(reaper.profile_of({'cmdline': [f"--user-data-dir={in_use}", '--type=renderer']}), in_use)
+            self.assertIsNone(reaper.profile_of({'cmdline': ['--user-data-dir=/home/me/.config/chrome']}))
+            self.assertEqual(ChromeReaper(grace=3600, temp_dir=temp_dir).orphan_profiles(set(), time.time()), [])
+
+
+class CoalescingTests(TestCase):
+    """Identical requests share one scrape (database, no browser)"""
+
+    def test_identical_request_follows_the_in_flight_job(self):
+        leader = submit('a', max_results=20)
+        self.assertIsNone(leader.coalesced_with)
+        self.assertEqual(submit('b', max_results=20, location='chennai ').coalesced_with, leader)
+        self.assertEqual(submit('c', max_results=5).coalesced_with, leader)
+        # More results than the leader scrapes, or a job being cancelled, get a scrape of their own
+        self.assertIsNone(submit('d', max_results=50).coalesced_with)
+        request_cancel('d')
+        self.assertIsNone(submit('e', max_results=50).coalesced_with)
+
+    def test_only_one_leader_per_query(self):
+        leader = submit('a')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ScrapeJob.objects.create(job_id='b', location='Chennai', main_category='fitness',
+                                     max_results=leader.max_results, query_key=leader.query_key)
+        # A request that missed the leader in its lookup still ends up following it
+        with mock.patch('scraper.jobs.in_flight_leader', side_effect=[None, leader]):
+            self.assertEqual(submit('c').coalesced_with, leader)
+
+    def test_cancelled_leader_hands_its_followers_over(self):
+        leader = submit('a', max_results=100)
+        ScrapeJob.objects.filter(pk=leader.pk).update(checkpoint={'urls': ['u1'], 'records': {}})
+        small, large, also_large = submit('b', max_results=10), submit('c', max_results=50), submit('d', max_results=50)
+        request_cancel('a')
+        # The largest request takes over, so no follower gets fewer records than it asked for
+        self.assertEqual(promote_follower(leader), large)
+        for job in (small, large, also_large):
+            job.refresh_from_db()
+        self.assertIsNone(large.coalesced_with)
+        self.assertEqual(large.checkpoint, {'urls': ['u1'], 'records': {}})
+        self.assertEqual((small.coalesced_with, also_large.coalesced_with), (large, large))
+
+    def test_promotion_follows_an_existing_leader_of_the_query(self):
+        leader = submit('a', max_results=100)
+        follower = submit('b', max_results=10)
+        # An independent leader for 10 results, e.g. from a request racing the first one
+        other = ScrapeJob.objects.create(job_id='c', location='Chennai', main_category='fitness',
+                                         max_results=10, query_key=leader.query_key)
+        request_cancel('a')
+        self.assertEqual(promote_follower(leader), other)
+        follower.refresh_from_db()
+        self.assertEqual(follower.coalesced_with, other)
+
+    def test_followers_receive_the_leader_outcome(self):
+        leader = submit('a', max_results=3)
+        follower = submit('b', max_results=2)
+        ScrapeJob.objects.filter(pk=leader.pk).update(status='running')
+        records = [{'name': f"Gym {i}"} for i in range(3)]
+        with mock.patch('scraper.jobs.perform_scraping_with_cancellation', return_value=records), \
+                mock.patch('scraper.jobs.write_results_csv', return_value=['/media/yoga.csv']):
+            execute_job(ScrapeJob.objects.get(pk=leader.pk))
+        follower.refresh_from_db()
+        self.assertEqual(follower.status, 'completed')
+        self.assertEqual(follower.results, records[:2])
+        self.assertEqual(follower.csv_file.name, 'yoga.csv')
+
+
+class StoredResultTests(TestCase):
+    """Repeat requests answered from ``QueryResult`` (database, no browser)"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media.name, SCRAPE_RESULT_CACHE_TTL=3600)
+        media.enable()
+        self.addCleanup(media.disable)
+        # The CSV writer without the browser session a scraper instance would start
+        writer = SimpleNamespace(save_simplified_csv=lambda results, path: Path(path).write_text(json.dumps(results)))
+        patcher = mock.patch('scraper.jobs.get_scraper_by_category', return_value=writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def store(self, count, age=0):
+        return QueryResult.objects.create(
+            query_key=build_query_key('fitness', 'yoga', 'Chennai'),
+            main_category='fitness',
+            results=[{'name': f"Studio {i}"} for i in range(count)],
+            frontier={'urls': [f"u{i}" for i in range(count)], 'records': {f"u{i}": {'name': f"Studio {i}"} for i in range(count)}},
+            refreshed_at=timezone.now() - timedelta(seconds=age),
+        )
+
+    def test_hit_completes_without_a_worker(self):
+        self.store(5)
+        first, second = submit('a', max_results=3), submit('b', max_results=4)
+        self.assertEqual(first.status, 'completed')
+        self.assertEqual([r['name'] for r in first.results], ['Studio 0', 'Studio 1', 'Studio 2'])
+        # Each job downloads its own file
+        self.assertNotEqual(first.csv_file.name, second.csv_file.name)
+        self.assertEqual(len(json.loads(Path(csv_filename_for(first)).read_text())), 3)
+        self.assertEqual(len(json.loads(Path(csv_filename_for(second)).read_text())), 4)
+
+    def test_stale_or_disabled_store_is_not_used(self):
+        self.store(5, age=7200)
+        self.assertEqual(submit('a', max_results=3).status, 'pending')
+        ScrapeJob.objects.update(status='completed')
+        QueryResult.objects.update(refreshed_at=timezone.now())
+        with self.settings(SCRAPE_RESULT_CACHE_TTL=0):
+            self.assertEqual(submit('b', max_results=3).status, 'pending')
+
+    def test_shortfall_tops_up_from_the_stored_frontier(self):
+        self.store(2)
+        job = submit('a', max_results=5)
+        self.assertEqual(job.status, 'pending')
+        self.assertEqual(job.checkpoint['completed_terms'], [])
+        self.assertEqual(job.checkpoint['urls'], ['u0', 'u1'])
+        self.assertEqual(set(job.checkpoint['records']), {'u0', 'u1'})
+
+
+@override_settings(SCRAPE_MAX_RUNNING_PER_USER=1, SCRAPE_FAIR_SHARE_WINDOW=3600)
+class SchedulerTests(TestCase):
+    """Fair-share queue order and the per-user running quota (database, no browser)"""
+
+    def setUp(self):
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+
+    def queue(self, user, name, **fields):
+        return ScrapeJob.objects.create(
+            job_id=name, user=user, location=name, main_category='fitness', query_key=name, **fields
+        )
+
+    def test_users_are_interleaved(self):
+        a1, a2, a3 = self.queue(self.alice, 'a1'), self.queue(self.alice, 'a2'), self.queue(self.alice, 'a3')
+        b1 = self.queue(self.bob, 'b1')
+        self.assertEqual(fair_share_order(), [a1.pk, b1.pk, a2.pk, a3.pk])
+        # Jobs started recently count against their user
+        self.queue(self.alice, 'a0', status='completed', started_at=timezone.now())
+        self.assertEqual(fair_share_order()[:2], [b1.pk, a1.pk])
+
+    def test_weight_and_quota(self):
+        a1, a2 = self.queue(self.alice, 'a1'), self.queue(self.alice, 'a2')
+        b1, b2 = self.queue(self.bob, 'b1'), self.queue(self.bob, 'b2')
+        UserProfile.objects.create(user=self.bob, scrape_weight=3)
+        self.assertEqual(fair_share_order(), [b1.pk, b2.pk, a1.pk, a2.pk])
+        # A user running as many jobs as allowed waits
+        self.queue(self.bob, 'b0', status='running')
+        self.assertEqual(fair_share_order(), [a1.pk, a2.pk])
+        self.assertFalse(over_quota(b1))
+        self.queue(self.bob, 'b00', status='running')
+        self.assertTrue(over_quota(b1))
+
+    def test_claim_past_the_quota_is_handed_back(self):
+        job = self.queue(self.alice, 'a1')
+        self.queue(self.alice, 'a0', status='running')
+        # A second worker's claim lands between this worker's ordering and its claim
+        with mock.patch('scraper.jobs.fair_share_order', return_value=[job.pk]):
+            self.assertIsNone(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.started_at), ('pending', 0, None))
+        self.assertEqual(fair_share_order(), [])
+        ScrapeJob.objects.filter(job_id='a0').update(status='completed')
+        claimed = claim_next_job()
+        self.assertEqual((claimed.pk, claimed.attempts), (job.pk, 1))
+        self.assertIsNotNone(claimed.queue_wait_seconds)
+
+
+class FakeTabs:
+    """A driver whose tabs only record what was loaded in them, starting on a Maps results feed"""
+
+    def __init__(self, feed_links):
+        self.feed_links = feed_links
+        self.handles = ['feed']
+        self.current_window_handle = 'feed'
+        self.loads = []  # (tab, url)
+        self.switch_to = SimpleNamespace(window=self._switch, new_window=self._new_window)
+
+    def _switch(self, handle):
+        assert handle in self.handles
+        self.current_window_handle = handle
+
+    def _new_window(self, kind):
+        self.handles.append(f"tab{len(self.handles)}")
+        self.current_window_handle = self.handles[-1]
+
+    def get(self, url):
+        self.loads.append((self.current_window_handle, url))
+
+    def execute_script(self, script, *args):
+        if 'location.href' in script:
+            self.loads.append((self.current_window_handle, args[0]))
+        elif "[role='feed']" in script:
+            return self.feed_links
+        return None
+
+    def close(self):
+        self.handles.remove(self.current_window_handle)
+
+
+@override_settings(SCRAPE_PIPELINE_TABS=True)
+class DetailPipelineTests(TestCase):
+    """Which places the two-tab pipeline prefetches, and in which tab (no browser)"""
+
+    def place(self, name):
+        return f"https://www.google.com/maps/place/{name}/data=!4m2!3m1!1s0x3a52:0x{name}"
+
+    def test_in_app_navigation_keeps_the_feed_and_prefetches_the_rest(self):
+        earlier, in_feed, also_earlier = self.place('e1'), self.place('f1'), self.place('e2')
+        driver = FakeTabs(feed_links=[in_feed])
+        waits = SimpleNamespace(until=lambda *args, **kwargs: True)
+        navigator = MapsNavigator(waits, enabled=True)
+        navigator._showing_feed(driver)
+        pool = DetailPool(SimpleNamespace(navigator=navigator, waits=waits))
+        clicked = []
+
+        with mock.patch.object(navigator, 'open_place',
+                               side_effect=lambda page, url, ceiling: clicked.append((page.current_window_handle, url))):
+            pool.start(driver, [earlier, in_feed, also_earlier],
+                       lambda page, url: {'name': url, 'tab': page.current_window_handle})
+            tabs = [pool.fetch(url)['tab'] for url in (earlier, in_feed, also_earlier)]
+            pool.close()
+
+        self.assertEqual(tabs, ['tab1', 'feed', 'tab2'])
+        self.assertEqual(clicked, [('feed', in_feed)])
+        # Each earlier term's place was loading while the one before it was extracted
+        self.assertEqual(driver.loads, [('tab1', earlier), ('tab2', also_earlier)])
+        self.assertEqual((driver.handles, driver.current_window_handle), (['feed'], 'feed'))
+
+
+class JobAccessTests(TestCase):
+    """Who may read a job's status and progress (database, test client)"""
+
+    def setUp(self):
+        self.job = submit('scrape_guest_1700000000')
+
+    def test_guest_jobs_are_only_visible_to_their_session(self):
+        for name in ('job_status', 'job_progress_stream'):
+            url = reverse(name, args=[self.job.job_id])
+            with self.subTest(name):
+                self.assertEqual(self.client.get(url).status_code, 404)
+        session = self.client.session
+        session['guest_jobs'] = [self.job.job_id]
+        session.save()
+        response = self.client.get(reverse('job_status', args=[self.job.job_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['is_processing'])
+
+    def test_staff_may_follow_any_job(self):
+        self.client.force_login(
+            User.objects.create_user('ops', is_staff=True), backend='django.contrib.auth.backends.ModelBackend'
+        )
+        self.assertEqual(self.client.get(reverse('job_status', args=[self.job.job_id])).status_code, 200)
+
+
+class PlaceCacheTests(TestCase):
+    """What the cross-job place cache stores and hands back"""
+
+    url = 'https://www.google.com/maps/place/Yoga+Studio/data=!4m2!3m1!1s0x3a5267:0x1b2c3d'
+
+    def test_decoded_payloads_are_not_shared(self):
+        pool = DetailPool(SimpleNamespace())
+        pool.capture = SimpleNamespace(record_for=lambda url: {'name': 'Yoga Studio'})
+        self.assertEqual(pool._fetch_page(None, self.url), {'name': 'Yoga Studio'})
+        self.assertIsNone(cached_place(self.url))
+
+    def test_each_category_post_processes_the_cached_fields(self):
+        fields = {
+            'name': 'Glow Studio', 'address': '1 Anna Salai, Chennai',
+            'website': 'https://book.example/glow', 'website_label': 'Book online',
+        }
+        gym = GymScraper(headless=True)
+        gym.details.start(None, [], gym.extract_complete_gym_data, profile=GYM_PROFILE)
+        with mock.patch('scraper.detail_pool.read_place_fields', return_value=dict(fields)):
+            gym.details._run_extract(None, self.url)
+        self.assertEqual(cached_place(self.url, GYM_PROFILE), fields)
+
+        salon = EnhancedGoogleMapsScraper(headless=True)
+        salon.details.start(None, [], lambda page, url: salon.extract_complete_salon_data(page))
+        with mock.patch('scraper.detail_pool.read_place_fields') as read:
+            record = salon.details._fetch_page(None, self.url)
+        read.assert_not_called()
+        self.assertEqual((record['website'], record['category']), ('', 'Salon'))
+        self.assertTrue(record['directions_url'].endswith('1%20Anna%20Salai%2C%20Chennai'))
+
+    def test_reads_without_a_scan_do_not_serve_profiles_that_need_it(self):
+        remember_place(self.url, {'name': 'Glow Studio'})
+        self.assertEqual(cached_place(self.url), {'name': 'Glow Studio'})
+        self.assertIsNone(cached_place(self.url, BUSINESS_PROFILE))
+        remember_place(self.url, {'name': 'Glow Studio', 'email': 'hi@glow.example'}, BUSINESS_PROFILE)
+        self.assertEqual(cached_place(self.url)['email'], 'hi@glow.example')
+
+    def test_a_page_read_is_cached_for_the_next_job(self):
+        pool = DetailPool(SimpleNamespace(navigator=SimpleNamespace(enabled=True, open_place=lambda *args: True)))
+        pool.start(None, [], lambda page, url: pool.read_fields(page))
+        with mock.patch('scraper.detail_pool.read_place_fields', return_value={'name': 'Glow Studio'}):
+            self.assertEqual(pool._fetch_page(None, self.url), {'name': 'Glow Studio'})
+        self.assertEqual(cached_place(self.url), {'name': 'Glow Studio'})
+
+
+class CheckpointTests(TestCase):
+    """Resumable job state in ``ScrapeJob.checkpoint`` (database, no browser)"""
+
+    def setUp(self):
+        self.job = submit('a', max_results=3)
+
+    def test_progress_is_saved_as_it_happens(self):
+        checkpoint = JobCheckpoint('a')
+        self.assertFalse(checkpoint.resumed)
+        checkpoint.term_done('yoga studio', ['u1', 'u2'])
+        checkpoint.term_done('yoga class', ['u2', 'u3'])
+        checkpoint.place_done('u1', {'name': 'One'})
+        self.assertEqual(ScrapeJob.objects.get(pk=self.job.pk).checkpoint, {
+            'completed_terms': ['yoga studio', 'yoga class'],
+            'urls': ['u1', 'u2', 'u3'],
+            'records': {'u1': {'name': 'One'}},
+            'listings': {},
+        })
+        self.assertTrue(checkpoint.skip_search('yoga studio'))
+        self.assertFalse(checkpoint.skip_search('yoga centre'))
+        # Enough URLs collected for the job makes further terms unnecessary
+        self.assertTrue(checkpoint.skip_search('yoga centre', max_results=3))
+        self.assertEqual(checkpoint.record_for('u1'), {'name': 'One'})
+        self.assertIsNone(checkpoint.record_for('u2'))
+
+    def test_a_place_reached_through_another_term_is_not_added_twice(self):
+        checkpoint = JobCheckpoint('a')
+        place = 'https://www.google.com/maps/place/Yoga+Studio/data=!4m2!3m1!1s0x3a5267:0x1b2c3d'
+        checkpoint.term_done('yoga studio', [place + '?authuser=0'])
+        checkpoint.term_done('yoga class', [place.replace('Yoga+Studio', 'Yoga+Studio+Chennai'), 'u2'])
+        self.assertEqual(checkpoint.urls, [place + '?authuser=0', 'u2'])
+
+    def test_without_a_job_id_nothing_is_stored(self):
+        checkpoint = JobCheckpoint()
+        checkpoint.term_done('yoga studio', ['u1'])
+        checkpoint.place_done('u1', {'name': 'One'})
+        self.assertEqual(checkpoint.urls, ['u1'])
+        self.assertEqual(ScrapeJob.objects.get(pk=self.job.pk).checkpoint, {})
+
+    @override_settings(SCRAPE_JOB_STALE_SECONDS=60, SCRAPE_JOB_MAX_ATTEMPTS=3)
+    def test_requeued_job_resumes_from_its_checkpoint(self):
+        claim_next_job()
+        checkpoint = JobCheckpoint('a')
+        checkpoint.term_done('yoga studio', ['u1', 'u2'])
+        checkpoint.place_done('u1', {'name': 'One'})
+        # The worker dies; the row goes quiet and is requeued
+        ScrapeJob.objects.filter(pk=self.job.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(claim_next_job().attempts, 2)
+
+        resumed = JobCheckpoint('a')
+        self.assertTrue(resumed.resumed)
+        self.assertTrue(resumed.skip_search('yoga studio'))
+        self.assertEqual(resumed.record_for('u1'), {'name': 'One'})
+        self.assertIsNone(resumed.record_for('u2'))
+        resumed.place_done('u2', {'name': 'Two'})
+        self.assertEqual(checkpoint_records(self.job), [{'name': 'One'}, {'name': 'Two'}])
+
+    def test_listing_job_resumes_with_its_feed_cards(self):
+        ScrapeJob.objects.filter(pk=self.job.pk).update(listing_only=True, detail_fields=[])
+        cards = {'u1': {'name': 'One', 'open_status': 'Open'}, 'u2': {'name': 'Two', 'open_status': 'Closed'}}
+        JobCheckpoint('a').term_done('yoga studio', ['u1', 'u2'], cards)
+
+        # A resumed attempt skips the search, so its cards come from the checkpoint alone
+        pool = DetailPool(SimpleNamespace(), 'a')
+        self.assertEqual(pool.listings, cards)
+        self.assertEqual(pool.fetch('u2'), {'name': 'Two', 'open_status': 'Closed'})
+
+
+@override_settings(SCRAPE_CANCEL_POLL_SECONDS=0.01, SCRAPE_CANCEL_KILL_AFTER_SECONDS=0.2)
+class CancelSignalTests(TransactionTestCase):
+    """A cancel on the job row reaching the worker's poll thread (database seen from another thread)"""
+
+    def setUp(self):
+        submit('a')
+        patcher = mock.patch('scraper.job_registry.job_registry.terminate')
+        self.terminate = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cancel_on_the_row_sets_the_signal(self):
+        # Not registered in this process, so only the poll thread can see the cancel
+        signal = CancelSignal('a')
+        signal.watch()
+        self.addCleanup(signal.stop)
+        self.assertFalse(wait_for(signal.is_set, timeout=0.1))
+        self.assertTrue(request_cancel('a'))
+        self.assertTrue(wait_for(signal.is_set))
+        # Still running after the grace period: its browsers are killed
+        self.assertTrue(wait_for(lambda: self.terminate.called))
+        self.terminate.assert_called_once_with('a')
+
+    def test_release_stops_the_poll_thread(self):
+        signal = cancel_signal('a')
+        self.assertIs(cancel_signal('a'), signal)
+        release_cancel_signal('a')
+        self.assertTrue(wait_for(lambda: not signal._watcher.is_alive(), timeout=1))
+        self.assertIsNot(cancel_signal('a'), signal)
+        release_cancel_signal('a')
+
+    def test_job_released_after_a_cancel_is_not_killed(self):
+        signal = cancel_signal('a')
+        ScrapeJob.objects.filter(job_id='a').update(cancel_requested=True)
+        self.assertTrue(wait_for(signal.is_set))
+        release_cancel_signal('a')
+        signal._watcher.join(1)
+        self.assertFalse(signal._watcher.is_alive())
+        self.terminate.assert_not_called()
+
+    def test_cancel_stops_detail_fetches_before_releasing_the_driver(self):
+        scraper = GymScraper(headless=True)
+        scraper.driver = SimpleNamespace()
+        order = []
+        with mock.patch.object(scraper.details, 'close', side_effect=lambda: order.append('details')), \
+                mock.patch('scraper.gym_scraper.browser_pool.release', side_effect=lambda driver: order.append('driver')):
+            scraper.close_chrome_tab()
+        self.assertEqual(order, ['details', 'driver'])
+
+    def test_driver_released_when_a_cancel_lands_in_the_last_step(self):
+        scraper = GymScraper(headless=True)
+
+        def collect_then_cancel(driver, max_results):
+            scraper.is_cancelled = True  # What should_cancel() does when the scroll loop notices the cancel
+            return []
+
+        with mock.patch('scraper.gym_scraper.browser_pool.lease', return_value=mock.MagicMock()) as lease, \
+                mock.patch('scraper.gym_scraper.browser_pool.release') as release, \
+                mock.patch.object(scraper, 'get_gym_search_terms', return_value=['yoga Chennai']), \
+                mock.patch.object(scraper.navigator, 'search'), \
+                mock.patch.object(scraper, 'enhanced_url_collection', side_effect=collect_then_cancel):
+            self.assertEqual(scraper.scrape_gyms_comprehensive('Chennai'), [])
+        release.assert_called_once_with(lease.return_value)
+        self.assertIsNone(scraper.driver)
@@ -8,6 +8,8 @@ urlpatterns = [
     path('update-custom-search/', views.update_custom_search, name='update_custom_search'),
     path('update-subcategory-options/', views.update_subcategory_options, name='update_subcategory_options'),
     path('cancel-scraping/', views.cancel_scraping, name='cancel_scraping'),  # Add this line
+    path('job-status/<str:job_id>/', views.job_status, name='job_status'),
+    path('job-progress/<str:job_id>/', views.job_progress_stream, name='job_progress_stream'),
     # Authentication URLs
     path('signup/', auth_views.signup_view, name='signup'),
     path('login/', auth_views.login_view, name='login'),
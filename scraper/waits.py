@@ -0,0 +1,127 @@
+"""
+Condition-driven page waits for the scrapers.
+
+The scrapers used to pace themselves with fixed ``time.sleep`` calls after
+every navigation, search and scroll. ``PageWaits.until`` polls a readiness
+condition instead (search box usable, results feed present, place heading
+rendered, network quiet) and returns as soon as it holds. The old sleep
+length is kept as a ceiling, not a floor. The time saved against the fixed
+sleep is added up per job in ``ScrapeJob.wait_seconds_saved``.
+"""
+import logging
+import threading
+import time
+
+from django.db.models import F
+from selenium.common.exceptions import JavascriptException, StaleElementReferenceException, TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 0.1
+# Seconds without a new network request before a page counts as quiet
+QUIET_SECONDS = 0.5
+# Saved time is written to the job row at most this often
+FLUSH_SECONDS = 5
+
+_RESOURCE_COUNT_JS = """
+if (performance.setResourceTimingBufferSize) { performance.setResourceTimingBufferSize(100000); }
+return [document.readyState, performance.getEntriesByType('resource').length];
+"""
+
+
+def search_box_ready(driver):
+    return driver.execute_script(
+        "var box = document.getElementById('searchboxinput'); return !!(box && !box.disabled);"
+    )
+
+
+def main_panel_present(driver):
+    return driver.execute_script("return !!document.querySelector(\"[role='main']\");")
+
+
+def feed_present(driver):
+    return driver.execute_script("return !!document.querySelector(\"[role='feed']\");")
+
+
+def results_ready(driver):
+    """A results feed, or the place panel Maps opens directly for a single match"""
+    return driver.execute_script(
+        "return !!(document.querySelector(\"[role='feed']\") || document.querySelector('h1.DUwDvf'));"
+    )
+
+
+def network_quiet(quiet_seconds=QUIET_SECONDS):
+    """Condition that holds once the page is loaded and no resource has started for ``quiet_seconds``"""
+    state = {'count': None, 'since': time.monotonic()}
+
+    def condition(driver):
+        ready_state, count = driver.execute_script(_RESOURCE_COUNT_JS)
+        now = time.monotonic()
+        if count != state['count']:
+            state['count'] = count
+            state['since'] = now
+            return False
+        return ready_state == 'complete' and now - state['since'] >= quiet_seconds
+
+    return condition
+
+
+def place_ready():
+    """Condition for a place page: heading rendered with a real name, then network quiet"""
+    quiet = network_quiet()
+
+    def condition(driver):
+        heading = driver.execute_script("var h = document.querySelector('h1'); return h ? h.textContent.trim() : '';")
+        return bool(heading) and heading != 'Results' and quiet(driver)
+
+    return condition
+
+
+class PageWaits:
+    def __init__(self, job_id=None):
+        self.job_id = job_id
+        self.saved_seconds = 0.0
+        self._unflushed = 0.0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def until(self, driver, condition, ceiling, replaces=None):
+        """
+        Wait until ``condition(driver)`` holds, at most ``ceiling`` seconds.
+
+        ``replaces`` is the fixed sleep this wait stands in for; the saved
+        time is that sleep minus the time waited, never below zero. A wait
+        that replaced no sleep (``replaces`` None or 0) saves nothing.
+        Returns True when the condition was met.
+        """
+        started = time.monotonic()
+        try:
+            WebDriverWait(
+                driver, ceiling, poll_frequency=POLL_SECONDS,
+                ignored_exceptions=(JavascriptException, StaleElementReferenceException),
+            ).until(condition)
+            met = True
+        except TimeoutException:
+            met = False
+        saved = max((replaces or 0) - (time.monotonic() - started), 0)
+        with self._lock:
+            self.saved_seconds += saved
+            self._unflushed += saved
+            due = time.monotonic() - self._last_flush >= FLUSH_SECONDS
+        if due:
+            self.flush()
+        return met
+
+    def flush(self):
+        """Add the saved seconds not yet written to the job row"""
+        with self._lock:
+            delta, self._unflushed = self._unflushed, 0.0
+            self._last_flush = time.monotonic()
+        if not self.job_id or not delta:
+            return
+        from .models import ScrapeJob
+        try:
+            ScrapeJob.objects.filter(job_id=self.job_id).update(wait_seconds_saved=F('wait_seconds_saved') + delta)
+        except Exception as e:
+            logger.warning(f"Could not record wait savings for job {self.job_id}: {e}")
@@ -0,0 +1,146 @@
+"""
+Scrape worker processes.
+
+``manage.py run_scrape_workers`` starts a small supervisor that keeps N worker
+processes alive. Each worker claims pending ``ScrapeJob`` rows and runs them
+with its own Chrome, so N is also the number of browsers on the host. N comes
+from ``SCRAPE_WORKER_CONCURRENCY`` and is capped by the free RAM psutil
+reports, so a burst of submissions queues up instead of getting OOM-killed.
+Each worker keeps its Chrome warm between jobs in ``browser_pool``. One more
+process runs the Chrome reaper (``reaper``), which cleans up after workers
+that died without closing their browsers.
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+import psutil
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .browser_pool import browser_pool, chrome_options
+from .chrome_process import reap_children
+from .jobs import claim_next_job, execute_job, release_job, requeue_stale_jobs
+
+logger = logging.getLogger(__name__)
+
+
+def available_memory_mb():
+    return psutil.virtual_memory().available / (1024 * 1024)
+
+
+def memory_capped_concurrency(requested=None):
+    """Number of workers to start: the configured value, capped by free RAM"""
+    requested = requested or settings.SCRAPE_WORKER_CONCURRENCY
+    per_browser = settings.SCRAPE_WORKER_MEMORY_MB
+    by_memory = int(available_memory_mb() // per_browser)
+    return max(1, min(requested, by_memory))
+
+
+def has_memory_for_browser():
+    """True when there is room for one more Chrome right now"""
+    return available_memory_mb() >= settings.SCRAPE_WORKER_MEMORY_MB
+
+
+def warm_browser_pool():
+    """Pre-launch pooled Chrome sessions with the options most category scrapers share"""
+    browser_pool.warm(chrome_options())
+
+
+def run_worker_loop(poll_interval=2.0, once=False):
+    """Claim and execute pending jobs until interrupted (or the queue is empty when ``once``)"""
+    try:
+        _claim_and_execute(poll_interval, once)
+    finally:
+        browser_pool.shutdown()
+
+
+def _claim_and_execute(poll_interval, once):
+    while True:
+        close_old_connections()
+
+        # Leave the job in the queue rather than start a browser we cannot fit
+        if not has_memory_for_browser():
+            logger.warning(f"Worker {os.getpid()} waiting: only {available_memory_mb():.0f} MB free")
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        requeue_stale_jobs()
+        job = claim_next_job()
+        if job is None:
+            if once:
+                return
+            browser_pool.prune()
+            reap_children()
+            time.sleep(poll_interval)
+            continue
+        logger.info(f"Worker {os.getpid()} picked up scrape job {job.job_id} (attempt {job.attempts})")
+        try:
+            execute_job(job)
+        except SystemExit:
+            # Redeploy or shutdown: hand the job back so another worker resumes it from its checkpoint
+            release_job(job)
+            raise
+
+
+def _raise_system_exit(signum, frame):
+    raise SystemExit(0)
+
+
+def _worker_process_main(poll_interval):
+    # SystemExit unwinds through the scrapers' finally blocks, so Chrome is closed
+    signal.signal(signal.SIGTERM, _raise_system_exit)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if has_memory_for_browser():
+        warm_browser_pool()
+    run_worker_loop(poll_interval=poll_interval)
+
+
+def _reaper_process_main():
+    from .reaper import run_reaper_loop
+    signal.signal(signal.SIGTERM, _raise_system_exit)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    run_reaper_loop()
+
+
+def run_worker_pool(concurrency, poll_interval=2.0):
+    """Keep ``concurrency`` worker processes running until SIGINT/SIGTERM"""
+    # Forked children must not share the parent's database connections
+    connections.close_all()
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    processes = {}
+    targets = {slot: (_worker_process_main, (poll_interval,), f"scrape-worker-{slot}") for slot in range(concurrency)}
+    if settings.SCRAPE_REAPER_INTERVAL > 0:
+        targets['reaper'] = (_reaper_process_main, (), "scrape-reaper")
+    while not stopping:
+        for slot, (target, args, name) in targets.items():
+            proc = processes.get(slot)
+            if proc is not None and proc.is_alive():
+                continue
+            if proc is not None:
+                logger.warning(f"Scrape process {name} (PID {proc.pid}) exited with {proc.exitcode}, restarting")
+            proc = multiprocessing.Process(target=target, args=args, name=name)
+            proc.start()
+            processes[slot] = proc
+        time.sleep(1)
+
+    for proc in processes.values():
+        if proc.is_alive():
+            proc.terminate()
+    for proc in processes.values():
+        proc.join(timeout=30)
+        if proc.is_alive():
+            proc.kill()